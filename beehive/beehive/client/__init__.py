@@ -10,17 +10,25 @@
     @python version: 3.8
 """
 
+import itertools
 import logging
-import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from six.moves import cPickle as pickle
 from tornado import gen
 from tornado.ioloop import IOLoop
 from tornado.iostream import StreamClosedError
-from tornado.tcpclient import TCPClient
+from tornado.locks import Semaphore
 
+from beehive.libs import net_helper
 from beehive.libs.signal_helper import add_shutdown_handler
-from beehive.message import RPCException, RPCMessage, RPCRequest, RPCResponse
+from beehive.message import (
+    RPCBlobMiss, RPCCancel, RPCException, RPCRequest, RPCResponse
+)
+from beehive.message.blobs import BlobMissing, BlobStore
+from beehive.message.codec import available_codecs
+from beehive.message.compression import available_compressors
+from beehive.message.shm import SharedSegment
+from beehive.message.stream import MessageStream
 
 
 def rpc(func):
@@ -32,17 +40,13 @@ def rpc(func):
             if not self._connected:
                 raise Exception('Connection Error')
 
-        req = pickle.dumps(RPCRequest(func_name, args, kwargs), protocol=2)
-
+        msg_id = next(self._msg_ids)
         res = None
         try:
-            yield self.stream.write(req + self.EOM)
-            res = yield self.stream.read_until(self.EOM)
-            if sys.version_info.major > 2:
-                res = pickle.loads(res[:-len(self.EOM)], encoding='latin1')
-            else:
-                res = pickle.loads(res[:-len(self.EOM)])
-            res = RPCMessage.from_dict(res)
+            self.write_message(RPCRequest(func_name, args, kwargs, msg_id))
+            res = yield self.read_message()
+            while res['msg_id'] not in (msg_id, None):
+                res = yield self.read_message()
         except Exception as e:
             self._connected = False
             raise e
@@ -57,21 +61,135 @@ def rpc(func):
     return _func
 
 
+def run_on(backend):
+    """
+    Choose where an RPC method runs:
+
+    - ``inline``: on the IOLoop, for coroutines and quick calls (default)
+    - ``thread``: in a ThreadPoolExecutor, for code releasing the GIL
+    - ``process``: in a ProcessPoolExecutor, for CPU bound cracking. The
+      method runs on a copy of the client built in each pool process,
+      see ``BeetleRPCClient.init_process``
+    """
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend: %s' % backend)
+
+    def dec(func):
+        func._backend = backend
+        return func
+
+    return dec
+
+
+BACKENDS = ('inline', 'thread', 'process')
+
+# Client instance of a pool process, see _init_process
+_process_client = None
+
+
+def _init_process(cls):
+    global _process_client
+    client = cls.__new__(cls)
+    client.init_process()
+    _process_client = client
+
+
+def _call_in_process(func_name, args, kwargs):
+    return getattr(_process_client, func_name)(*args, **kwargs)
+
+
+class RequestState(object):
+    """A request the worker is handling, until it answers it"""
+
+    def __init__(self, ioloop, timeout=None):
+        self.ioloop = ioloop
+        # The server stops waiting after timeout seconds
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = ioloop.time() + timeout
+        self.cancelled = False
+        # Future of the running method, cancelled if it has not started
+        self.future = None
+
+    def dropped(self):
+        """Nobody waits for the result anymore"""
+        return self.cancelled or (
+            self.deadline is not None and self.deadline <= self.ioloop.time()
+        )
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
 class BeetleRPCClient(object):
     """
     BeetleRPCClient to connect to BeetleRPCServer
     """
 
-    EOM = b'BEETLE_EOM'
     _type_name = 'BeetleRPCClient'
-
-    def __init__(self, host, port):
+    # Methods answered right away, they do not take a slot
+    _control_methods = ('heart_beat', )
+
+    def __init__(
+        self,
+        host,
+        port,
+        framed=True,
+        codecs=None,
+        slots=1,
+        thread_workers=None,
+        process_workers=None,
+        batch_size=0,
+        shared_memory=False,
+        blob_cache=0,
+        compression=None,
+        compression_threshold=1024,
+    ):
+        # ``unix:///path`` as host connects to the Unix socket of a server
+        # on the same host, port is then unused
         self.host = host
         self.port = port
+        # Requests handled at once, announced to the server at registration
+        self.slots = slots
+        self._slots = Semaphore(slots)
+        # Largest list of params crack_batch takes, 0 for no batching
+        self.batch_size = batch_size
+        # Pool sizes of the thread / process backends, default to slots
+        self.thread_workers = thread_workers or slots
+        self.process_workers = process_workers or slots
+        self._executors = {}
+        # Set framed to False to skip negotiation with a server that
+        # predates length-prefixed frames
+        self.framed = framed
+        # Codec names in order of preference, see beehive.message.codec
+        self.codecs = available_codecs(codecs)
+        # Ask for large payloads in shared memory when connected over a
+        # Unix socket. Methods then get them as memoryview, valid until
+        # they return. See beehive.message.shm
+        self.shared_memory = shared_memory
+        self.shm = None
+        # Bytes of the large payloads kept by content hash, so that the
+        # server can refer to repeated ones instead of sending them again.
+        # 0 disables it. See beehive.message.blobs
+        self.blob_cache = blob_cache
+        self.blobs = None
+        # Frame compressions wanted in order of preference, e.g. ['zstd',
+        # 'lz4', 'zlib'] over slow links, and the smallest payload worth
+        # compressing. See beehive.message.compression
+        self.compression = available_compressors(compression)
+        self.compression_threshold = compression_threshold
         self.logger = logging.getLogger('BeetleRPCClient')
         self.stream = None
+        self.messages = None
         self._connected = False
         self._registered = False
+        self._msg_ids = itertools.count(1)
+        # msg_id -> RequestState of the requests being handled
+        self._requests = {}
+        # Requests not run or not answered because the server gave up
+        self.dropped = 0
 
         self.ioloop = IOLoop.current()
         self._is_exiting = False
@@ -96,6 +214,8 @@ class BeetleRPCClient(object):
             yield gen.maybe_future(self.on_before_exit())
         except Exception as e:
             self.logger.exception(e)
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
 
         if self._is_running:
             self.ioloop.stop()
@@ -122,14 +242,13 @@ class BeetleRPCClient(object):
             try:
                 if not self._connected:
                     self.logger.info('Connecting...')
-                    self.stream = yield TCPClient().connect(
-                        host=self.host, port=self.port
-                    )
+                    self.stream = yield net_helper.connect(self.host, self.port)
+                    self.messages = MessageStream(self.stream)
                     self.logger.info('Connected')
                     self._connected = True
                 if not self._registered:
                     self.logger.info('Registing...')
-                    ret = yield self.register(self._type_name)
+                    ret = yield self.negotiate()
                     if ret:
                         self._registered = True
                         self.logger.info('Registered')
@@ -144,15 +263,124 @@ class BeetleRPCClient(object):
 
     @gen.coroutine
     @rpc
-    def register(self, client_type):
+    def register(self, client_type, **options):
         """
         注册客户端类型 RPC 方法（不需要实现）
         """
         pass
 
+    def register_options(self):
+        """Slots and wire features offered to the server at registration"""
+        options = {'slots': self.slots}
+        if self.batch_size > 1:
+            options['batch_size'] = self.batch_size
+        if self.framed:
+            options['framed'] = True
+            options['codecs'] = self.codecs
+            if self.shared_memory and net_helper.unix_path(self.host):
+                options['shm'] = True
+            if self.blob_cache:
+                options['blob_cache'] = self.blob_cache
+            if self.compression:
+                options['compression'] = self.compression
+                options['compression_threshold'] = self.compression_threshold
+        return options
+
+    @gen.coroutine
+    def negotiate(self):
+        """
+        Register and switch to the wire options the server accepted
+        """
+        options = self.register_options()
+        try:
+            ret = yield self.register(self._type_name, **options)
+        except StreamClosedError:
+            raise
+        except Exception as e:
+            # Old servers reject unknown register arguments
+            self.logger.warning('Negotiation refused, fallback: %s', e)
+            ret = yield self.register(self._type_name)
+        if isinstance(ret, dict):
+            self.messages.upgrade(**ret)
+            self.open_shm(ret.get('shm'))
+            # A new connection, the server does not refer to older blobs
+            self.blobs = None
+            if ret.get('blob_cache'):
+                self.blobs = BlobStore(self.blob_cache)
+        raise gen.Return(ret)
+
+    def open_shm(self, shm):
+        """Map the shared memory of the server, ``shm`` is its path and size"""
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+        if shm:
+            self.shm = SharedSegment(shm['path'], shm['size'])
+
     def heart_beat(self):
         return True
 
+    @gen.coroutine
+    def crack_batch(self, params_list):
+        """
+        Crack several requests at once, return one result per params.
+        Override it with a real batched implementation and pass
+        ``batch_size`` so the server starts batching. This one runs
+        ``crack`` for each params on its backend, all at once.
+        """
+        futures = [
+            self.execute('crack', (params, ), {}) for params in params_list
+        ]
+        rets = []
+        for future in futures:
+            rets.append((yield future))
+        raise gen.Return(rets)
+
+    def init_process(self):
+        """
+        Called once in every pool process of the ``process`` backend on
+        an instance built without __init__, load models here.
+        """
+        pass
+
+    def get_executor(self, backend):
+        executor = self._executors.get(backend)
+        if executor is None:
+            if backend == 'thread':
+                executor = ThreadPoolExecutor(self.thread_workers)
+            else:
+                executor = ProcessPoolExecutor(
+                    self.process_workers,
+                    initializer=_init_process,
+                    initargs=(type(self), ),
+                )
+            self._executors[backend] = executor
+        return executor
+
+    def execute(self, func_name, args, kwargs):
+        """Run an RPC method on its backend, return a future"""
+        func = self.__getattribute__(func_name)
+        backend = getattr(func, '_backend', 'inline')
+        if backend == 'thread':
+            return self.get_executor(backend).submit(func, *args, **kwargs)
+        if backend == 'process':
+            return self.get_executor(backend).submit(
+                _call_in_process, func_name, args, kwargs
+            )
+        return gen.maybe_future(func(*args, **kwargs))
+
+    def resolve_payloads(self, func_name, args, kwargs):
+        """Arguments with the payloads out of shared memory and blobs"""
+        if self.shm is not None:
+            func = self.__getattribute__(func_name)
+            # Views cannot be pickled to the pool processes
+            copy = getattr(func, '_backend', 'inline') == 'process'
+            args = self.shm.resolve(args, copy=copy)
+            kwargs = self.shm.resolve(kwargs, copy=copy)
+        if self.blobs is not None:
+            args, kwargs = self.blobs.resolve((args, kwargs))
+        return args, kwargs
+
     def run(self):
         try:
             self.logger.info(self._type_name + ' starts')
@@ -163,6 +391,12 @@ class BeetleRPCClient(object):
             self.logger.exception(e)
         self.logger.info(self._type_name + ' stopped')
 
+    def read_message(self):
+        return self.messages.read_message()
+
+    def write_message(self, msg):
+        self.messages.write_message(msg)
+
     @gen.coroutine
     def main_loop(self):
         """
@@ -177,31 +411,70 @@ class BeetleRPCClient(object):
                 if not self._registered:
                     continue
                 self.logger.info('Waiting For Request...')
-                req = yield self.stream.read_until(self.EOM)
-                req = req[:-len(self.EOM)]
-                if sys.version_info.major > 2:
-                    req = pickle.loads(req, encoding='latin1')
-                else:
-                    req = pickle.loads(req)
-
-                req = RPCMessage.from_dict(req)
-                data = req['value']
-                func_name = data['func']
-                args = data['args']
-                kwargs = data['kwargs']
-                self.logger.info('RPC Called: ' + func_name)
-                try:
-                    res = yield gen.maybe_future(
-                        self.__getattribute__(func_name)(*args, **kwargs)
-                    )
-                    res = RPCResponse(res)
-                except Exception as e:
-                    self.logger.exception(e)
-                    res = RPCException(str(e))
-                yield self.stream.write(
-                    pickle.dumps(dict(res), protocol=2) + self.EOM
-                )
+                req = yield self.read_message()
+                if isinstance(req, RPCCancel):
+                    self.cancel_request(req['msg_id'])
+                    continue
+                if not isinstance(req, RPCRequest):
+                    continue
+                # Tracked before the next message is read, which may be
+                # its cancellation
+                state = RequestState(self.ioloop, req.get('timeout'))
+                if req['msg_id'] is not None:
+                    self._requests[req['msg_id']] = state
+                # Answer in completion order, the server matches by msg_id
+                self.ioloop.spawn_callback(self.handle_request, req, state)
             except StreamClosedError:
                 self._connected = False
                 self._registered = False
                 yield self.connect()
+
+    def cancel_request(self, msg_id):
+        state = self._requests.get(msg_id)
+        if state is not None:
+            state.cancel()
+
+    @gen.coroutine
+    def handle_request(self, req, state=None):
+        data = req['value']
+        func_name = data['func']
+        args = data['args']
+        kwargs = data['kwargs']
+        state = state or RequestState(self.ioloop)
+        self.logger.info('RPC Called: ' + func_name)
+        res = None
+        try:
+            # Right away, blobs are stored in the order the server sent
+            # them and a miss is answered without waiting for a slot
+            args, kwargs = self.resolve_payloads(func_name, args, kwargs)
+            if func_name in self._control_methods:
+                ret = yield self.execute(func_name, args, kwargs)
+                res = RPCResponse(ret, req['msg_id'])
+            else:
+                with (yield self._slots.acquire()):
+                    # Not run if it expired or got cancelled while waiting
+                    # for the slot
+                    if not state.dropped():
+                        state.future = self.execute(func_name, args, kwargs)
+                        ret = yield state.future
+                        res = RPCResponse(ret, req['msg_id'])
+        except BlobMissing as e:
+            res = RPCBlobMiss(e.digests, req['msg_id'])
+        except Exception as e:
+            if not state.cancelled:
+                self.logger.exception(e)
+            res = RPCException(str(e), req['msg_id'])
+        finally:
+            self._requests.pop(req['msg_id'], None)
+        if res is None or state.dropped():
+            # The server has given up on it and popped its msg_id
+            self.dropped += 1
+            self.logger.info('RPC dropped: ' + func_name)
+            if self.shm is None or req['msg_id'] is None:
+                return
+            # Still answered, it frees the shared memory of the request
+            res = RPCResponse(None, req['msg_id'])
+        try:
+            self.write_message(res)
+        except StreamClosedError:
+            self.logger.warning('Connection lost, drop response: ' + func_name)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+    cache.py
+    ~~~~~~~~~~~~~~
+
+    LRU cache bounded by entry count and bytes, with per entry TTL
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:44
+    @python version: 3.8
+"""
+
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (value, size, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, size, ttl=None):
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.time() + ttl if ttl else None
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or \
+                self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def discard(self, key):
+        if key in self._entries:
+            self._remove(key)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+    multipart.py
+    ~~~~~~~~~~~~~~
+
+    Incremental multipart/form-data parser, for request bodies that are
+    streamed instead of buffered
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:44
+    @python version: 3.8
+"""
+
+import logging
+
+from tornado.escape import utf8
+from tornado.httputil import HTTPFile, HTTPHeaders, _parse_header
+
+_PREAMBLE = 0
+_DELIMITER = 1
+_HEADERS = 2
+_BODY = 3
+_EPILOGUE = 4
+
+logger = logging.getLogger('multipart')
+
+
+class MultipartError(Exception):
+    pass
+
+
+def parse_boundary(content_type):
+    """Boundary of a multipart/form-data Content-Type, None otherwise"""
+    if not content_type or \
+            not content_type.startswith('multipart/form-data'):
+        return None
+    for field in content_type.split(';'):
+        key, _, value = field.strip().partition('=')
+        if key == 'boundary' and value:
+            return utf8(value)
+    return None
+
+
+class MultipartParser(object):
+    """
+    Feed the body in chunks as they arrive, fields end up in
+    ``arguments`` and ``files`` the way
+    ``tornado.httputil.parse_body_arguments`` puts them. Only the tail
+    that may hold a partial delimiter is kept between chunks, file
+    bodies are joined once when their part ends.
+    """
+
+    def __init__(self, boundary, max_header_size=16 * 1024):
+        if boundary.startswith(b'"') and boundary.endswith(b'"'):
+            boundary = boundary[1:-1]
+        self.delimiter = b'--' + boundary
+        self.max_header_size = max_header_size
+        self.arguments = {}
+        self.files = {}
+        self.size = 0
+
+        self._buffer = bytearray()
+        self._state = _PREAMBLE
+        self._part = None
+        self._chunks = []
+
+    def feed(self, data):
+        self.size += len(data)
+        self._buffer += data
+        while self._step():
+            pass
+
+    def close(self):
+        if self._state != _EPILOGUE:
+            raise MultipartError('Incomplete multipart body')
+
+    def _take(self, size):
+        with memoryview(self._buffer) as view:
+            data = bytes(view[:size])
+        return data
+
+    def _step(self):
+        buf = self._buffer
+        if self._state == _PREAMBLE:
+            # The first delimiter is not preceded by CRLF
+            pos = buf.find(self.delimiter)
+            if pos < 0:
+                del buf[:max(0, len(buf) - len(self.delimiter) + 1)]
+                return False
+            del buf[:pos + len(self.delimiter)]
+            self._state = _DELIMITER
+            return True
+
+        if self._state == _DELIMITER:
+            # '--' after a delimiter ends the body, otherwise the CRLF that
+            # ends the delimiter line is left for the header search
+            if len(buf) < 2:
+                return False
+            if buf[:2] == b'--':
+                self._state = _EPILOGUE
+                return True
+            padding = len(buf) - len(buf.lstrip(b' \t'))
+            del buf[:padding]
+            if buf:
+                self._state = _HEADERS
+            return bool(buf)
+
+        if self._state == _HEADERS:
+            if len(buf) < 2:
+                return False
+            if buf[:2] != b'\r\n':
+                raise MultipartError('Invalid multipart delimiter')
+            end = buf.find(b'\r\n\r\n')
+            if end < 0:
+                if len(buf) > self.max_header_size:
+                    raise MultipartError('Multipart headers too large')
+                return False
+            self._start_part(bytes(buf[2:end]))
+            del buf[:end + 4]
+            self._state = _BODY
+            return True
+
+        if self._state == _BODY:
+            pos = buf.find(b'\r\n' + self.delimiter)
+            if pos < 0:
+                # Keep what could be the start of the next delimiter
+                keep = len(self.delimiter) + 1
+                if len(buf) > keep:
+                    self._part_data(self._take(len(buf) - keep))
+                    del buf[:len(buf) - keep]
+                return False
+            self._part_data(self._take(pos))
+            del buf[:pos + 2 + len(self.delimiter)]
+            self._finish_part()
+            self._state = _DELIMITER
+            return True
+
+        del buf[:]
+        return False
+
+    def _start_part(self, header_data):
+        headers = HTTPHeaders.parse(header_data.decode('utf-8'))
+        disposition, params = _parse_header(
+            headers.get('Content-Disposition', '')
+        )
+        if disposition != 'form-data':
+            logger.warning('Invalid multipart/form-data')
+            self._part = None
+        elif not params.get('name'):
+            logger.warning('multipart/form-data value missing name')
+            self._part = None
+        else:
+            self._part = (
+                params['name'],
+                params.get('filename'),
+                headers.get('Content-Type', 'application/unknown'),
+            )
+        self._chunks = []
+
+    def _part_data(self, data):
+        if self._part is not None and data:
+            self._chunks.append(data)
+
+    def _finish_part(self):
+        if self._part is None:
+            return
+        name, filename, content_type = self._part
+        chunks, self._chunks, self._part = self._chunks, [], None
+        value = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        if filename:
+            self.files.setdefault(name, []).append(
+                HTTPFile(
+                    filename=filename, body=value, content_type=content_type
+                )
+            )
+        else:
+            self.arguments.setdefault(name, []).append(value)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+    net_helper.py
+    ~~~~~~~~~~~~~~
+
+    Connect to a TCP ``host``, ``port`` or to a Unix domain socket given
+    as ``unix:///path/to/socket`` in place of the host
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:44
+    @python version: 3.8
+"""
+
+import socket
+
+from tornado import gen
+from tornado.iostream import IOStream
+from tornado.tcpclient import TCPClient
+
+UNIX_SCHEME = 'unix://'
+
+
+def unix_path(host):
+    """Socket path of a ``unix://`` host, None for a TCP host"""
+    if host and host.startswith(UNIX_SCHEME):
+        return host[len(UNIX_SCHEME):]
+    return None
+
+
+@gen.coroutine
+def connect(host, port=None):
+    """Connect, return the IOStream. ``port`` is unused for Unix sockets"""
+    path = unix_path(host)
+    if path is None:
+        stream = yield TCPClient().connect(host=host, port=port)
+    else:
+        stream = IOStream(socket.socket(socket.AF_UNIX))
+        yield stream.connect(path)
+    raise gen.Return(stream)
@@ -125,6 +125,47 @@ def delete(*params, **kwparams):
     return method
 
 
+def route_pattern(path, capture=False):
+    """ Regex of a service path, each path param matches one segment """
+    path = re.sub(r"<[\w\-]*>|[?&]", "", path)
+    param = "([^/]+)" if capture else "[^/]+"
+    # Splitting on the params alternates literal parts and param names
+    parts = re.split(r"{[\w\-]+}", path)
+    return param.join(re.escape(part) for part in parts)
+
+
+class Route(object):
+    """ A service of a RestHandler class compiled for dispatching """
+
+    def __init__(self, name, operation):
+        self.name = name
+        self.method = operation._method
+        self.produces = operation._produces
+        self.consumes = operation._consumes
+        self.regex = re.compile(route_pattern(operation._path, True) + "$")
+
+        func_params = operation._func_params
+        params_types = operation._types or [str]
+        self.body_type = params_types[0]
+        self.arg_names = [
+            p for p in func_params if p not in operation._service_params
+        ]
+        self.converters = []
+        for p in operation._service_params:
+            i = func_params.index(p) if p in func_params else len(params_types)
+            param_type = params_types[i] if i < len(params_types) else str
+            self.converters.append(None if param_type is str else param_type)
+
+    def convert(self, values):
+        """ Converts the values of path params to the declared types """
+        if not any(self.converters):
+            return values
+        return [
+            v if t is None else types.convert(v, t)
+            for v, t in zip(values, self.converters)
+        ]
+
+
 class RestHandler(tornado.web.RequestHandler):
 
     def initialize(self):
@@ -158,135 +199,89 @@ class RestHandler(tornado.web.RequestHandler):
     def _exe(self, method):
         """ Executes the python function for the Rest Service """
         self.logger.info('%s %s' % (method, self.request.path))
-        request_path = self.request.path
-        path = request_path.split('/')
-        services_and_params = list(filter(lambda x: x != '', path))
-        content_type = None
-        if 'Content-Type' in self.request.headers.keys():
-            content_type = self.request.headers['Content-Type']
-
-        # Get all funcion names configured in the class RestHandler
-        functions = list(filter(
-            lambda op: hasattr(getattr(self, op), '_service_name') and
-            inspect.ismethod(getattr(self, op)), dir(self)))
-        # Get all http methods configured in the class RestHandler
-        http_methods = list(
-            map(lambda op: getattr(getattr(self, op), '_method'), functions)
-        )
-
-        if method not in http_methods:
-            raise tornado.web.HTTPError(
-                405, 'The service not have %s verb' % method
+        content_type = self.request.headers.get('Content-Type')
+        route, url_params = self._find_route(method, self.request.path)
+        operation = getattr(self, route.name)
+        produces = route.produces
+        consumes = route.consumes
+
+        try:
+            url_params = route.convert(url_params)
+        except ValueError:
+            raise HTTPError(400, 'Wrong path parameter')
+
+        try:
+            args_params = self._find_params_value_of_arguments(route)
+            if consumes is None and produces is None:
+                consumes = content_type
+                produces = content_type
+            if consumes == mediatypes.APPLICATION_XML:
+                param_obj = convertXML2OBJ(
+                    route.body_type,
+                    xml.dom.minidom.parseString(self.request.body
+                                                ).documentElement
+                )
+                args_params.update(param_obj)
+            elif consumes == mediatypes.APPLICATION_JSON:
+                body = self.request.body
+                if sys.version_info > (3, ):
+                    body = str(self.request.body, 'utf-8')
+                param_obj = convertJSON2OBJ(route.body_type, json.loads(body))
+                args_params.update(param_obj)
+
+            response = yield gen.maybe_future(
+                operation(*url_params, **args_params)
             )
 
-        for operation in list(map(lambda op: getattr(self, op), functions)):
-            service_name = getattr(operation, "_service_name")
-            service_params = getattr(operation, "_service_params")
-            # If the _types is not specified, assumes str types for the params
-            params_types = getattr(operation, "_types"
-                                   ) or [str] * len(service_params)
-            params_types = params_types + \
-                [str] * (len(service_params) - len(params_types))
-            produces = getattr(operation, "_produces")
-            consumes = getattr(operation, "_consumes")
-            services_from_request = list(
-                filter(lambda x: x in path, service_name)
-            )
-            query_params = getattr(operation, "_query_params")
-
-            if operation._method == self.request.method and \
-                service_name == services_from_request and \
-                len(service_params) + len(service_name) == len(services_and_params):
-                try:
-                    url_params = self._find_params_value_of_url(
-                        service_name, request_path
-                    )
-                    args_params = self._find_params_value_of_arguments(
-                        operation
-                    )
-                    if consumes is None and produces is None:
-                        consumes = content_type
-                        produces = content_type
-                    if consumes == mediatypes.APPLICATION_XML:
-                        param_obj = convertXML2OBJ(
-                            params_types[0],
-                            xml.dom.minidom.parseString(self.request.body)
-                            .documentElement
-                        )
-                        args_params.update(param_obj)
-                    elif consumes == mediatypes.APPLICATION_JSON:
-                        body = self.request.body
-                        if sys.version_info > (3,):
-                            body = str(self.request.body, 'utf-8')
-                        param_obj = convertJSON2OBJ(
-                            params_types[0], json.loads(body)
-                        )
-                        args_params.update(param_obj)
-
-                    response = yield gen.maybe_future(
-                        operation(*url_params, **args_params)
-                    )
-
-                    if response is None:
-                        raise gen.Return()
-
-                    self.set_header("Content-Type", produces)
-
-                    if produces == mediatypes.APPLICATION_JSON and \
-                        hasattr(response, '__module__'):
-                        response = convert2JSON(response)
-                    elif produces == mediatypes.APPLICATION_XML and \
-                        hasattr(response, '__module__'):
-                        response = convert2XML(response)
-
-                    if produces == mediatypes.APPLICATION_JSON and \
-                        isinstance(response, dict):
-                        self.write(json.dumps(response, cls=JsonEncoder))
-                        self.finish()
-                    elif produces == mediatypes.APPLICATION_JSON and \
-                        isinstance(response, list):
-                        self.write(json.dumps(response, cls=JsonEncoder))
-                        self.finish()
-                    elif produces in [
-                        mediatypes.APPLICATION_XML, mediatypes.TEXT_XML
-                    ] and isinstance(response, xml.dom.minidom.Document):
-                        self.write(response.toxml())
-                        self.finish()
-                    else:
-                        self.gen_http_error(
-                            500,
-                            "Internal Server Error : response is not %s document"
-                            % produces
-                        )
-                except gen.Return as ret:
-                    raise ret
-                except HTTPError as e:
-                    raise e
-                except Exception as e:
-                    self.logger.exception(e)
-                    self.gen_http_error(500, 'Internal Server Error')
-        # self.gen_http_error(405, 'Method not allowed')
-
-    def _find_params_value_of_url(self, services, url):
-        """ Find the values of path params """
-        values_of_query = list()
-        i = 0
-        url_split = url.split("/")
-        values = [
-            item for item in url_split if item not in services and item != ''
-        ]
-        for v in values:
-            if v is not None:
-                values_of_query.append(v)
-                i += 1
-        return values_of_query
-
-    def _find_params_value_of_arguments(self, operation):
+            if response is None:
+                raise gen.Return()
+
+            self.set_header("Content-Type", produces)
+
+            if produces == mediatypes.APPLICATION_JSON and \
+                hasattr(response, '__module__'):
+                response = convert2JSON(response)
+            elif produces == mediatypes.APPLICATION_XML and \
+                hasattr(response, '__module__'):
+                response = convert2XML(response)
+
+            if produces == mediatypes.APPLICATION_JSON and \
+                isinstance(response, (dict, list)):
+                self.write(json.dumps(response, cls=JsonEncoder))
+                self.finish()
+            elif produces in [
+                mediatypes.APPLICATION_XML, mediatypes.TEXT_XML
+            ] and isinstance(response, xml.dom.minidom.Document):
+                self.write(response.toxml())
+                self.finish()
+            else:
+                self.gen_http_error(
+                    500, "Internal Server Error : response is not %s document"
+                    % produces
+                )
+        except gen.Return as ret:
+            raise ret
+        except HTTPError as e:
+            raise e
+        except Exception as e:
+            self.logger.exception(e)
+            self.gen_http_error(500, 'Internal Server Error')
+
+    def _find_route(self, method, path):
+        """ Finds the route of the request and the values of path params """
+        routes = self.get_routes().get(method)
+        if not routes:
+            raise HTTPError(405, 'The service not have %s verb' % method)
+        for route in routes:
+            match = route.regex.match(path)
+            if match is not None:
+                return route, match.groups()
+        raise HTTPError(404)
+
+    def _find_params_value_of_arguments(self, route):
         params = {}
         if len(self.request.arguments) > 0:
-            a = operation._service_params
-            b = operation._func_params
-            for p in [item for item in b if item not in a]:
+            for p in route.arg_names:
                 if p in self.request.arguments.keys():
                     v = self.request.arguments[p]
                     if len(v) > 1:
@@ -318,6 +313,20 @@ class RestHandler(tornado.web.RequestHandler):
         self.write(str(msg))
         self.finish()
 
+    @classmethod
+    def get_routes(cls):
+        """ Compiles the services of the class once, by HTTP method """
+        routes = cls.__dict__.get('_routes')
+        if routes is None:
+            routes = {}
+            for name in dir(cls):
+                o = getattr(cls, name)
+                if callable(o) and hasattr(o, '_service_name'):
+                    route = Route(name, o)
+                    routes.setdefault(route.method, []).append(route)
+            cls._routes = routes
+        return routes
+
     @classmethod
     def get_services(self):
         """ Generates the resources (uri) to deploy the Rest Services """
@@ -341,16 +350,8 @@ class RestHandler(tornado.web.RequestHandler):
     @classmethod
     def get_handlers(self):
         """ Gets a list with (path, handler) """
-        svs = []
-        paths = self.get_paths()
-        for p in paths:
-            s = re.sub(r"(?<={)[\w\-]+}", ".*", p).replace("{", "")
-            o = re.sub(r"(?<=<)[\w\-]+", "", s).replace("<", "").replace(
-                ">", ""
-            ).replace("&", "").replace("?", "")
-            svs.append((o, self))
-
-        return svs
+        self.get_routes()
+        return [(route_pattern(p), self) for p in self.get_paths()]
 
 
 class RestService(tornado.web.Application):
@@ -378,16 +379,9 @@ class RestService(tornado.web.Application):
         )
 
     def _generateRestServices(self, rest):
-        svs = []
-        paths = rest.get_paths()
-        for p in paths:
-            s = re.sub(r"(?<={)[\w\-]+}", ".*", p).replace("{", "")
-            o = re.sub(r"(?<=<)[\w\-]+", "", s).replace("<", "").replace(
-                ">", ""
-            ).replace("&", "").replace("?", "")
-            svs.append((o, rest, self.resource))
-
-        return svs
+        return [
+            (path, rest, self.resource) for path, _ in rest.get_handlers()
+        ]
 
 
 class WSGIRestService(tornado.wsgi.WSGIApplication):
@@ -414,13 +408,6 @@ class WSGIRestService(tornado.wsgi.WSGIApplication):
         )
 
     def _generateRestServices(self, rest):
-        svs = []
-        paths = rest.get_paths()
-        for p in paths:
-            s = re.sub(r"(?<={)[\w\-]+}", ".*", p).replace("{", "")
-            o = re.sub(r"(?<=<)[\w\-]+", "", s).replace("<", "").replace(
-                ">", ""
-            ).replace("&", "").replace("?", "")
-            svs.append((o, rest, self.resource))
-
-        return svs
+        return [
+            (path, rest, self.resource) for path, _ in rest.get_handlers()
+        ]
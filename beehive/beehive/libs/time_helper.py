@@ -11,10 +11,13 @@
     @python version: 3.8
 """
 
+import math
 import time
+import weakref
 from calendar import timegm
 from datetime import datetime
 from tornado import gen
+from tornado.ioloop import IOLoop
 
 
 def utc2local(utc_dt):
@@ -87,4 +90,96 @@ def set_interval(interval):
 
         return _func
 
-    return dec
\ No newline at end of file
+    return dec
+
+
+class Timer(object):
+    """A callback scheduled on a ``TimerWheel``"""
+
+    __slots__ = ('wheel', 'expires', 'callback', 'slot')
+
+    def __init__(self, wheel, expires, callback):
+        self.wheel = wheel
+        self.expires = expires
+        self.callback = callback
+        self.slot = None
+
+    def cancel(self):
+        self.wheel.remove(self)
+
+
+class TimerWheel(object):
+    """
+    Hashed timing wheel: timers are kept in ``slots`` buckets of ``tick``
+    seconds each by the tick they expire on, so adding and cancelling one
+    is a set operation instead of a heap one on the IOLoop. The wheel
+    holds a single IOLoop timeout, for its next tick, and only while it
+    has timers. Timers fire up to one tick late, never early; those
+    further than a turn of the wheel away stay in their bucket until the
+    turn they expire on.
+    """
+
+    _wheels = weakref.WeakKeyDictionary()
+
+    def __init__(self, tick=0.01, slots=1024, ioloop=None):
+        self.tick = tick
+        self.ioloop = ioloop or IOLoop.current()
+        self._slots = [set() for _ in range(slots)]
+        self._current = 0
+        self._count = 0
+        self._timeout = None
+
+    @classmethod
+    def current(cls):
+        """The wheel of the current IOLoop"""
+        ioloop = IOLoop.current()
+        wheel = cls._wheels.get(ioloop)
+        if wheel is None:
+            wheel = cls._wheels[ioloop] = cls(ioloop=ioloop)
+        return wheel
+
+    def __len__(self):
+        return self._count
+
+    def call_later(self, delay, callback):
+        """Run ``callback`` in ``delay`` seconds, cancel it with the Timer"""
+        now = self.ioloop.time()
+        if self._timeout is None:
+            # Idle, nothing is due in the ticks that went by
+            self._current = int(now / self.tick)
+        expires = max(
+            int(math.ceil((now + delay) / self.tick)), self._current + 1
+        )
+        timer = Timer(self, expires, callback)
+        timer.slot = self._slots[expires % len(self._slots)]
+        timer.slot.add(timer)
+        self._count += 1
+        if self._timeout is None:
+            self._timeout = self.ioloop.call_later(self.tick, self._advance)
+        return timer
+
+    def remove(self, timer):
+        if timer.slot is not None:
+            timer.slot.discard(timer)
+            timer.slot = None
+            self._count -= 1
+
+    def _advance(self):
+        now = int(self.ioloop.time() / self.tick)
+        # Every bucket is looked at once at most, however late the tick.
+        # Timers added by the callbacks go to the ticks after this one.
+        start = max(self._current + 1, now - len(self._slots) + 1)
+        self._current = now
+        for tick in range(start, now + 1):
+            slot = self._slots[tick % len(self._slots)]
+            if not slot:
+                continue
+            for timer in [t for t in slot if t.expires <= now]:
+                self.remove(timer)
+                try:
+                    timer.callback()
+                except Exception:
+                    self.ioloop.handle_callback_exception(timer.callback)
+        self._timeout = None
+        if self._count:
+            self._timeout = self.ioloop.call_later(self.tick, self._advance)
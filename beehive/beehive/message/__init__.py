@@ -17,6 +17,8 @@ class MessageType(object):
     Exception = 0
     Request = 1
     Response = 2
+    Cancel = 3
+    BlobMiss = 4
 
 
 class RPCMessage(dict):
@@ -25,22 +27,33 @@ class RPCMessage(dict):
     def from_dict(cls, data):
         msg_type = data.get('msg_type')
         value = data.get('value')
+        msg_id = data.get('msg_id')
         if msg_type == MessageType.Request:
-            return RPCRequest(value['func'], value['args'], value['kwargs'])
+            return RPCRequest(
+                value['func'], value['args'], value['kwargs'], msg_id,
+                data.get('timeout')
+            )
         elif msg_type == MessageType.Response:
-            return RPCResponse(value)
+            return RPCResponse(value, msg_id)
         elif msg_type == MessageType.Exception:
-            return RPCException(value)
+            return RPCException(value, msg_id)
+        elif msg_type == MessageType.Cancel:
+            return RPCCancel(msg_id)
+        elif msg_type == MessageType.BlobMiss:
+            return RPCBlobMiss(value, msg_id)
         return None
 
-    def __init__(self, msg_type, value):
+    def __init__(self, msg_type, value, msg_id=None):
         self['msg_type'] = msg_type
         self['value'] = value
+        # Correlation id, a response carries the id of its request.
+        # Legacy peers never set it and get ``None`` back.
+        self['msg_id'] = msg_id
 
 
 class RPCRequest(RPCMessage):
 
-    def __init__(self, func, args, kwargs):
+    def __init__(self, func, args, kwargs, msg_id=None, timeout=None):
         super(RPCRequest, self).__init__(
             MessageType.Request,
             {
@@ -48,22 +61,54 @@ class RPCRequest(RPCMessage):
                 'args': args,
                 'kwargs': kwargs,
             },
+            msg_id,
         )
+        # Seconds the caller still waits for the response, relative so
+        # that clocks of both sides need not agree
+        if timeout is not None:
+            self['timeout'] = timeout
 
 
 class RPCResponse(RPCMessage):
 
-    def __init__(self, value):
+    def __init__(self, value, msg_id=None):
         super(RPCResponse, self).__init__(
             MessageType.Response,
             value,
+            msg_id,
         )
 
 
 class RPCException(RPCMessage):
 
-    def __init__(self, execption):
+    def __init__(self, execption, msg_id=None):
         super(RPCException, self).__init__(
             MessageType.Exception,
             execption,
+            msg_id,
+        )
+
+
+class RPCCancel(RPCMessage):
+    """The caller stopped waiting for the request ``msg_id``"""
+
+    def __init__(self, msg_id):
+        super(RPCCancel, self).__init__(
+            MessageType.Cancel,
+            None,
+            msg_id,
+        )
+
+
+class RPCBlobMiss(RPCMessage):
+    """
+    The request ``msg_id`` was not run, the worker does not have the
+    blobs of these digests, see beehive.message.blobs
+    """
+
+    def __init__(self, digests, msg_id=None):
+        super(RPCBlobMiss, self).__init__(
+            MessageType.BlobMiss,
+            digests,
+            msg_id,
         )
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    blobs.py
+      ~~~~~
+
+    Content hash references to payloads a worker already holds.
+
+    Workers that offer a blob cache at registration keep the large bytes
+    of the requests they get in an LRU by content hash. The server keeps
+    the same LRU of what it has sent: bytes the worker should still hold
+    go as a ``BlobRef``, others as a ``Blob`` that carries the bytes and
+    is stored on the way. A worker missing some referenced bytes, evicted
+    in the meantime, answers ``RPCBlobMiss`` with their digests and the
+    server sends the request again with every bytes included.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:46
+    @python version: 3.8
+"""
+
+import collections
+import hashlib
+
+from beehive.libs.cache import LRUCache
+
+BlobRef = collections.namedtuple('BlobRef', ['digest', 'length'])
+Blob = collections.namedtuple('Blob', ['digest', 'data'])
+
+
+def blob_digest(data):
+    return hashlib.sha1(data).digest()
+
+
+class BlobMissing(Exception):
+    """Referenced bytes the worker does not have"""
+
+    def __init__(self, digests):
+        super(BlobMissing, self).__init__('Blobs missing: %d' % len(digests))
+        self.digests = digests
+
+
+class BlobIndex(object):
+    """Server side: digests of the bytes a worker should hold"""
+
+    # Smaller bytes are sent as they are
+    min_size = 16 * 1024
+
+    def __init__(self, max_bytes):
+        self.index = LRUCache(
+            max_entries=max_bytes // self.min_size + 1,
+            max_bytes=max_bytes,
+        )
+        self.refs = 0
+        self.ref_bytes = 0
+        self.misses = 0
+
+    def export(self, obj, inline=False):
+        """
+        Copy of ``obj`` with its large bytes as BlobRef, or as Blob when
+        the worker does not have them or ``inline`` is set
+        """
+        if isinstance(obj, (bytes, bytearray)):
+            if len(obj) < self.min_size:
+                return obj
+            digest = blob_digest(obj)
+            if not inline and self.index.get(digest) is not None:
+                self.refs += 1
+                self.ref_bytes += len(obj)
+                return BlobRef(digest, len(obj))
+            self.index.set(digest, True, len(obj))
+            return Blob(digest, obj)
+        if isinstance(obj, dict):
+            return type(obj)(
+                (key, self.export(value, inline))
+                for key, value in obj.items()
+            )
+        if type(obj) in (list, tuple):
+            return type(obj)(self.export(value, inline) for value in obj)
+        return obj
+
+    def forget(self, digests):
+        self.misses += 1
+        for digest in digests:
+            self.index.discard(digest)
+
+    def stats(self):
+        return {
+            'entries': len(self.index),
+            'refs': self.refs,
+            'ref_bytes': self.ref_bytes,
+            'misses': self.misses,
+        }
+
+
+class BlobStore(object):
+    """Worker side: large bytes of the requests by digest"""
+
+    def __init__(self, max_bytes):
+        self.cache = LRUCache(
+            max_entries=max_bytes // BlobIndex.min_size + 1,
+            max_bytes=max_bytes,
+        )
+
+    def resolve(self, obj):
+        """
+        Copy of ``obj`` with Blob and BlobRef replaced by their bytes,
+        raise BlobMissing with the digests of the BlobRef not in store
+        """
+        missing = []
+        obj = self._resolve(obj, missing)
+        if missing:
+            raise BlobMissing(missing)
+        return obj
+
+    def _resolve(self, obj, missing):
+        if isinstance(obj, Blob):
+            # Held beyond the request, views of shared memory are copied
+            data = bytes(obj.data)
+            self.cache.set(obj.digest, data, len(data))
+            return data
+        if isinstance(obj, BlobRef):
+            data = self.cache.get(obj.digest)
+            if data is None:
+                missing.append(obj.digest)
+            return data
+        if isinstance(obj, dict):
+            return type(obj)(
+                (key, self._resolve(value, missing))
+                for key, value in obj.items()
+            )
+        if type(obj) in (list, tuple):
+            return type(obj)(self._resolve(value, missing) for value in obj)
+        return obj
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    codec.py
+      ~~~~~
+
+    Wire codecs for RPC messages.
+
+    A codec turns a message dict into a list of buffers that are written
+    to the stream one after another, and turns the payload of one frame
+    back into a dict. The codec of a connection is picked at registration
+    from the ones offered by the worker, see ``BeetleRPCServer.negotiate``.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:46
+    @python version: 3.8
+"""
+
+import io
+import struct
+import sys
+
+from six.moves import cPickle as pickle
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+CODECS = {}
+
+# Preferred first, used when a worker does not say what it wants
+DEFAULT_CODECS = ['pickle5', 'pickle']
+
+
+def register_codec(codec):
+    """Make a codec available for negotiation"""
+    CODECS[codec.name] = codec
+    return codec
+
+
+def get_codec(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError('Unknown codec: %s' % name)
+
+
+def available_codecs(names=None):
+    """Filter codec names down to the registered ones, keep the order"""
+    return [name for name in (names or DEFAULT_CODECS) if name in CODECS]
+
+
+class Codec(object):
+
+    name = None
+
+    def encode(self, obj):
+        """Return a list of buffers, their concatenation is the payload"""
+        raise NotImplementedError
+
+    def decode(self, data):
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    """Pickle protocol 2, understood by every worker"""
+
+    name = 'pickle'
+
+    def encode(self, obj):
+        return [pickle.dumps(obj, protocol=2)]
+
+    def decode(self, data):
+        if sys.version_info.major > 2:
+            return pickle.loads(data, encoding='latin1')
+        return pickle.loads(data)
+
+
+register_codec(PickleCodec())
+
+
+if hasattr(pickle, 'PickleBuffer'):
+
+    _COUNT = struct.Struct('!I')
+    _LENGTH = struct.Struct('!Q')
+
+    class _OutOfBandPickler(pickle.Pickler):
+
+        threshold = 4096
+
+        def reducer_override(self, obj):
+            # bytes are always pickled in band, wrap the large ones so
+            # their memory goes to the stream untouched
+            if type(obj) is bytes and len(obj) >= self.threshold:
+                return bytes, (pickle.PickleBuffer(obj), )
+            return NotImplemented
+
+    class Pickle5Codec(Codec):
+        """
+        Pickle protocol 5, large bytes are sent as out-of-band buffers::
+
+            count:4 | length:8 * count | pickle | buffer * count
+        """
+
+        name = 'pickle5'
+
+        def encode(self, obj):
+            buffers = []
+            out = io.BytesIO()
+            _OutOfBandPickler(
+                out, protocol=5, buffer_callback=buffers.append
+            ).dump(obj)
+            raws = [buf.raw() for buf in buffers]
+            head = _COUNT.pack(len(raws)) + b''.join(
+                _LENGTH.pack(raw.nbytes) for raw in raws
+            )
+            return [head, out.getbuffer()] + raws
+
+        def decode(self, data):
+            view = memoryview(data)
+            count, = _COUNT.unpack_from(view, 0)
+            offset = _COUNT.size
+            lengths = []
+            for _ in range(count):
+                lengths.append(_LENGTH.unpack_from(view, offset)[0])
+                offset += _LENGTH.size
+            end = len(view) - sum(lengths)
+            buffers = []
+            start = end
+            for length in lengths:
+                buffers.append(view[start:start + length])
+                start += length
+            return pickle.loads(view[offset:end], buffers=buffers)
+
+    register_codec(Pickle5Codec())
+
+
+if msgpack is not None:
+
+    class MsgpackCodec(Codec):
+        """
+        Msgpack, for workers not written in Python. Only plain types go
+        through: tuples come back as lists and ``HTTPFile`` as dict.
+        """
+
+        name = 'msgpack'
+
+        def encode(self, obj):
+            return [msgpack.packb(obj, use_bin_type=True)]
+
+        def decode(self, data):
+            return msgpack.unpackb(data, raw=False)
+
+    register_codec(MsgpackCodec())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    compression.py
+      ~~~~~
+
+    Frame payload compressions.
+
+    A worker offers the compressions it wants in order of preference at
+    registration, the server picks the first one it has too. Frames at
+    least ``threshold`` bytes long are then compressed one by one and
+    sent with ``FLAG_COMPRESSED``, see ``MessageStream``. zlib is always
+    there, lz4 and zstd when ``lz4`` and ``zstandard`` are installed.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:46
+    @python version: 3.8
+"""
+
+import zlib
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSORS = {}
+
+
+class CompressionError(Exception):
+    pass
+
+
+def register_compressor(compressor):
+    """Make a compression available for negotiation"""
+    COMPRESSORS[compressor.name] = compressor
+    return compressor
+
+
+def get_compressor(name):
+    try:
+        return COMPRESSORS[name]
+    except KeyError:
+        raise ValueError('Unknown compression: %s' % name)
+
+
+def available_compressors(names):
+    """Filter compression names down to the registered ones, keep order"""
+    return [name for name in names or () if name in COMPRESSORS]
+
+
+class Compressor(object):
+
+    name = None
+
+    def compress(self, buffers):
+        """One compressed payload of the concatenation of ``buffers``"""
+        raise NotImplementedError
+
+    def decompress(self, data, max_size):
+        """Raise CompressionError beyond ``max_size`` bytes"""
+        raise NotImplementedError
+
+
+class ZlibCompressor(Compressor):
+    """zlib at its fastest level, the payloads are mostly pickles"""
+
+    name = 'zlib'
+    level = 1
+
+    def compress(self, buffers):
+        compressor = zlib.compressobj(self.level)
+        parts = [compressor.compress(buf) for buf in buffers]
+        parts.append(compressor.flush())
+        return b''.join(parts)
+
+    def decompress(self, data, max_size):
+        decompressor = zlib.decompressobj()
+        try:
+            out = decompressor.decompress(data, max_size)
+        except zlib.error as e:
+            raise CompressionError(str(e))
+        if decompressor.unconsumed_tail:
+            raise CompressionError('Decompressed frame too large')
+        if not decompressor.eof:
+            raise CompressionError('Truncated compressed frame')
+        return out
+
+
+register_compressor(ZlibCompressor())
+
+
+if lz4 is not None:
+
+    class Lz4Compressor(Compressor):
+        """LZ4 frames, the cheapest on CPU"""
+
+        name = 'lz4'
+
+        def compress(self, buffers):
+            compressor = lz4.frame.LZ4FrameCompressor()
+            parts = [compressor.begin()]
+            parts.extend(compressor.compress(buf) for buf in buffers)
+            parts.append(compressor.flush())
+            return b''.join(parts)
+
+        def decompress(self, data, max_size):
+            decompressor = lz4.frame.LZ4FrameDecompressor()
+            try:
+                out = decompressor.decompress(data, max_length=max_size)
+            except RuntimeError as e:
+                raise CompressionError(str(e))
+            if not decompressor.eof:
+                raise CompressionError('Decompressed frame too large')
+            return out
+
+    register_compressor(Lz4Compressor())
+
+
+if zstandard is not None:
+
+    class ZstdCompressor(Compressor):
+        """Zstandard, better ratios than zlib for less CPU"""
+
+        name = 'zstd'
+        level = 3
+
+        def compress(self, buffers):
+            compressor = zstandard.ZstdCompressor(
+                level=self.level
+            ).compressobj()
+            parts = [compressor.compress(buf) for buf in buffers]
+            parts.append(compressor.flush())
+            return b''.join(parts)
+
+        def decompress(self, data, max_size):
+            try:
+                return zstandard.ZstdDecompressor().decompress(
+                    data, max_output_size=max_size
+                )
+            except zstandard.ZstdError as e:
+                raise CompressionError(str(e))
+
+    register_compressor(ZstdCompressor())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    shm.py
+      ~~~~~
+
+    Shared memory handoff of large payloads to workers on the same host.
+
+    The server maps a file of ``/dev/shm`` per worker connection, copies
+    large bytes of the request into it and sends a ``ShmRef`` in their
+    place. The worker maps the same file and hands the method a
+    memoryview of the block, the bytes are not copied again. A block is
+    freed when the response of its request comes back: by then the
+    worker is done with it. Workers answer dropped requests too when
+    shared memory is on, so that their blocks come back as well.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:46
+    @python version: 3.8
+"""
+
+import collections
+import mmap
+import os
+import tempfile
+
+from beehive.message.blobs import Blob
+
+ShmRef = collections.namedtuple('ShmRef', ['offset', 'length'])
+
+SHM_DIR = '/dev/shm'
+
+
+class _Block(object):
+
+    __slots__ = ('offset', 'end', 'freed')
+
+    def __init__(self, offset, end):
+        self.offset = offset
+        self.end = end
+        self.freed = False
+
+
+class SharedRing(object):
+    """
+    Server side: a ring of ``size`` bytes. Blocks are taken in order at
+    the tail and may be freed in any order, the head moves past the
+    freed ones at the front.
+    """
+
+    # Smaller bytes are cheaper to send inline
+    min_size = 16 * 1024
+    align = 64
+
+    def __init__(self, size, directory=None):
+        if directory is None and os.path.isdir(SHM_DIR):
+            directory = SHM_DIR
+        fd, self.path = tempfile.mkstemp(prefix='beehive-', dir=directory)
+        try:
+            os.ftruncate(fd, size)
+            self.mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.size = size
+        # _Block of the live blocks in allocation order
+        self._blocks = collections.deque()
+        self._offsets = {}
+        self.handoffs = 0
+        self.handoff_bytes = 0
+        self.full = 0
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def alloc(self, length):
+        """Offset of a free block of ``length`` bytes, None if full"""
+        length = -(-length // self.align) * self.align
+        if not self._blocks:
+            offset = 0 if length <= self.size else None
+        else:
+            head = self._blocks[0].offset
+            tail = self._blocks[-1].end
+            if self._blocks[-1].offset < head:
+                # Wrapped: free space is between tail and head
+                offset = tail if tail + length <= head else None
+            elif tail + length <= self.size:
+                offset = tail
+            else:
+                offset = 0 if length <= head else None
+        if offset is None:
+            return None
+        block = _Block(offset, offset + length)
+        self._blocks.append(block)
+        self._offsets[offset] = block
+        return offset
+
+    def put(self, data):
+        """Copy ``data`` into a block, return its ShmRef or None if full"""
+        length = memoryview(data).nbytes
+        offset = self.alloc(length)
+        if offset is None:
+            self.full += 1
+            return None
+        self.mmap[offset:offset + length] = data
+        self.handoffs += 1
+        self.handoff_bytes += length
+        return ShmRef(offset, length)
+
+    def free(self, offset):
+        block = self._offsets.pop(offset, None)
+        if block is None:
+            return
+        block.freed = True
+        while self._blocks and self._blocks[0].freed:
+            self._blocks.popleft()
+
+    def export(self, obj, refs):
+        """
+        Copy of ``obj`` with its large bytes moved into the ring. Dicts,
+        lists and tuples are walked, the offsets taken go to ``refs``.
+        """
+        if isinstance(obj, (bytes, bytearray)):
+            if len(obj) < self.min_size:
+                return obj
+            ref = self.put(obj)
+            if ref is None:
+                return obj
+            refs.append(ref.offset)
+            return ref
+        if isinstance(obj, Blob):
+            return Blob(obj.digest, self.export(obj.data, refs))
+        if isinstance(obj, dict):
+            return type(obj)(
+                (key, self.export(value, refs)) for key, value in obj.items()
+            )
+        if type(obj) in (list, tuple):
+            return type(obj)(self.export(value, refs) for value in obj)
+        return obj
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'blocks': len(self._offsets),
+            'handoffs': self.handoffs,
+            'bytes': self.handoff_bytes,
+            'full': self.full,
+        }
+
+    def close(self):
+        try:
+            self.mmap.close()
+        finally:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class SharedSegment(object):
+    """Worker side: the ring of the server mapped read only"""
+
+    def __init__(self, path, size):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+    def resolve(self, obj, copy=False):
+        """
+        Copy of ``obj`` with every ShmRef replaced by a memoryview of its
+        block, valid until the request is answered. ``copy`` gives bytes
+        instead, for methods run in another process.
+        """
+        if isinstance(obj, ShmRef):
+            view = self.view[obj.offset:obj.offset + obj.length]
+            return view.tobytes() if copy else view
+        if isinstance(obj, Blob):
+            return Blob(obj.digest, self.resolve(obj.data, copy))
+        if isinstance(obj, dict):
+            return type(obj)(
+                (key, self.resolve(value, copy)) for key, value in obj.items()
+            )
+        if type(obj) in (list, tuple):
+            return type(obj)(self.resolve(value, copy) for value in obj)
+        return obj
+
+    def close(self):
+        self.view.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            # A method kept a view of a block
+            pass
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    stream.py
+      ~~~~~
+
+    Message framing on top of a tornado IOStream.
+
+    A connection starts in the legacy mode, every pickled message is
+    terminated by ``BEETLE_EOM``. Peers that both support it switch to
+    length-prefixed frames right after registration::
+
+        +--------+--------+----------------+------------------+
+        | type:1 | flags:1| length:4 (BE)  | payload (length) |
+        +--------+--------+----------------+------------------+
+
+    With a compression negotiated as well, payloads of at least
+    ``compression_threshold`` bytes are compressed when that makes them
+    smaller and flagged ``FLAG_COMPRESSED``.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:46
+    @python version: 3.8
+"""
+
+import struct
+import time
+
+from tornado import gen
+
+from . import RPCMessage
+from .codec import get_codec
+from .compression import CompressionError, get_compressor
+
+FRAME_HEADER = struct.Struct('!BBI')
+
+FLAG_COMPRESSED = 0x01
+
+
+class FrameType(object):
+    Message = 1
+
+
+class FrameError(Exception):
+    pass
+
+
+class MessageStream(object):
+    """
+    Read and write RPCMessage over a stream, in legacy or framed mode
+    """
+
+    EOM = b'BEETLE_EOM'
+    max_frame_size = 64 * 1024 * 1024
+
+    def __init__(self, stream):
+        self.stream = stream
+        # Frames go out as header and payload writes, do not let Nagle
+        # hold the payload back until the header is acknowledged
+        stream.set_nodelay(True)
+        self.framed = False
+        self.codec = get_codec('pickle')
+        self.compressor = None
+        self.compression_threshold = 1024
+        # Compression counters: frames sent compressed, their payload
+        # bytes before and after, frames left as they were because they
+        # did not get smaller, and thread CPU seconds spent both ways
+        self.compressed_frames = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self.incompressible_frames = 0
+        self.compress_time = 0.0
+        self.decompressed_frames = 0
+        self.decompress_time = 0.0
+
+    def upgrade(
+        self,
+        framed=False,
+        codec='pickle',
+        compression=None,
+        compression_threshold=1024,
+        **kwargs
+    ):
+        """Apply the wire options negotiated at registration"""
+        self.framed = bool(framed)
+        self.codec = get_codec(codec)
+        self.compressor = None
+        if self.framed and compression:
+            self.compressor = get_compressor(compression)
+            self.compression_threshold = compression_threshold
+
+    @gen.coroutine
+    def read_frame(self):
+        header = yield self.stream.read_bytes(FRAME_HEADER.size)
+        frame_type, flags, length = FRAME_HEADER.unpack(header)
+        if length > self.max_frame_size:
+            raise FrameError('Frame too large: %d' % length)
+        payload = yield self.stream.read_bytes(length)
+        raise gen.Return((frame_type, flags, payload))
+
+    def write_frame(self, frame_type, flags, buffers):
+        # Header and buffers are written separately so the payload is
+        # not copied into a new buffer.
+        length = sum(memoryview(buf).nbytes for buf in buffers)
+        self.stream.write(FRAME_HEADER.pack(frame_type, flags, length))
+        for buf in buffers:
+            self.stream.write(buf)
+
+    def compress(self, buffers):
+        """Buffers and flags of a frame payload"""
+        length = sum(memoryview(buf).nbytes for buf in buffers)
+        if length < self.compression_threshold:
+            return buffers, 0
+        start = time.thread_time()
+        data = self.compressor.compress(buffers)
+        self.compress_time += time.thread_time() - start
+        if len(data) >= length:
+            self.incompressible_frames += 1
+            return buffers, 0
+        self.compressed_frames += 1
+        self.raw_bytes += length
+        self.compressed_bytes += len(data)
+        return [data], FLAG_COMPRESSED
+
+    def decompress(self, data):
+        if self.compressor is None:
+            raise FrameError('Compressed frame, no compression negotiated')
+        start = time.thread_time()
+        try:
+            data = self.compressor.decompress(data, self.max_frame_size)
+        except CompressionError as e:
+            raise FrameError(str(e))
+        self.decompress_time += time.thread_time() - start
+        self.decompressed_frames += 1
+        return data
+
+    def compression_stats(self):
+        return {
+            'compression': self.compressor and self.compressor.name,
+            'threshold': self.compression_threshold,
+            'frames': self.compressed_frames,
+            'raw_bytes': self.raw_bytes,
+            'compressed_bytes': self.compressed_bytes,
+            'saved_bytes': self.raw_bytes - self.compressed_bytes,
+            'incompressible_frames': self.incompressible_frames,
+            'compress_time': self.compress_time,
+            'decompressed_frames': self.decompressed_frames,
+            'decompress_time': self.decompress_time,
+        }
+
+    @gen.coroutine
+    def read_message(self):
+        if self.framed:
+            frame_type, flags, data = yield self.read_frame()
+            if frame_type != FrameType.Message:
+                raise FrameError('Unexpected frame type: %d' % frame_type)
+            if flags & FLAG_COMPRESSED:
+                data = self.decompress(data)
+        else:
+            data = yield self.stream.read_until(self.EOM)
+            data = data[:-len(self.EOM)]
+        raise gen.Return(RPCMessage.from_dict(self.codec.decode(data)))
+
+    def write_message(self, msg):
+        buffers = self.codec.encode(dict(msg))
+        if self.framed:
+            flags = 0
+            if self.compressor is not None:
+                buffers, flags = self.compress(buffers)
+            self.write_frame(FrameType.Message, flags, buffers)
+        else:
+            self.stream.write(b''.join(buffers) + self.EOM)
@@ -57,6 +57,29 @@ def server(ctx):
         rpc_port=config['rpc_port'],
         api_host=config['api_host'],
         api_port=config['api_port'],
+        rpc_unix_socket=config['rpc_unix_socket'],
+        shared_memory=config['shared_memory'],
+        compression=config['compression'],
+        scheduler=config['scheduler'],
+        queue_size=config['queue_size'],
+        queue_timeout=config['queue_timeout'],
+        batch_max_size=config['batch_max_size'],
+        batch_max_delay=config['batch_max_delay'],
+        heartbeat_interval=config['heartbeat_interval'],
+        heartbeat_timeout=config['heartbeat_timeout'],
+        heartbeat_max_missed=config['heartbeat_max_missed'],
+        outlier_detection=config['outlier_detection'],
+        circuit_breaker=config['circuit_breaker'],
+        result_cache=config['result_cache'],
+        single_flight=config['single_flight'],
+        max_body_size=config['max_body_size'],
+        batch_max_in_flight=config['batch_max_in_flight'],
+        jobs=config['jobs'],
+        ws_max_in_flight=config['ws_max_in_flight'],
+        processes=config['processes'],
+        dispatcher_socket=config['dispatcher_socket'],
+        dispatcher_connect_timeout=config['dispatcher_connect_timeout'],
+        dispatcher_call_timeout=config['dispatcher_call_timeout'],
     )
 
     inst.run()
@@ -11,27 +11,142 @@
 """
 
 import logging
+import os
+import signal
 
-from tornado.ioloop import IOLoop
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.netutil import bind_sockets, bind_unix_socket
+from tornado.process import cpu_count
 
 from beehive.libs.pyrestful.rest import RestService
-from beehive.server.api.crack import CrackHandler
+from beehive.libs.signal_helper import add_shutdown_handler
+from beehive.server.api.crack import (
+    CrackBatchHandler, CrackHandler, CrackRawHandler, CrackStreamHandler
+)
+from beehive.server.api.jobs import JobHandler
+from beehive.server.api.stats import StatsHandler
+from beehive.server.api.ws import CrackWebSocketHandler
+from beehive.server.crack_service import CrackService
+from beehive.server.dispatcher import (
+    DispatcherClient, DispatcherServer, RemoteJobService
+)
+from beehive.server.jobs import JobService, JobStore
 from beehive.server.rpc_server import BeetleRPCServer
 
 
 class BeetleServer(object):
 
-    def __init__(self, rpc_host, rpc_port, api_host, api_port):
+    def __init__(
+        self,
+        rpc_host,
+        rpc_port,
+        api_host,
+        api_port,
+        rpc_unix_socket=None,
+        shared_memory=0,
+        compression=True,
+        scheduler='least_outstanding',
+        queue_size=100,
+        queue_timeout=10,
+        batch_max_size=32,
+        batch_max_delay=0.005,
+        heartbeat_interval=5,
+        heartbeat_timeout=3,
+        heartbeat_max_missed=3,
+        outlier_detection=None,
+        circuit_breaker=None,
+        result_cache=None,
+        single_flight=True,
+        max_body_size=256 * 1024 * 1024,
+        batch_max_in_flight=32,
+        jobs=None,
+        ws_max_in_flight=32,
+        processes=1,
+        dispatcher_socket=None,
+        dispatcher_connect_timeout=5,
+        dispatcher_call_timeout=60,
+    ):
         self.ioloop = IOLoop.current()
-        self.rpc_server = BeetleRPCServer(rpc_host, rpc_port)
-        self.rest_app = RestService(
-            [CrackHandler], dict(rpc_server=self.rpc_server)
+        self.rpc_server = BeetleRPCServer(
+            rpc_host,
+            rpc_port,
+            scheduler=scheduler,
+            queue_size=queue_size,
+            queue_timeout=queue_timeout,
+            batch_max_size=batch_max_size,
+            batch_max_delay=batch_max_delay,
+            heartbeat_interval=heartbeat_interval,
+            heartbeat_timeout=heartbeat_timeout,
+            heartbeat_max_missed=heartbeat_max_missed,
+            outlier_detection=outlier_detection,
+            circuit_breaker=circuit_breaker,
+            unix_socket=rpc_unix_socket,
+            shared_memory=shared_memory,
+            compression=compression,
+        )
+        self.crack_service = CrackService(
+            self.rpc_server,
+            result_cache=result_cache,
+            single_flight=single_flight,
+        )
+        self.job_store = JobStore(**(jobs or {}))
+        self.jobs = JobService(self.job_store, self.crack_service)
+        self.max_body_size = max_body_size
+        self.batch_max_in_flight = batch_max_in_flight
+        self.ws_max_in_flight = ws_max_in_flight
+        self.rest_app = self.make_app(
+            self.rpc_server, self.crack_service, self.jobs
         )
         self.api_host = api_host
         self.api_port = api_port
+        # HTTP front end processes, 0 for one per CPU, 1 serves the API
+        # from this process
+        self.processes = processes or cpu_count()
+        self.dispatcher_socket = dispatcher_socket or \
+            '/tmp/beehive-dispatcher-%d.sock' % api_port
+        self.dispatcher_connect_timeout = dispatcher_connect_timeout
+        self.dispatcher_call_timeout = dispatcher_call_timeout
+        # pid of the process that forks the front ends, and in that
+        # process pid -> index of the front ends
+        self.supervisor = None
+        self.front_ends = {}
+        self._is_exiting = False
         self.logger = logging.getLogger('BeetleServer')
 
+    def make_app(self, rpc_server, crack_service, jobs):
+        return RestService(
+            [
+                CrackHandler,
+                CrackRawHandler,
+                CrackBatchHandler,
+                CrackStreamHandler,
+                JobHandler,
+                StatsHandler,
+            ],
+            dict(
+                rpc_server=rpc_server,
+                crack_service=crack_service,
+                jobs=jobs,
+            ),
+            handlers=[
+                (
+                    r'/api/ws/crack',
+                    CrackWebSocketHandler,
+                    dict(
+                        crack_service=crack_service,
+                        max_in_flight=self.ws_max_in_flight,
+                    ),
+                ),
+            ],
+            max_body_size=self.max_body_size,
+            batch_max_in_flight=self.batch_max_in_flight,
+        )
+
     def run(self):
+        if self.processes > 1:
+            self.run_processes()
+            return
         self.logger.info('BeetleServer starts')
         self.rpc_server.run()
         self.rest_app.listen(self.api_port, address=self.api_host)
@@ -41,3 +156,133 @@ class BeetleServer(object):
         self.ioloop.start()
         self.logger.info('BeetleServer stopped')
 
+    def run_processes(self):
+        """
+        Pre-fork mode: ``processes`` front end processes accept on the
+        API port and run the handlers, this process is the dispatcher
+        they send cracks and jobs to over a Unix socket. The front ends
+        are forked, and forked again when they die, by a supervisor
+        process forked first: it holds none of the worker connections,
+        RPC listeners or shared memory of the dispatcher, nor do they.
+        """
+        self.logger.info(
+            'BeetleServer starts with %d front ends', self.processes
+        )
+        # Bound before forking, every front end accepts on the same socket
+        self.http_sockets = bind_sockets(self.api_port, self.api_host)
+        self.dispatcher_sock = bind_unix_socket(self.dispatcher_socket)
+        pid = os.fork()
+        if not pid:
+            status = 0
+            try:
+                self.run_supervisor()
+            except Exception as e:
+                self.logger.exception(e)
+                status = 1
+            finally:
+                os._exit(status)
+        self.supervisor = pid
+        for sock in self.http_sockets:
+            sock.close()
+
+        self.rpc_server.run()
+        dispatcher = DispatcherServer(self.crack_service, self.jobs)
+        dispatcher.add_socket(self.dispatcher_sock)
+        add_shutdown_handler(self.stop_front_ends)
+        PeriodicCallback(self.reap_supervisor, 1000).start()
+        self.logger.info(
+            'API Service listen to: (%s, %s)', self.api_host, self.api_port
+        )
+        self.ioloop.start()
+        self.logger.info('BeetleServer stopped')
+
+    def run_supervisor(self):
+        """
+        Body of the supervisor process: fork the front ends and again
+        those that exit, until SIGTERM, which goes on to the front ends
+        """
+        self.dispatcher_sock.close()
+
+        def stop(*args):
+            self._is_exiting = True
+            for pid in self.front_ends:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for index in range(self.processes):
+            self.fork_front_end(index)
+        while self.front_ends:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                return
+            index = self.front_ends.pop(pid, None)
+            if index is None or self._is_exiting:
+                continue
+            self.logger.warning(
+                'Front end %d exited with %d, restarting', index, status
+            )
+            self.fork_front_end(index)
+
+    def fork_front_end(self, index):
+        pid = os.fork()
+        if pid:
+            self.front_ends[pid] = index
+            return
+        status = 0
+        try:
+            self.run_front_end(index)
+        except Exception as e:
+            self.logger.exception(e)
+            status = 1
+        finally:
+            os._exit(status)
+
+    def run_front_end(self, index):
+        """Body of a front end process, never returns to the caller"""
+        # The IOLoop of the dispatcher is not shared, nor its shutdown
+        # handlers or a signal wakeup fd it may have set: IOLoop.start
+        # would keep it and not wake up for the front end's own signals.
+        signal.set_wakeup_fd(-1)
+        ioloop = IOLoop()
+        ioloop.make_current()
+
+        def stop(*args):
+            ioloop.add_callback_from_signal(ioloop.stop)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        client = DispatcherClient(
+            self.dispatcher_socket,
+            connect_timeout=self.dispatcher_connect_timeout,
+            call_timeout=self.dispatcher_call_timeout,
+        )
+        app = self.make_app(None, client, RemoteJobService(client))
+        HTTPServer(app).add_sockets(self.http_sockets)
+        self.logger.info('Front end %d started, pid %d', index, os.getpid())
+        ioloop.start()
+
+    def reap_supervisor(self):
+        try:
+            pid, status = os.waitpid(self.supervisor, os.WNOHANG)
+        except OSError:
+            return
+        if pid == 0 or self._is_exiting:
+            return
+        # Forked from here, front ends would hold the worker connections
+        self.logger.error(
+            'Front end supervisor exited with %d, stopping', status
+        )
+        self.rpc_server.shutdown(signal.SIGTERM, None)
+
+    def stop_front_ends(self, sig, frame):
+        self._is_exiting = True
+        try:
+            os.kill(self.supervisor, signal.SIGTERM)
+        except OSError:
+            pass
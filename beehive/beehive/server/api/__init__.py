@@ -19,6 +19,8 @@ from beehive.libs.pyrestful.rest import RestHandler
 
 class BaseRequestHandler(RestHandler):
 
-    def initialize(self, rpc_server):
+    def initialize(self, rpc_server, crack_service, jobs):
         self.rpc_server = rpc_server
+        self.crack_service = crack_service
+        self.jobs = jobs
         self.logger = logging.getLogger('api')
\ No newline at end of file
@@ -10,22 +10,136 @@
     @python version: 3.8
 """
 
+import json
+import struct
 
 from tornado import gen
+from tornado.escape import utf8
+from tornado.httputil import HTTPFile
+from tornado.iostream import StreamClosedError
+from tornado.locks import Semaphore
+from tornado.web import stream_request_body
 
+from beehive.libs.json_helper import JsonEncoder
+from beehive.libs.multipart import (
+    MultipartError, MultipartParser, parse_boundary
+)
 from beehive.libs.pyrestful import mediatypes
 from beehive.libs.pyrestful.rest import delete, get, post, put
+from beehive.server.rpc_server.context import RequestContext
+from beehive.server.rpc_server.errors import (
+    CircuitOpenError, DeadlineExceededError, DispatcherUnavailableError,
+    NoClientError, QueueFullError, QueueTimeoutError, RequestCancelledError
+)
 
 from . import BaseRequestHandler
 
+BATCH_ITEM = struct.Struct('!I')
+
 
 class Error(object):
     WRONG_PARAMETER = {'err': 1000, 'msg': 'Wrong parameter'}
     CRACKER_NOT_FOUND = {'err': 1001, 'msg': 'Cracker not found'}
     SERVER_ERROR = {'err': 1002, 'msg': 'Server error'}
+    QUEUE_FULL = {'err': 1003, 'msg': 'Too many requests'}
+    QUEUE_TIMEOUT = {'err': 1004, 'msg': 'No cracker available'}
+    BODY_TOO_LARGE = {'err': 1005, 'msg': 'Request body too large'}
+    JOB_NOT_FOUND = {'err': 1006, 'msg': 'Job not found'}
+    TOO_MANY_JOBS = {'err': 1007, 'msg': 'Too many jobs'}
+    DEADLINE_EXCEEDED = {'err': 1008, 'msg': 'Deadline exceeded'}
+    REQUEST_CANCELLED = {'err': 1009, 'msg': 'Request cancelled'}
+    CIRCUIT_OPEN = {'err': 1010, 'msg': 'Cracker unavailable'}
+    DISPATCHER_UNAVAILABLE = {'err': 1011, 'msg': 'Service unavailable'}
+
+
+def crack_error(e):
+    """HTTP status and error body of a failed crack"""
+    if isinstance(e, NoClientError):
+        return 404, Error.CRACKER_NOT_FOUND
+    if isinstance(e, QueueFullError):
+        return 429, Error.QUEUE_FULL
+    if isinstance(e, QueueTimeoutError):
+        return 503, Error.QUEUE_TIMEOUT
+    if isinstance(e, DeadlineExceededError):
+        return 504, Error.DEADLINE_EXCEEDED
+    if isinstance(e, RequestCancelledError):
+        return 503, Error.REQUEST_CANCELLED
+    if isinstance(e, CircuitOpenError):
+        return 503, Error.CIRCUIT_OPEN
+    if isinstance(e, DispatcherUnavailableError):
+        return 503, Error.DISPATCHER_UNAVAILABLE
+    return 500, Error.SERVER_ERROR
+
+
+class CrackBaseHandler(BaseRequestHandler):
+    """
+    Cracks run within the ``X-Request-Timeout`` (seconds) of the request
+    and are cancelled when the client disconnects
+    """
+
+    HEADER_PREFIX = 'X-Crack-'
+    FIELD_HEADER = 'X-Crack-Field'
+    FILENAME_HEADER = 'X-Crack-Filename'
+    TIMEOUT_HEADER = 'X-Request-Timeout'
+
+    def initialize(self, **kwargs):
+        super(CrackBaseHandler, self).initialize(**kwargs)
+        self.context = RequestContext(self.request_timeout())
+
+    def request_timeout(self):
+        """Seconds of the timeout header, None if missing or invalid"""
+        try:
+            timeout = float(self.request.headers.get(self.TIMEOUT_HEADER))
+        except (TypeError, ValueError):
+            return None
+        return timeout if timeout > 0 else None
+
+    def on_connection_close(self):
+        self.context.cancel()
+        super(CrackBaseHandler, self).on_connection_close()
+
+    @gen.coroutine
+    def do_crack(self, cracker_type, params):
+        """Crack ``params`` and map dispatch errors to HTTP errors"""
+        try:
+            ret = yield self.crack_service.crack(
+                cracker_type, params, self.context
+            )
+        except Exception as e:
+            status, error = crack_error(e)
+            if status == 500:
+                self.logger.exception(e)
+            raise gen.Return(self.gen_http_error(status, error))
+
+        raise gen.Return({'ret': ret})
+
+    def header_params(self):
+        """Query arguments and ``X-Crack-<name>`` headers as crack params"""
+        params = {}
+        for name, values in self.request.query_arguments.items():
+            params[name] = list(values)
+        for name, value in self.request.headers.get_all():
+            if not name.startswith(self.HEADER_PREFIX) or \
+                    name in (self.FIELD_HEADER, self.FILENAME_HEADER):
+                continue
+            name = name[len(self.HEADER_PREFIX):].lower().replace('-', '_')
+            params.setdefault(name, []).append(utf8(value))
+        return params
+
+    def body_file(self, body):
+        """``body`` as a file named by the X-Crack-Field/Filename headers"""
+        headers = self.request.headers
+        field = headers.get(self.FIELD_HEADER, 'file')
+        return field, HTTPFile(
+            filename=headers.get(self.FILENAME_HEADER, field),
+            body=body,
+            content_type=headers.get(
+                'Content-Type', 'application/octet-stream'
+            ),
+        )
 
 
-class CrackHandler(BaseRequestHandler):
+class CrackHandler(CrackBaseHandler):
 
     @post(
         path='/api/crack/{cracker_type}',
@@ -45,15 +159,219 @@ class CrackHandler(BaseRequestHandler):
         params.update(arguments)
         params.update(files)
 
-        cracker_client = self.rpc_server.get_random_client(cracker_type)
+        ret = yield self.do_crack(cracker_type, params)
+        raise gen.Return(ret)
+
+
+class CrackRawHandler(CrackBaseHandler):
+    """
+    The image is the request body as is, options come as query arguments
+    or ``X-Crack-<name>`` headers. The body reaches the worker as the one
+    file of the request, named by the ``X-Crack-Field`` (default
+    ``file``) and ``X-Crack-Filename`` headers, without any multipart
+    encoding on either side.
+    """
+
+    @post(
+        path='/api/crack/{cracker_type}/raw',
+        produces=mediatypes.APPLICATION_JSON,
+    )
+    @gen.coroutine
+    def crack(self, cracker_type):
+        """
+        ## Crack, raw body
+
+            POST '/api/crack/<cracker_type>/raw'
+        """
+        params = self.header_params()
+        field, image = self.body_file(self.request.body)
+        params[field] = [image]
+
+        ret = yield self.do_crack(cracker_type, params)
+        raise gen.Return(ret)
+
+
+def split_batch_body(body):
+    """Items of a body made of 4 byte big endian length + data records"""
+    items = []
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        if offset + BATCH_ITEM.size > len(view):
+            raise ValueError('Truncated batch item length')
+        size, = BATCH_ITEM.unpack_from(view, offset)
+        offset += BATCH_ITEM.size
+        if offset + size > len(view):
+            raise ValueError('Truncated batch item')
+        items.append(bytes(view[offset:offset + size]))
+        offset += size
+    return items
+
+
+class CrackBatchHandler(CrackBaseHandler):
+    """
+    Many images in one request, each cracked as a request of its own and
+    sent to workers concurrently, at most ``batch_max_in_flight`` (app
+    setting) at a time so that large batches do not overflow the pending
+    queue of the type. The others start as those finish. Workers that
+    take batches get them as ``crack_batch`` calls through the
+    dispatcher's batcher.
+
+    A multipart body gives one item per file, its other fields are
+    options shared by all items. Any other body is a sequence of 4 byte
+    big endian length prefixed images, with options and file naming as
+    for the raw endpoint.
+
+    Results are in request order, each ``{"ret": ...}`` or an error. With
+    ``Accept: application/x-ndjson`` every item is written as one line
+    ``{"index": i, ...}`` as soon as it finishes instead.
+    """
+
+    NDJSON = 'application/x-ndjson'
 
-        if not cracker_client:
-            raise gen.Return(self.gen_http_error(404, Error.CRACKER_NOT_FOUND))
+    def batch_items(self):
+        """Params of each item, None if the body is malformed"""
+        content_type = self.request.headers.get('Content-Type', '')
+        items = []
+        if content_type.startswith('multipart/form-data'):
+            options = dict(self.request.arguments)
+            for field, files in self.request.files.items():
+                for image in files:
+                    params = dict(options)
+                    params[field] = [image]
+                    items.append(params)
+            return items
 
+        options = self.header_params()
         try:
-            ret = yield cracker_client.crack(params)
-        except Exception as e:
-            self.logger.exception(e)
-            raise gen.Return(self.gen_http_error(500, Error.SERVER_ERROR))
+            bodies = split_batch_body(self.request.body)
+        except ValueError:
+            return None
+        for body in bodies:
+            params = dict(options)
+            field, image = self.body_file(body)
+            params[field] = [image]
+            items.append(params)
+        return items
+
+    @gen.coroutine
+    def crack_item(self, cracker_type, params, slots):
+        with (yield slots.acquire()):
+            ret = yield self.crack_one(cracker_type, params)
+        raise gen.Return(ret)
 
+    @gen.coroutine
+    def crack_one(self, cracker_type, params):
+        try:
+            ret = yield self.crack_service.crack(
+                cracker_type, params, self.context
+            )
+        except Exception as e:
+            status, error = crack_error(e)
+            if status == 500:
+                self.logger.exception(e)
+            raise gen.Return(dict(error))
         raise gen.Return({'ret': ret})
+
+    @post(
+        path='/api/crack/{cracker_type}/batch',
+        produces=mediatypes.APPLICATION_JSON,
+    )
+    @gen.coroutine
+    def crack(self, cracker_type):
+        """
+        ## Crack a batch
+
+            POST '/api/crack/<cracker_type>/batch'
+        """
+        items = self.batch_items()
+        if not items:
+            raise gen.Return(self.gen_http_error(400, Error.WRONG_PARAMETER))
+
+        slots = Semaphore(self.settings.get('batch_max_in_flight', 32))
+        futures = [
+            self.crack_item(cracker_type, params, slots) for params in items
+        ]
+
+        if self.NDJSON not in self.request.headers.get('Accept', ''):
+            results = yield futures
+            raise gen.Return({'ret': results})
+
+        self.set_header('Content-Type', self.NDJSON)
+        waiter = gen.WaitIterator(*futures)
+        while not waiter.done():
+            result = yield waiter.next()
+            result['index'] = waiter.current_index
+            self.write(json.dumps(result, cls=JsonEncoder) + '\n')
+            try:
+                yield self.flush()
+            except StreamClosedError:
+                # The rest still finishes and fills the result cache
+                raise gen.Return()
+        self.finish()
+
+
+@stream_request_body
+class CrackStreamHandler(CrackBaseHandler):
+    """
+    Same as ``CrackHandler`` but the multipart body is parsed as it
+    arrives, Tornado does not buffer it whole before parsing. Bodies
+    larger than the ``max_body_size`` setting are refused.
+    """
+
+    def prepare(self):
+        self.parser = None
+        if self.request.method != 'POST':
+            return
+
+        max_body_size = self.settings.get('max_body_size')
+        if max_body_size:
+            self.request.connection.set_max_body_size(max_body_size)
+            length = self.request.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > max_body_size:
+                return self.gen_http_error(413, Error.BODY_TOO_LARGE)
+
+        boundary = parse_boundary(self.request.headers.get('Content-Type'))
+        if boundary is None:
+            return self.gen_http_error(400, Error.WRONG_PARAMETER)
+        self.parser = MultipartParser(boundary)
+
+    def data_received(self, chunk):
+        if self.parser is None or self._finished:
+            return
+        try:
+            self.parser.feed(chunk)
+        except MultipartError as e:
+            self.logger.warning('Bad multipart body: %s', e)
+            self.parser = None
+            self.gen_http_error(400, Error.WRONG_PARAMETER)
+
+    @post(
+        path='/api/crack/{cracker_type}/stream',
+        produces=mediatypes.APPLICATION_JSON,
+    )
+    @gen.coroutine
+    def crack(self, cracker_type):
+        """
+        ## Crack, streamed upload
+
+            POST '/api/crack/<cracker_type>/stream'
+        """
+        if self.parser is None:
+            # The body was refused while it streamed in
+            raise gen.Return()
+        try:
+            self.parser.close()
+        except MultipartError:
+            raise gen.Return(self.gen_http_error(400, Error.WRONG_PARAMETER))
+
+        params = {}
+        for name, values in self.request.query_arguments.items():
+            params[name] = list(values)
+        for name, values in self.parser.arguments.items():
+            params.setdefault(name, []).extend(values)
+        params.update(self.parser.files)
+        self.parser = None
+
+        ret = yield self.do_crack(cracker_type, params)
+        raise gen.Return(ret)
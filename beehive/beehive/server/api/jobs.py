@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    jobs.py
+      ~~~~~
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:42
+    @python version: 3.8
+"""
+
+from tornado import gen
+
+from beehive.libs.pyrestful import mediatypes
+from beehive.libs.pyrestful.rest import get, post
+from beehive.server.jobs import Job, JobStoreFullError
+from beehive.server.rpc_server.errors import DispatcherUnavailableError
+
+from .crack import CrackBaseHandler, Error, crack_error
+
+
+class JobHandler(CrackBaseHandler):
+
+    @post(
+        path='/api/jobs/{cracker_type}',
+        produces=mediatypes.APPLICATION_JSON,
+    )
+    @gen.coroutine
+    def submit(self, cracker_type):
+        """
+        ## Submit a crack job
+
+            POST '/api/jobs/<cracker_type>'
+
+        Same body as '/api/crack/<cracker_type>', answers 202 with the
+        job id right away
+        """
+        params = {}
+        params.update(self.request.arguments)
+        params.update(self.request.files)
+
+        # The job outlives this request, it only takes its timeout
+        try:
+            job_id = yield gen.maybe_future(
+                self.jobs.submit(cracker_type, params, self.request_timeout())
+            )
+        except JobStoreFullError:
+            raise gen.Return(self.gen_http_error(429, Error.TOO_MANY_JOBS))
+        except DispatcherUnavailableError:
+            raise gen.Return(
+                self.gen_http_error(503, Error.DISPATCHER_UNAVAILABLE)
+            )
+
+        self.set_status(202)
+        raise gen.Return({'job_id': job_id})
+
+    @get(
+        path='/api/jobs/{job_id}',
+        produces=mediatypes.APPLICATION_JSON,
+    )
+    @gen.coroutine
+    def job(self, job_id):
+        """
+        ## Job status and result
+
+            GET '/api/jobs/<job_id>?wait=<seconds>'
+
+        With ``wait`` a pending job is waited for up to that long, at
+        most the store's ``max_wait``
+        """
+        try:
+            wait = float(self.get_argument('wait', 0))
+        except ValueError:
+            raise gen.Return(self.gen_http_error(400, Error.WRONG_PARAMETER))
+        try:
+            job = yield gen.maybe_future(
+                self.jobs.wait(job_id, wait, self.context)
+            )
+        except DispatcherUnavailableError:
+            raise gen.Return(
+                self.gen_http_error(503, Error.DISPATCHER_UNAVAILABLE)
+            )
+        if job is None:
+            raise gen.Return(self.gen_http_error(404, Error.JOB_NOT_FOUND))
+
+        ret = {'job_id': job['job_id'], 'status': job['status']}
+        if job['status'] == Job.DONE:
+            ret['ret'] = job['result']
+        elif job['status'] == Job.FAILED:
+            _, error = crack_error(job['error'])
+            ret.update(error)
+        raise gen.Return(ret)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python 
+# -*- coding: utf-8 -*-
+"""
+    stats.py
+      ~~~~~
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:42
+    @python version: 3.8
+"""
+
+
+from tornado import gen
+
+from beehive.libs.pyrestful import mediatypes
+from beehive.libs.pyrestful.rest import get
+from beehive.server.rpc_server.errors import DispatcherUnavailableError
+
+from . import BaseRequestHandler
+from .crack import Error
+
+
+class StatsHandler(BaseRequestHandler):
+
+    @get(
+        path='/api/stats',
+        produces=mediatypes.APPLICATION_JSON,
+    )
+    @gen.coroutine
+    def stats(self):
+        """
+        ## Stats
+
+            GET '/api/stats'
+
+        Workers, pending queues and batches per cracker type, the result
+        cache and the job store counters
+        """
+        try:
+            stats = yield gen.maybe_future(self.crack_service.stats())
+            stats['jobs'] = yield gen.maybe_future(self.jobs.stats())
+        except DispatcherUnavailableError:
+            raise gen.Return(
+                self.gen_http_error(503, Error.DISPATCHER_UNAVAILABLE)
+            )
+        raise gen.Return(stats)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    ws.py
+      ~~~~~
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 20:42
+    @python version: 3.8
+"""
+
+import json
+import logging
+import struct
+
+from tornado import gen
+from tornado.httputil import HTTPFile, parse_qs_bytes
+from tornado.ioloop import IOLoop
+from tornado.locks import Semaphore
+from tornado.websocket import WebSocketClosedError, WebSocketHandler
+
+from beehive.libs.json_helper import JsonEncoder
+from beehive.server.rpc_server.context import RequestContext
+
+from .crack import Error, crack_error
+
+# request id, length of the cracker type, length of the options
+WS_HEADER = struct.Struct('!IBH')
+
+
+def parse_frame(data):
+    """
+    Request id, cracker type and params of a binary crack frame: the
+    header, the cracker type, the options url encoded like a query string
+    and the image as the rest of the frame
+    """
+    if len(data) < WS_HEADER.size:
+        raise ValueError('Frame shorter than its header')
+    request_id, type_size, options_size = WS_HEADER.unpack_from(data)
+    start = WS_HEADER.size
+    end = start + type_size + options_size
+    if len(data) < end:
+        raise ValueError('Truncated frame header')
+    cracker_type = data[start:start + type_size].decode('utf-8')
+    params = parse_qs_bytes(
+        data[start + type_size:end].decode('latin1'), keep_blank_values=True
+    )
+    params['file'] = [
+        HTTPFile(
+            filename='file',
+            body=data[end:],
+            content_type='application/octet-stream',
+        )
+    ]
+    return request_id, cracker_type, params
+
+
+def build_frame(request_id, cracker_type, image, options=b''):
+    """Client side of ``parse_frame``"""
+    cracker_type = cracker_type.encode('utf-8')
+    return b''.join([
+        WS_HEADER.pack(request_id, len(cracker_type), len(options)),
+        cracker_type,
+        options,
+        image,
+    ])
+
+
+class CrackWebSocketHandler(WebSocketHandler):
+    """
+    Crack requests over one long lived socket. Each binary frame is a
+    request (see ``parse_frame``), the result comes back as a text frame
+    ``{"id": <request id>, "ret": ...}`` or ``{"id": ..., "err": ...}``
+    whenever it is ready, in any order. Once ``max_in_flight`` requests
+    of the connection are running no more frames are read until one
+    finishes. Requests still running when the socket closes are
+    cancelled.
+    """
+
+    def initialize(self, crack_service, max_in_flight=32):
+        self.crack_service = crack_service
+        self.slots = Semaphore(max_in_flight)
+        self.context = RequestContext()
+        self.logger = logging.getLogger('api')
+
+    def on_close(self):
+        self.context.cancel()
+
+    @gen.coroutine
+    def on_message(self, message):
+        if not isinstance(message, bytes):
+            self.reply(dict(Error.WRONG_PARAMETER, id=None))
+            return
+        yield self.slots.acquire()
+        IOLoop.current().spawn_callback(self.crack, message)
+
+    @gen.coroutine
+    def crack(self, message):
+        try:
+            try:
+                request_id, cracker_type, params = parse_frame(message)
+            except ValueError:
+                self.reply(dict(Error.WRONG_PARAMETER, id=None))
+                return
+            try:
+                ret = yield self.crack_service.crack(
+                    cracker_type, params, self.context
+                )
+            except Exception as e:
+                status, error = crack_error(e)
+                if status == 500:
+                    self.logger.exception(e)
+                self.reply(dict(error, id=request_id))
+                return
+            self.reply({'id': request_id, 'ret': ret})
+        finally:
+            self.slots.release()
+
+    def reply(self, result):
+        try:
+            self.write_message(json.dumps(result, cls=JsonEncoder))
+        except WebSocketClosedError:
+            pass
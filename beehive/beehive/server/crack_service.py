@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    crack_service.py
+      ~~~~~
+
+    What the API handlers call to get a crack result: the result cache
+    in front of the RPC dispatcher.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+import hashlib
+import json
+import struct
+
+from tornado import gen
+
+from beehive.libs.cache import LRUCache
+from beehive.libs.json_helper import JsonEncoder
+from beehive.server.rpc_server.context import RequestContext
+
+_LENGTH = struct.Struct('!Q')
+
+
+def _update(digest, data):
+    if not isinstance(data, bytes):
+        data = str(data).encode('utf-8')
+    # Length prefixed so that ('ab', 'c') and ('a', 'bc') differ
+    digest.update(_LENGTH.pack(len(data)))
+    digest.update(data)
+
+
+def params_digest(cracker_type, params):
+    """
+    Content hash of a crack request: the cracker type, argument names,
+    the number of values of each, and per value whether it is a field or
+    a file, with the name, content type and body of files
+    """
+    digest = hashlib.sha1()
+    _update(digest, cracker_type)
+    for name in sorted(params):
+        _update(digest, name)
+        values = params[name]
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        _update(digest, len(values))
+        for value in values:
+            if isinstance(value, dict) and 'body' in value:
+                _update(digest, b'file')
+                _update(digest, value.get('filename'))
+                _update(digest, value.get('content_type'))
+                value = value['body']
+            else:
+                _update(digest, b'field')
+            _update(digest, value)
+    return digest.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Crack results by content hash. Settings of ``types`` override the
+    defaults per cracker type, e.g. to disable caching of crackers that
+    are not deterministic.
+    """
+
+    def __init__(
+        self,
+        enabled=True,
+        ttl=300,
+        max_entries=10000,
+        max_bytes=64 * 1024 * 1024,
+        types=None,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.types = types or {}
+        self.cache = LRUCache(max_entries, max_bytes)
+
+    def type_config(self, cracker_type):
+        config = self.types.get(cracker_type) or {}
+        return (
+            config.get('enabled', self.enabled),
+            config.get('ttl', self.ttl),
+        )
+
+    def cached(self, cracker_type):
+        enabled, _ = self.type_config(cracker_type)
+        return enabled
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, cracker_type, key, value):
+        _, ttl = self.type_config(cracker_type)
+        size = len(json.dumps(value, cls=JsonEncoder))
+        self.cache.set(key, value, size, ttl)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class Flight(object):
+    """
+    One call shared by concurrent callers. It runs with a context of its
+    own, which takes the deadline of the first caller and is cancelled
+    once every caller has given up.
+    """
+
+    def __init__(self, context):
+        self.context = RequestContext(context.remaining())
+        self.future = None
+        self.waiters = 0
+
+    def joinable(self, context):
+        """A caller may join if the call does not outlast its deadline"""
+        if self.context.deadline is None:
+            return True
+        return context.deadline is not None and \
+            context.deadline <= self.context.deadline
+
+    def join(self, context):
+        self.waiters += 1
+        context.add_cancel_callback(self.leave)
+        self.future.add_done_callback(
+            lambda _: context.remove_cancel_callback(self.leave)
+        )
+        return context.wait(self.future)
+
+    def leave(self):
+        self.waiters -= 1
+        if self.waiters <= 0 and not self.future.done():
+            self.context.cancel()
+
+
+class SingleFlight(object):
+    """Concurrent calls with the same key share one in-flight future"""
+
+    def __init__(self):
+        self._flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, context, func, *args):
+        """
+        Result of ``func(*args, flight_context)``, shared with the other
+        callers of ``key`` and waited for within ``context``
+        """
+        flight = self._flights.get(key)
+        if flight is not None and flight.joinable(context):
+            self.coalesced += 1
+            return flight.join(context)
+        self.calls += 1
+        flight = Flight(context)
+        flight.future = func(*(args + (flight.context, )))
+        self._flights[key] = flight
+        flight.future.add_done_callback(lambda _: self._done(key, flight))
+        return flight.join(context)
+
+    def _done(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self):
+        return {
+            'in_flight': len(self._flights),
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+        }
+
+
+class CrackService(object):
+
+    def __init__(self, rpc_server, result_cache=None, single_flight=True):
+        self.rpc_server = rpc_server
+        self.cache = ResultCache(**(result_cache or {}))
+        self.flights = SingleFlight() if single_flight else None
+
+    @gen.coroutine
+    def crack(self, cracker_type, params, context=None):
+        """
+        Crack ``params``, within the deadline of ``context`` and until it
+        is cancelled
+        """
+        context = context or RequestContext()
+        context.check()
+        cached = self.cache.cached(cracker_type)
+        if not cached and self.flights is None:
+            ret = yield self.rpc_server.dispatch(
+                cracker_type, 'crack', (params, ), context=context
+            )
+            raise gen.Return(ret)
+
+        key = params_digest(cracker_type, params)
+        if cached:
+            ret = self.cache.get(key)
+            if ret is not None:
+                raise gen.Return(ret)
+
+        if self.flights is None:
+            ret = yield self._crack(cracker_type, params, key, cached, context)
+        else:
+            ret = yield self.flights.do(
+                key, context, self._crack, cracker_type, params, key, cached
+            )
+        raise gen.Return(ret)
+
+    @gen.coroutine
+    def _crack(self, cracker_type, params, key, cached, context):
+        ret = yield self.rpc_server.dispatch(
+            cracker_type, 'crack', (params, ), context=context
+        )
+        if cached and ret is not None:
+            self.cache.set(cracker_type, key, ret)
+        raise gen.Return(ret)
+
+    def stats(self):
+        stats = self.rpc_server.stats()
+        stats['cache'] = self.cache.stats()
+        if self.flights is not None:
+            stats['single_flight'] = self.flights.stats()
+        return stats
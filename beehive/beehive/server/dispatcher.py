@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    dispatcher.py
+      ~~~~~
+
+    The multi-process mode: HTTP front end processes share the API port
+    and hand their cracks and jobs to the one dispatcher process that
+    holds the worker connections, the result cache and the job store.
+    Front ends talk to it over a Unix socket with the RPC messages,
+    framed from the start, one connection per front end multiplexed by
+    ``msg_id``. Timeouts go along in the requests and cancels follow
+    the callers that give up, as between the server and its workers.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+import itertools
+import logging
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from tornado.tcpserver import TCPServer
+
+from beehive.libs import net_helper
+from beehive.message import RPCCancel, RPCException, RPCRequest, RPCResponse
+from beehive.message.stream import MessageStream
+from beehive.server.rpc_server.context import RequestContext
+from beehive.server.rpc_server.errors import (
+    DispatchError, DispatcherUnavailableError
+)
+
+
+class DispatcherServer(TCPServer):
+    """
+    Serve the front ends: cracks through ``crack_service`` and jobs
+    through the JobService ``jobs``. Failures are sent back as the
+    exception itself, the front end raises it as is.
+    """
+
+    methods = ('crack', 'stats', 'submit_job', 'job', 'job_stats')
+
+    def __init__(self, crack_service, jobs):
+        super(DispatcherServer, self).__init__()
+        self.crack_service = crack_service
+        self.jobs = jobs
+        self.ioloop = IOLoop.current()
+        self.logger = logging.getLogger('DispatcherServer')
+
+    @gen.coroutine
+    def handle_stream(self, stream, address):
+        messages = MessageStream(stream)
+        messages.upgrade(framed=True)
+        # msg_id -> RequestContext of the requests being served
+        contexts = {}
+        while True:
+            try:
+                msg = yield messages.read_message()
+            except StreamClosedError:
+                break
+            if isinstance(msg, RPCCancel):
+                context = contexts.get(msg['msg_id'])
+                if context is not None:
+                    context.cancel()
+            elif isinstance(msg, RPCRequest):
+                context = RequestContext(msg.get('timeout'))
+                contexts[msg['msg_id']] = context
+                self.ioloop.spawn_callback(
+                    self.handle_request, messages, contexts, msg
+                )
+        # The front end is gone, so are its callers
+        for context in list(contexts.values()):
+            context.cancel()
+
+    @gen.coroutine
+    def handle_request(self, messages, contexts, req):
+        data = req['value']
+        context = contexts[req['msg_id']]
+        try:
+            if data['func'] not in self.methods:
+                raise ValueError('Unknown method: %s' % data['func'])
+            res = yield gen.maybe_future(
+                getattr(self, data['func'])(context, *data['args'])
+            )
+            res = RPCResponse(res, req['msg_id'])
+        except Exception as e:
+            res = RPCException(e, req['msg_id'])
+        finally:
+            contexts.pop(req['msg_id'], None)
+        try:
+            messages.write_message(res)
+        except StreamClosedError:
+            pass
+        except Exception as e:
+            # Not encodable, e.g. an exception that does not pickle
+            self.logger.exception(e)
+            messages.write_message(
+                RPCException(Exception(str(res['value'])), req['msg_id'])
+            )
+
+    def crack(self, context, cracker_type, params):
+        return self.crack_service.crack(cracker_type, params, context)
+
+    def stats(self, context):
+        return self.crack_service.stats()
+
+    def submit_job(self, context, cracker_type, params, timeout):
+        return self.jobs.submit(cracker_type, params, timeout)
+
+    def job(self, context, job_id, wait):
+        return self.jobs.wait(job_id, wait, context)
+
+    def job_stats(self, context):
+        return self.jobs.stats()
+
+
+class DispatcherClient(object):
+    """
+    The crack service of a front end: the same ``crack`` and ``stats``
+    as CrackService, run by the dispatcher at the Unix socket ``path``.
+    The connection is made on first use and again after it is lost.
+    Calls without a deadline of their own wait ``connect_timeout``
+    seconds for the connection and ``call_timeout`` for the answer at
+    most, then fail with DispatcherUnavailableError.
+    """
+
+    def __init__(self, path, connect_timeout=5, call_timeout=60):
+        self.path = path
+        self.connect_timeout = connect_timeout
+        self.call_timeout = call_timeout
+        self.logger = logging.getLogger('DispatcherClient')
+
+        self._msg_ids = itertools.count(1)
+        self._pending = {}
+        self._connecting = None
+
+    def connect(self):
+        if self._connecting is None:
+            self._connecting = Future()
+            IOLoop.current().spawn_callback(self._connect)
+        return self._connecting
+
+    @gen.coroutine
+    def _connect(self):
+        while True:
+            try:
+                stream = yield net_helper.connect(
+                    net_helper.UNIX_SCHEME + self.path
+                )
+                break
+            except StreamClosedError as e:
+                self.logger.warning('Dispatcher unavailable: %s', e)
+                yield gen.sleep(1)
+        messages = MessageStream(stream)
+        messages.upgrade(framed=True)
+        self._connecting.set_result(messages)
+        IOLoop.current().spawn_callback(self._read_loop, messages)
+
+    @gen.coroutine
+    def _read_loop(self, messages):
+        while True:
+            try:
+                msg = yield messages.read_message()
+            except StreamClosedError:
+                break
+            if msg is None:
+                continue
+            future = self._pending.pop(msg['msg_id'], None)
+            if future is not None and not future.done():
+                future.set_result(msg)
+        self.logger.warning('Dispatcher connection lost')
+        self._connecting = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(StreamClosedError())
+
+    @gen.coroutine
+    def call(self, func_name, args, context=None, timeout=None):
+        """
+        Call ``func_name`` of the dispatcher within the deadline of
+        ``context`` and ``timeout`` seconds, ``call_timeout`` by default;
+        when ``context`` is cancelled, so is the call
+        """
+        context = context or RequestContext()
+        context.check()
+        try:
+            messages = yield context.wait(
+                self.connect(), self.connect_timeout
+            )
+        except gen.TimeoutError:
+            raise DispatcherUnavailableError('Dispatcher unreachable')
+        timeout = context.timeout(
+            self.call_timeout if timeout is None else timeout
+        )
+        msg_id = next(self._msg_ids)
+        future = self._pending[msg_id] = Future()
+        try:
+            messages.write_message(
+                RPCRequest(func_name, args, {}, msg_id, timeout)
+            )
+            res = yield context.wait(future, timeout)
+        except (gen.TimeoutError, DispatchError) as e:
+            self._pending.pop(msg_id, None)
+            try:
+                messages.write_message(RPCCancel(msg_id))
+            except StreamClosedError:
+                pass
+            if isinstance(e, gen.TimeoutError):
+                raise DispatcherUnavailableError('Dispatcher call timeout')
+            raise e
+        except StreamClosedError:
+            self._pending.pop(msg_id, None)
+            raise DispatcherUnavailableError('Dispatcher connection lost')
+        if isinstance(res, RPCException):
+            raise res['value']
+        raise gen.Return(res['value'])
+
+    def crack(self, cracker_type, params, context=None):
+        return self.call('crack', (cracker_type, params), context)
+
+    def stats(self):
+        return self.call('stats', ())
+
+
+class RemoteJobService(object):
+    """JobService of the dispatcher, for the front ends"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, cracker_type, params, timeout=None):
+        return self.client.call(
+            'submit_job', (cracker_type, params, timeout)
+        )
+
+    def wait(self, job_id, wait=0, context=None):
+        # The long poll is on top of the time the dispatcher may take
+        return self.client.call(
+            'job', (job_id, wait), context,
+            timeout=wait + self.client.call_timeout
+        )
+
+    def stats(self):
+        return self.client.call('job_stats', ())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    jobs.py
+      ~~~~~
+
+    Crack jobs submitted through the job API and kept until their TTL
+    runs out, so callers poll for results instead of holding a
+    connection for the whole crack.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+import time
+import uuid
+from collections import OrderedDict
+
+from tornado import gen
+from tornado.concurrent import Future
+
+from beehive.libs.time_helper import TimerWheel
+from beehive.server.rpc_server.context import RequestContext
+from beehive.server.rpc_server.errors import DispatchError
+
+
+class JobStoreFullError(Exception):
+    """``max_jobs`` jobs are stored and none has expired yet"""
+    pass
+
+
+class Job(object):
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, job_id, cracker_type, expires_at, context=None):
+        self.job_id = job_id
+        self.cracker_type = cracker_type
+        # RequestContext of the crack, cancelled if the job expires first
+        self.context = context
+        self.created_at = time.time()
+        self.expires_at = expires_at
+        self.status = Job.PENDING
+        self.result = None
+        self.error = None
+        # Resolved with the job itself once it finishes, for long polls
+        self.finished = Future()
+
+    def finish(self, future):
+        try:
+            self.result = future.result()
+            self.status = Job.DONE
+        except Exception as e:
+            self.error = e
+            self.status = Job.FAILED
+        self.finished.set_result(self)
+
+    def view(self):
+        """Status and outcome, without the Future"""
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class JobStore(object):
+    """
+    Jobs by id. Every job expires ``ttl`` seconds after it was submitted,
+    finished or not, so the store is in expiry order and expiring is
+    popping from its front. One timer on the wheel, for the front job,
+    expires them on time. Submitting to a full store is refused.
+    """
+
+    def __init__(self, max_jobs=10000, ttl=600, max_wait=60):
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self.max_wait = max_wait
+        self._jobs = OrderedDict()
+        self._timer = None
+
+        self.submitted = 0
+        self.done = 0
+        self.failed = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def submit(self, cracker_type, context, func, *args):
+        """
+        Start ``func(*args)`` as a job, it must return a Future. The
+        RequestContext ``context`` of the call, if any, gets cancelled
+        when the job expires before it finishes.
+        """
+        self.expire()
+        if len(self._jobs) >= self.max_jobs:
+            self.rejected += 1
+            raise JobStoreFullError('%d jobs stored' % len(self._jobs))
+        job = Job(
+            uuid.uuid4().hex, cracker_type, time.time() + self.ttl, context
+        )
+        self._jobs[job.job_id] = job
+        self.submitted += 1
+        self._schedule()
+        func(*args).add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def _schedule(self):
+        if self._timer is not None or not self._jobs:
+            return
+        job = next(iter(self._jobs.values()))
+        self._timer = TimerWheel.current().call_later(
+            max(0, job.expires_at - time.time()), self._on_timer
+        )
+
+    def _on_timer(self):
+        self._timer = None
+        self.expire()
+        self._schedule()
+
+    def _finish(self, job, future):
+        job.finish(future)
+        if job.status == Job.DONE:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    def get(self, job_id):
+        self.expire()
+        return self._jobs.get(job_id)
+
+    def expire(self):
+        now = time.time()
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.expires_at > now:
+                break
+            del self._jobs[job.job_id]
+            self.expired += 1
+            if job.status == Job.PENDING and job.context is not None:
+                job.context.cancel()
+
+    def stats(self):
+        return {
+            'stored': len(self._jobs),
+            'submitted': self.submitted,
+            'done': self.done,
+            'failed': self.failed,
+            'expired': self.expired,
+            'rejected': self.rejected,
+        }
+
+
+class JobService(object):
+    """
+    Crack jobs of the JobStore ``job_store`` run by ``crack_service``.
+    The API goes through it, or through a remote one with the same
+    methods in the front ends of the multi-process mode.
+    """
+
+    def __init__(self, job_store, crack_service):
+        self.job_store = job_store
+        self.crack_service = crack_service
+
+    def submit(self, cracker_type, params, timeout=None):
+        """Id of the new job, the crack has ``timeout`` seconds at most"""
+        context = RequestContext(timeout)
+        job = self.job_store.submit(
+            cracker_type, context, self.crack_service.crack, cracker_type,
+            params, context
+        )
+        return job.job_id
+
+    @gen.coroutine
+    def wait(self, job_id, wait=0, context=None):
+        """
+        View of the job, None if there is none. A pending job is waited
+        for up to ``wait`` seconds, at most the store's ``max_wait``, or
+        until ``context`` is done.
+        """
+        job = self.job_store.get(job_id)
+        if job is None:
+            raise gen.Return(None)
+        wait = min(wait, self.job_store.max_wait)
+        if job.status == Job.PENDING and wait > 0:
+            try:
+                yield (context or RequestContext()).wait(job.finished, wait)
+            except (gen.TimeoutError, DispatchError):
+                pass
+        raise gen.Return(job.view())
+
+    def stats(self):
+        return self.job_store.stats()
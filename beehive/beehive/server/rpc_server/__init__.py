@@ -12,54 +12,49 @@
 
 
 
+import itertools
 import logging
-import random
-import sys
-import time
+from collections import OrderedDict
 
-from six.moves import cPickle as pickle
 from tornado import gen
+from tornado.concurrent import Future
 from tornado.httpserver import HTTPServer
-from tornado.ioloop import IOLoop
+from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.iostream import StreamClosedError
+from tornado.netutil import bind_unix_socket
 from tornado.tcpserver import TCPServer
 from tornado.web import Application
 
 from beehive.libs.signal_helper import add_shutdown_handler
-from beehive.message import RPCException, RPCMessage, RPCRequest, RPCResponse
+from beehive.message import (
+    RPCBlobMiss, RPCCancel, RPCException, RPCRequest, RPCResponse
+)
+from beehive.message.blobs import BlobIndex
+from beehive.message.codec import available_codecs
+from beehive.message.compression import available_compressors
+from beehive.message.shm import SharedRing
+from beehive.message.stream import MessageStream
+
+from .batcher import Batcher
+from .context import RequestContext
+from .errors import (
+    CircuitOpenError, DispatchError, NoClientError, QueueFullError,
+    QueueTimeoutError
+)
+from .health import CircuitBreaker, OutlierDetector
+from .pending import PendingQueue
+from .scheduler import create_scheduler
 
 
 def rpc(func):
     func_name = func.__name__
 
     def _func(self, *args, **kwargs):
-        timeout = kwargs.get('timeout', 30)
-        time_start = time.time()
-        while self.stream.reading() or self.stream.writing():
-            if time.time() - time_start > timeout:
-                raise Exception('RPC waiting timeout')
-            yield gen.sleep(0.1)
-
-        req = pickle.dumps(RPCRequest(func_name, args, kwargs), protocol=2)
-        res = None
-        try:
-            yield self.stream.write(req + self.EOM)
-            res = yield self.stream.read_until(self.EOM)
-            if sys.version_info.major > 2:
-                res = pickle.loads(res[:-len(self.EOM)], encoding='latin1')
-            else:
-                res = pickle.loads(res[:-len(self.EOM)])
-            res = RPCMessage.from_dict(res)
-        except StreamClosedError as e:
-            self.server.deregister(self)
-            raise e
-        except Exception as e:
-            raise e
-
-        if isinstance(res, RPCException):
-            raise Exception(res['value'])
-
-        raise gen.Return(res['value'])
+        # The timeout is for the server side, it goes to the worker in the
+        # request header and not among the arguments
+        timeout = kwargs.pop('timeout', 30)
+        res = yield self.call(func_name, args, kwargs, timeout)
+        raise gen.Return(res)
 
     _func.__name__ = func_name
 
@@ -68,13 +63,153 @@ def rpc(func):
 
 class RemoteClient(object):
 
-    EOM = b'BEETLE_EOM'
+    # Methods whose large payloads may go through shared memory or blobs
+    payload_methods = ('crack', 'crack_batch')
 
     def __init__(self, server, stream, address, client_type=None):
         self.server = server
         self.stream = stream
+        self.messages = MessageStream(stream)
         self.address = address
         self.client_type = client_type
+        # Legacy workers answer strictly in order and do not echo msg_id,
+        # their responses are matched to the oldest pending call instead.
+        self.multiplexed = True
+        # Wire options agreed on at registration, see BeetleRPCServer.register
+        self.wire = {}
+        # Calls the worker runs at once, declared at registration. Legacy
+        # workers handle one request at a time.
+        self.slots = 1
+        # Largest crack_batch the worker takes, 0 if it does not batch
+        self.batch_size = 0
+        # Load figures maintained by the scheduler
+        self.outstanding = 0
+        self.latency = None
+        # Heartbeat figures: moving average round trip time, beats missed
+        # in a row and whether the worker is left out of scheduling
+        self.rtt = None
+        self.missed_beats = 0
+        self.healthy = True
+        self.beating = False
+        # SharedRing of the large payloads when shared memory was agreed
+        # on at registration, msg_id -> offsets taken by the call
+        self.shm = None
+        self._blocks = {}
+        # BlobIndex of the payloads the worker holds, if it keeps them
+        self.blobs = None
+
+        self._msg_ids = itertools.count(1)
+        self._pending = OrderedDict()
+
+    def read_message(self):
+        return self.messages.read_message()
+
+    def write_message(self, msg):
+        # Writes are buffered by the stream in call order, so concurrent
+        # calls never interleave their frames.
+        self.messages.write_message(msg)
+
+    @gen.coroutine
+    def call(self, func_name, args, kwargs, timeout=30, context=None):
+        """
+        Call ``func_name`` on the worker and wait ``timeout`` seconds at
+        most, less if the deadline of ``context`` comes first. The worker
+        gets the time left in the request and a cancel message when the
+        call is given up, unless it is a legacy one. A worker missing
+        blobs it was referred to gets the request once more with them.
+        """
+        context = context or RequestContext()
+        context.check()
+        timeout = context.timeout(timeout)
+        start = IOLoop.current().time()
+        res = yield self.send(func_name, args, kwargs, timeout, context)
+        if isinstance(res, RPCBlobMiss):
+            # Evicted by the worker meanwhile, every blob goes along now
+            self.blobs.forget(res['value'])
+            if timeout is not None:
+                elapsed = IOLoop.current().time() - start
+                timeout = max(0.0, timeout - elapsed)
+            res = yield self.send(
+                func_name, args, kwargs, timeout, context, True
+            )
+
+        if isinstance(res, RPCException):
+            raise Exception(res['value'])
+
+        raise gen.Return(res['value'])
+
+    @gen.coroutine
+    def send(self, func_name, args, kwargs, timeout, context, inline=False):
+        """One request and the message that answers it"""
+        msg_id = next(self._msg_ids)
+        future = Future()
+        self._pending[msg_id] = future
+        if func_name in self.payload_methods:
+            if self.blobs is not None:
+                args, kwargs = self.blobs.export((args, kwargs), inline)
+            if self.shm is not None:
+                refs = []
+                args = self.shm.export(args, refs)
+                kwargs = self.shm.export(kwargs, refs)
+                if refs:
+                    self._blocks[msg_id] = refs
+        try:
+            self.write_message(
+                RPCRequest(func_name, args, kwargs, msg_id, timeout)
+            )
+            res = yield context.wait(future, timeout)
+        except (gen.TimeoutError, DispatchError) as e:
+            # A legacy worker still owes this answer, keep the slot so the
+            # late response is not matched to the next call.
+            if self.multiplexed:
+                self._pending.pop(msg_id, None)
+                self.cancel(msg_id)
+            if isinstance(e, gen.TimeoutError):
+                raise Exception('RPC waiting timeout')
+            raise e
+        except StreamClosedError as e:
+            self.server.deregister(self)
+            raise e
+        raise gen.Return(res)
+
+    def cancel(self, msg_id):
+        """Tell the worker the call ``msg_id`` is not waited for anymore"""
+        try:
+            self.write_message(RPCCancel(msg_id))
+        except StreamClosedError:
+            pass
+
+    def on_response(self, res):
+        """Resolve the pending call the response belongs to"""
+        if res['msg_id'] is None:
+            if not self._pending:
+                return
+            _, future = self._pending.popitem(last=False)
+        else:
+            # Given up on or not, the worker is done with the payloads
+            for offset in self._blocks.pop(res['msg_id'], ()):
+                self.shm.free(offset)
+            future = self._pending.pop(res['msg_id'], None)
+        if future is not None and not future.done():
+            future.set_result(res)
+
+    def on_close(self):
+        """Fail every call still waiting for a response"""
+        self.close_shm()
+        pending, self._pending = self._pending, OrderedDict()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(StreamClosedError())
+
+    def in_flight(self):
+        """Calls sent to the worker and still waited for"""
+        return len(self._pending)
+
+    def close_shm(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+            self._blocks.clear()
 
     @gen.coroutine
     @rpc
@@ -86,27 +221,79 @@ class RemoteClient(object):
     def crack(self, *args, **kwargs):
         pass
 
+    @gen.coroutine
+    @rpc
+    def crack_batch(self, params_list, **kwargs):
+        pass
+
 
 class BeetleRPCServer(TCPServer):
     """
     Beetle cookie pool rpc server side
     """
 
-    EOM = b'BEETLE_EOM'
-
-    def __init__(self, host, port):
+    def __init__(
+        self,
+        host,
+        port,
+        scheduler='least_outstanding',
+        queue_size=100,
+        queue_timeout=10,
+        batch_max_size=32,
+        batch_max_delay=0.005,
+        heartbeat_interval=5,
+        heartbeat_timeout=3,
+        heartbeat_max_missed=3,
+        outlier_detection=None,
+        circuit_breaker=None,
+        unix_socket=None,
+        shared_memory=0,
+        compression=True,
+    ):
         super(BeetleRPCServer, self).__init__()
         self.host = host
         self.port = port
+        # Also listen on this Unix socket path, for workers on the same
+        # host connecting to ``unix://<path>``
+        self.unix_socket = unix_socket
+        self._unix_ids = itertools.count(1)
+        # Bytes of shared memory per Unix socket worker for large payloads,
+        # 0 disables it, see beehive.message.shm
+        self.shared_memory = shared_memory
+        # Whether frames are compressed for workers that ask for it
+        self.compression = compression
         self.logger = logging.getLogger('BeetleRPCServer')
 
         self.registered_clients = []
         self.address_map = {}
+        self.scheduler = create_scheduler(scheduler)
+        # client_type -> PendingQueue, created when the first worker of
+        # the type registers and kept across worker restarts
+        self.queues = {}
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        # client_type -> Batcher, for types whose workers all take batches
+        self.batchers = {}
+        self.batch_max_size = batch_max_size
+        self.batch_max_delay = batch_max_delay
+        # Workers are sent a heartbeat every ``heartbeat_interval`` seconds
+        # (0 disables it), see ``beat_all``
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.heartbeat_max_missed = heartbeat_max_missed
+        self.heartbeat_decay = 0.3
+        self.evicted = 0
+        self.outlier_detector = OutlierDetector(**(outlier_detection or {}))
+        # client_type -> CircuitBreaker, created along with the queue
+        self.breakers = {}
+        self.circuit_breaker = circuit_breaker or {}
 
         self.ioloop = IOLoop.current()
         self._is_exiting = False
         self._is_running = False
         self._type_name = type(self).__name__
+        self._heartbeat = None
+        self._sweep = None
 
         add_shutdown_handler(self.shutdown)
 
@@ -128,6 +315,11 @@ class BeetleRPCServer(TCPServer):
         except Exception as e:
             self.logger.exception(e)
 
+        for callback in (self._heartbeat, self._sweep):
+            if callback is not None:
+                callback.stop()
+        for remote_client in self.registered_clients:
+            remote_client.close_shm()
         if self._is_running:
             self.ioloop.stop()
             self._is_running = False
@@ -143,12 +335,28 @@ class BeetleRPCServer(TCPServer):
             self.logger.info(self._type_name + ' starts')
             self.ioloop.make_current()
             self.listen(self.port, self.host)
+            if self.unix_socket:
+                self.add_socket(bind_unix_socket(self.unix_socket))
+                self.logger.info('Listen to unix://%s', self.unix_socket)
             self._is_running = True
+            if self.heartbeat_interval > 0:
+                self._heartbeat = PeriodicCallback(
+                    self.beat_all, self.heartbeat_interval * 1000
+                )
+                self._heartbeat.start()
+            if self.outlier_detector.enabled:
+                self._sweep = PeriodicCallback(
+                    self.sweep, self.outlier_detector.interval * 1000
+                )
+                self._sweep.start()
         except Exception as e:
             self.logger.exception(e)
 
     @gen.coroutine
     def handle_stream(self, stream, address):
+        if not address:
+            # Unix socket peers have no address of their own
+            address = (self.unix_socket, next(self._unix_ids))
         self.logger.info('Client connected: %s', address)
         remote_client = RemoteClient(self, stream, address)
         server = self
@@ -159,55 +367,447 @@ class BeetleRPCServer(TCPServer):
         stream.set_close_callback(close_callback)
 
         self.address_map[address] = remote_client
-        while remote_client not in self.registered_clients:
+        self.logger.info('Waiting for Registeration')
+        while True:
             try:
-                self.logger.info('Waiting for Registeration')
-                req = yield stream.read_until(self.EOM)
-                req = req[:-len(self.EOM)]
-                if sys.version_info.major > 2:
-                    req = pickle.loads(req, encoding='latin1')
-                else:
-                    req = pickle.loads(req)
-                req = RPCMessage.from_dict(req)
-                data = req['value']
-                func_name = data['func']
-                args = data['args']
-                kwargs = data['kwargs']
-                try:
-                    res = yield gen.maybe_future(
-                        self.__getattribute__(func_name)(
-                            remote_client, *args, **kwargs
-                        )
-                    )
-                    res = RPCResponse(res)
-                except Exception as e:
-                    self.logger.exception(e)
-                    res = RPCException(str(e))
-                yield stream.write(
-                    pickle.dumps(dict(res), protocol=2) + self.EOM
-                )
+                msg = yield remote_client.read_message()
             except StreamClosedError:
                 self.deregister(remote_client)
                 break
+            except Exception as e:
+                self.logger.exception(e)
+                stream.close()
+                break
+
+            if isinstance(msg, RPCRequest):
+                if remote_client not in self.registered_clients:
+                    # Registration may switch the wire format, it has to
+                    # finish before the next message is read.
+                    remote_client.multiplexed = msg['msg_id'] is not None
+                    yield self.handle_request(remote_client, msg)
+                    remote_client.messages.upgrade(**remote_client.wire)
+                    continue
+                self.ioloop.spawn_callback(
+                    self.handle_request, remote_client, msg
+                )
+            elif msg is not None:
+                remote_client.on_response(msg)
 
     @gen.coroutine
-    def register(self, remote_client, client_type):
+    def handle_request(self, remote_client, req):
+        data = req['value']
+        func_name = data['func']
+        args = data['args']
+        kwargs = data['kwargs']
+        try:
+            res = yield gen.maybe_future(
+                self.__getattribute__(func_name)(
+                    remote_client, *args, **kwargs
+                )
+            )
+            res = RPCResponse(res, req['msg_id'])
+        except Exception as e:
+            self.logger.exception(e)
+            res = RPCException(str(e), req['msg_id'])
+        try:
+            remote_client.write_message(res)
+        except StreamClosedError:
+            self.deregister(remote_client)
+
+    @gen.coroutine
+    def register(self, remote_client, client_type, **options):
+        """
+        Register a worker, ``options`` are its slot count and the wire
+        features it offers. Legacy workers send none and get ``True``
+        back, others get the accepted wire features which both sides
+        switch to after this response.
+        """
+        self.scheduler.remove(remote_client)
+        self.update_batcher(remote_client.client_type)
+        self.outlier_detector.remove(remote_client)
+        remote_client.healthy = True
+        remote_client.missed_beats = 0
         remote_client.client_type = client_type
+        remote_client.slots = max(1, int(options.get('slots') or 1))
+        remote_client.batch_size = int(options.get('batch_size') or 0)
         if remote_client not in self.registered_clients:
             self.registered_clients.append(remote_client)
+        self.scheduler.add(remote_client)
+        self.update_batcher(client_type)
+        if client_type not in self.queues:
+            self.queues[client_type] = PendingQueue(self.queue_size)
+            self.breakers[client_type] = CircuitBreaker(
+                **self.circuit_breaker
+            )
+        self.serve_pending(client_type)
         self.logger.info('Stream registered: %s', remote_client.address)
-        raise gen.Return(True)
+        if not options:
+            raise gen.Return(True)
+        remote_client.wire = self.negotiate(options)
+        remote_client.close_shm()
+        remote_client.blobs = None
+        if options.get('blob_cache') and \
+                remote_client.wire.get('codec') in ('pickle', 'pickle5'):
+            remote_client.blobs = BlobIndex(int(options['blob_cache']))
+            remote_client.wire['blob_cache'] = True
+        if self.accept_shm(remote_client, options):
+            remote_client.shm = SharedRing(self.shared_memory)
+            remote_client.wire['shm'] = {
+                'path': remote_client.shm.path,
+                'size': remote_client.shm.size,
+            }
+        raise gen.Return(dict(remote_client.wire))
+
+    def negotiate(self, options):
+        wire = {}
+        if options.get('framed'):
+            wire['framed'] = True
+            # Codecs other than pickle need frames to delimit payloads
+            codecs = available_codecs(options.get('codecs') or ['pickle'])
+            wire['codec'] = codecs[0] if codecs else 'pickle'
+            compressions = available_compressors(options.get('compression'))
+            if self.compression and compressions:
+                wire['compression'] = compressions[0]
+                if options.get('compression_threshold') is not None:
+                    wire['compression_threshold'] = int(
+                        options['compression_threshold']
+                    )
+        return wire
+
+    def accept_shm(self, remote_client, options):
+        """
+        Shared memory goes to workers that ask for it over the Unix
+        socket, they are on this host, with a codec that keeps ShmRef
+        """
+        return bool(
+            self.shared_memory and options.get('shm') and
+            remote_client.address[0] == self.unix_socket and
+            remote_client.wire.get('codec') in ('pickle', 'pickle5')
+        )
 
     def deregister(self, remote_client):
-        del self.address_map[remote_client.address]
-        self.registered_clients.remove(remote_client)
+        # Called from both the close callback and the read loop
+        if self.address_map.pop(remote_client.address, None) is None:
+            return
+        if remote_client in self.registered_clients:
+            self.registered_clients.remove(remote_client)
+        self.scheduler.remove(remote_client)
+        self.update_batcher(remote_client.client_type)
+        self.outlier_detector.remove(remote_client)
+        remote_client.on_close()
         self.logger.info('Stream degistered: %s', remote_client.address)
 
-    def get_random_client(self, client_type):
-        clients = [
-            client for client in self.registered_clients
-            if client.client_type == client_type
+    def beat_all(self):
+        """
+        Beat every registered worker that is not still answering the
+        previous beat. Legacy workers are left out, they answer in order
+        and a beat would wait for the cracks before it.
+        """
+        for remote_client in self.registered_clients:
+            if remote_client.multiplexed and not remote_client.beating:
+                self.ioloop.spawn_callback(self.beat, remote_client)
+
+    @gen.coroutine
+    def beat(self, remote_client):
+        """
+        One heartbeat. A worker that misses one stops getting calls until
+        it answers again, after ``heartbeat_max_missed`` in a row it is
+        disconnected so its pending calls fail right away. A worker busy
+        with calls is left connected until they are answered or timed
+        out: one running an inline CPU bound method cannot answer beats
+        before it returns.
+        """
+        remote_client.beating = True
+        time_start = self.ioloop.time()
+        try:
+            yield remote_client.heart_beat(timeout=self.heartbeat_timeout)
+        except StreamClosedError:
+            return
+        except Exception as e:
+            self.on_missed_beat(remote_client, e)
+        else:
+            self.on_beat(remote_client, self.ioloop.time() - time_start)
+        finally:
+            remote_client.beating = False
+
+    def on_beat(self, remote_client, rtt):
+        if remote_client.rtt is None:
+            remote_client.rtt = rtt
+        else:
+            remote_client.rtt += \
+                self.heartbeat_decay * (rtt - remote_client.rtt)
+        remote_client.missed_beats = 0
+        self.scheduler.on_heartbeat(remote_client, rtt)
+        if not remote_client.healthy:
+            remote_client.healthy = True
+            self.update_routing(remote_client)
+            self.logger.info('Worker back: %s', remote_client.address)
+
+    def on_missed_beat(self, remote_client, error):
+        remote_client.missed_beats += 1
+        self.logger.warning(
+            'Heartbeat missed by %s (%d): %s', remote_client.address,
+            remote_client.missed_beats, error
+        )
+        if remote_client.healthy:
+            remote_client.healthy = False
+            self.update_routing(remote_client)
+        if remote_client.missed_beats >= self.heartbeat_max_missed and \
+                not remote_client.in_flight():
+            self.evicted += 1
+            self.logger.warning('Worker evicted: %s', remote_client.address)
+            remote_client.stream.close()
+
+    def routable(self, remote_client):
+        return remote_client in self.registered_clients and \
+            remote_client.healthy and \
+            not self.outlier_detector.is_out(remote_client)
+
+    def update_routing(self, remote_client):
+        """
+        Add the worker to the scheduler or take it out, after its health
+        or ejection changed
+        """
+        client_type = remote_client.client_type
+        routed = remote_client in self.scheduler.clients(client_type)
+        if self.routable(remote_client):
+            if not routed:
+                self.scheduler.add(remote_client)
+                self.update_batcher(client_type)
+                self.serve_pending(client_type)
+        elif routed:
+            self.scheduler.remove(remote_client)
+            self.update_batcher(client_type)
+
+    def type_clients(self, client_type):
+        return [
+            remote_client for remote_client in self.registered_clients
+            if remote_client.client_type == client_type
         ]
-        if not clients:
-            return None
-        return random.choice(clients)
+
+    def eject(self, remote_client):
+        """Take an outlier out of scheduling, unless too many are out"""
+        clients = self.type_clients(remote_client.client_type)
+        if self.outlier_detector.can_eject(clients):
+            self.outlier_detector.eject(remote_client, self.ioloop.time())
+            self.logger.warning('Worker ejected: %s', remote_client.address)
+        self.update_routing(remote_client)
+
+    def sweep(self):
+        """
+        Let workers whose ejection is over back in for a probe call and
+        eject the outliers by failure rate and latency
+        """
+        detector = self.outlier_detector
+        for remote_client in detector.expired(self.ioloop.time()):
+            self.update_routing(remote_client)
+        for client_type in self.queues:
+            clients = self.type_clients(client_type)
+            for remote_client in detector.outliers(clients):
+                self.eject(remote_client)
+
+    def get_random_client(self, client_type):
+        """Pick a worker with the configured scheduler"""
+        return self.scheduler.pick(client_type)
+
+    @gen.coroutine
+    def acquire(self, client_type, timeout=None, context=None):
+        """
+        Reserve a slot on a worker of ``client_type``. When every worker
+        is busy the call waits in the type's pending queue for up to
+        ``timeout`` seconds, or until the deadline or cancellation of
+        ``context``.
+        """
+        context = context or RequestContext()
+        context.check()
+        queue = self.queues.get(client_type)
+        if queue is None:
+            raise NoClientError(client_type)
+        if not queue:
+            remote_client = self.scheduler.pick(client_type)
+            if remote_client is not None:
+                self.scheduler.on_start(remote_client)
+                raise gen.Return(remote_client)
+        if queue.full():
+            queue.rejected += 1
+            raise QueueFullError(client_type)
+
+        if timeout is None:
+            timeout = self.queue_timeout
+        waiter = queue.put(self.ioloop.time())
+        try:
+            remote_client = yield context.wait(waiter, timeout)
+        except (gen.TimeoutError, DispatchError) as e:
+            if queue.discard(waiter):
+                if isinstance(e, gen.TimeoutError):
+                    raise QueueTimeoutError(client_type)
+                raise e
+            # Served in the same loop iteration, the slot is ours
+            remote_client = waiter.result()
+        raise gen.Return(remote_client)
+
+    def release(self, remote_client, latency):
+        self.scheduler.on_finish(remote_client, latency)
+        self.serve_pending(remote_client.client_type)
+
+    def serve_pending(self, client_type):
+        """Hand free worker slots to queued calls, oldest first"""
+        queue = self.queues.get(client_type)
+        while queue:
+            remote_client = self.scheduler.pick(client_type)
+            if remote_client is None:
+                return
+            waiter, time_start = queue.pop()
+            if waiter is None:
+                return
+            self.scheduler.on_start(remote_client)
+            queue.record_wait(self.ioloop.time() - time_start)
+            waiter.set_result(remote_client)
+
+    def update_batcher(self, client_type):
+        """
+        Batch crack calls of ``client_type`` when all its workers take
+        batches, up to the smallest batch they advertised.
+        """
+        clients = self.scheduler.clients(client_type)
+        sizes = [remote_client.batch_size for remote_client in clients]
+        batcher = self.batchers.get(client_type)
+        if self.batch_max_size > 1 and sizes and min(sizes) > 1:
+            max_size = min(min(sizes), self.batch_max_size)
+            if batcher is None:
+                self.batchers[client_type] = Batcher(
+                    self, client_type, max_size, self.batch_max_delay
+                )
+            else:
+                batcher.max_size = max_size
+        elif batcher is not None:
+            del self.batchers[client_type]
+            batcher.close()
+
+    @gen.coroutine
+    def dispatch(
+        self, client_type, func_name, args=(), kwargs=None, context=None
+    ):
+        """
+        Call ``func_name`` on a worker of ``client_type`` within the
+        deadline of ``context``. Single crack calls go through the type's
+        batcher when it has one. Calls fail fast while the type's circuit
+        breaker is open.
+        """
+        kwargs = kwargs or {}
+        context = context or RequestContext()
+        breaker = self.breakers.get(client_type)
+        probe = False
+        if breaker is not None:
+            allowed = breaker.allow(self.ioloop.time())
+            if not allowed:
+                raise CircuitOpenError(client_type)
+            probe = allowed == CircuitBreaker.PROBE
+        batcher = self.batchers.get(client_type)
+        try:
+            if batcher is not None and func_name == 'crack' and \
+                    len(args) == 1 and not kwargs:
+                res = yield context.wait(batcher.submit(args[0], context))
+            else:
+                res = yield self.call_worker(
+                    client_type, func_name, args, kwargs, context
+                )
+        except DispatchError as e:
+            if breaker is not None:
+                breaker.on_call(None, self.ioloop.time(), probe)
+            raise e
+        except Exception as e:
+            if breaker is not None:
+                breaker.on_call(False, self.ioloop.time(), probe)
+            raise e
+        if breaker is not None:
+            breaker.on_call(True, self.ioloop.time(), probe)
+        raise gen.Return(res)
+
+    @gen.coroutine
+    def call_worker(self, client_type, func_name, args, kwargs, context=None):
+        """
+        Call ``func_name`` on a worker picked by the scheduler, which
+        also gets the call's load and latency, as does the outlier
+        detector along with its outcome.
+        """
+        remote_client = yield self.acquire(client_type, context=context)
+        probe = self.outlier_detector.start_call(remote_client)
+        if probe:
+            # Probe call of a worker back from ejection, it gets no other
+            # call until this one is answered
+            self.update_routing(remote_client)
+        time_start = self.ioloop.time()
+        ok = None
+        try:
+            res = yield remote_client.call(
+                func_name, args, kwargs, context=context
+            )
+            ok = True
+        except DispatchError as e:
+            raise e
+        except Exception as e:
+            ok = False
+            raise e
+        finally:
+            latency = self.ioloop.time() - time_start
+            self.on_call(remote_client, latency, ok, probe)
+            self.release(remote_client, latency)
+        raise gen.Return(res)
+
+    def on_call(self, remote_client, latency, ok, probe):
+        if self.outlier_detector.on_call(remote_client, latency, ok):
+            self.eject(remote_client)
+        elif probe:
+            self.update_routing(remote_client)
+
+    def stats(self):
+        return {
+            'workers': {
+                client_type: len(self.scheduler.clients(client_type))
+                for client_type in self.queues
+            },
+            'queues': {
+                client_type: queue.stats()
+                for client_type, queue in self.queues.items()
+            },
+            'batches': {
+                client_type: batcher.stats()
+                for client_type, batcher in self.batchers.items()
+            },
+            'circuits': {
+                client_type: breaker.stats()
+                for client_type, breaker in self.breakers.items()
+            },
+            'outliers': self.outlier_detector.stats(),
+            'shared_memory': [
+                remote_client.shm.stats()
+                for remote_client in self.registered_clients
+                if remote_client.shm is not None
+            ],
+            'blobs': [
+                remote_client.blobs.stats()
+                for remote_client in self.registered_clients
+                if remote_client.blobs is not None
+            ],
+            'compression': [
+                dict(
+                    remote_client.messages.compression_stats(),
+                    type=remote_client.client_type,
+                    address=remote_client.address,
+                )
+                for remote_client in self.registered_clients
+                if remote_client.messages.compressor is not None
+            ],
+            'heartbeat': {
+                'evicted': self.evicted,
+                'workers': [
+                    {
+                        'type': remote_client.client_type,
+                        'healthy': remote_client.healthy,
+                        'rtt': remote_client.rtt,
+                        'missed': remote_client.missed_beats,
+                    } for remote_client in self.registered_clients
+                ],
+            },
+        }
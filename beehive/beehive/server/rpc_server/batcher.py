@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    batcher.py
+      ~~~~~
+
+    Micro-batching of crack calls
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+import logging
+from datetime import timedelta
+
+from tornado import gen
+from tornado.concurrent import Future, chain_future
+
+from .context import RequestContext
+from .errors import DispatchError
+
+
+class Batcher(object):
+    """
+    Collect crack params of one ``client_type`` for up to ``max_size``
+    items or ``max_delay`` seconds, send them to one worker as a single
+    ``crack_batch`` call and hand each caller its own result.
+    """
+
+    def __init__(self, server, client_type, max_size, max_delay):
+        self.server = server
+        self.client_type = client_type
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.logger = logging.getLogger('Batcher')
+
+        self._items = []
+        self._timeout = None
+
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, params, context):
+        future = Future()
+        self._items.append((params, context, future))
+        if len(self._items) >= self.max_size:
+            self.flush()
+        elif self._timeout is None:
+            self._timeout = self.server.ioloop.add_timeout(
+                timedelta(seconds=self.max_delay), self.flush
+            )
+        return future
+
+    def flush(self):
+        if self._timeout is not None:
+            self.server.ioloop.remove_timeout(self._timeout)
+            self._timeout = None
+        items, self._items = self._items, []
+        while items:
+            batch, items = items[:self.max_size], items[self.max_size:]
+            self.server.ioloop.spawn_callback(self.send, batch)
+
+    def close(self):
+        """Batching got disabled, send what was collected one by one"""
+        if self._timeout is not None:
+            self.server.ioloop.remove_timeout(self._timeout)
+            self._timeout = None
+        items, self._items = self._items, []
+        for params, context, future in items:
+            chain_future(
+                self.server.call_worker(
+                    self.client_type, 'crack', (params, ), {}, context
+                ), future
+            )
+
+    @gen.coroutine
+    def send(self, batch):
+        # Leave out items whose caller gave up while they were collected
+        items = []
+        for params, context, future in batch:
+            try:
+                context.check()
+            except DispatchError as e:
+                future.set_exception(e)
+                continue
+            items.append((params, context, future))
+        if not items:
+            return
+        batch = items
+        # The batch is waited for as long as its most patient item
+        remaining = [context.remaining() for _, context, _ in batch]
+        timeout = None if None in remaining else max(remaining)
+
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = yield self.server.call_worker(
+                self.client_type,
+                'crack_batch',
+                ([params for params, _, _ in batch], ),
+                {},
+                RequestContext(timeout),
+            )
+            if len(results) != len(batch):
+                raise Exception(
+                    'Batch of %d got %d results' % (len(batch), len(results))
+                )
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        return {
+            'max_size': self.max_size,
+            'batches': self.batches,
+            'items': self.items,
+            'pending': len(self._items),
+        }
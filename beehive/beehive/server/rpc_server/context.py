@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    context.py
+      ~~~~~
+
+    Deadline and cancellation of a request, handed from the API handler
+    down to the call on the worker
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+from tornado import gen
+from tornado.concurrent import Future, chain_future
+from tornado.ioloop import IOLoop
+
+from beehive.libs.time_helper import TimerWheel
+
+from .errors import DeadlineExceededError, RequestCancelledError
+
+
+class RequestContext(object):
+    """
+    ``timeout`` seconds from now is the deadline, ``None`` for none.
+    ``cancel`` runs the registered callbacks once, the caller uses it
+    when it is no longer interested in the result.
+    """
+
+    def __init__(self, timeout=None):
+        self.ioloop = IOLoop.current()
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = self.ioloop.time() + timeout
+        self.cancelled = False
+        self._callbacks = []
+
+    def remaining(self):
+        """Seconds left before the deadline, ``None`` without one"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - self.ioloop.time())
+
+    def expired(self):
+        return self.deadline is not None and \
+            self.deadline <= self.ioloop.time()
+
+    def timeout(self, timeout):
+        """``timeout`` shortened to the deadline"""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+    def check(self):
+        """Raise if the result is not wanted anymore"""
+        if self.cancelled:
+            raise RequestCancelledError()
+        if self.expired():
+            raise DeadlineExceededError()
+
+    def add_cancel_callback(self, callback):
+        if self.cancelled:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    def remove_cancel_callback(self, callback):
+        try:
+            self._callbacks.remove(callback)
+        except ValueError:
+            pass
+
+    def cancel(self):
+        if self.cancelled:
+            return
+        self.cancelled = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    @gen.coroutine
+    def wait(self, future, timeout=None):
+        """
+        Result of ``future``. Raise DeadlineExceededError at the deadline,
+        gen.TimeoutError after ``timeout`` seconds if that comes first and
+        RequestCancelledError once cancelled. ``future`` itself is left
+        running.
+        """
+        proxy = Future()
+        chain_future(future, proxy)
+
+        remaining = self.remaining()
+        by_deadline = remaining is not None and \
+            (timeout is None or remaining <= timeout)
+        wait = remaining if by_deadline else timeout
+
+        def fail(error):
+            if not proxy.done():
+                proxy.set_exception(error)
+
+        def on_cancel():
+            fail(RequestCancelledError())
+
+        def on_timeout():
+            if by_deadline:
+                fail(DeadlineExceededError())
+            else:
+                fail(gen.TimeoutError('Timeout'))
+
+        # Many calls wait at once, their timeouts go on the shared wheel
+        # rather than each on the IOLoop
+        timer = None
+        if wait is not None:
+            timer = TimerWheel.current().call_later(wait, on_timeout)
+        self.add_cancel_callback(on_cancel)
+        try:
+            res = yield proxy
+        finally:
+            self.remove_cancel_callback(on_cancel)
+            if timer is not None:
+                timer.cancel()
+        raise gen.Return(res)
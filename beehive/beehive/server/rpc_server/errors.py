@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    errors.py
+      ~~~~~
+
+    Errors raised while dispatching calls to workers
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+
+class DispatchError(Exception):
+    pass
+
+
+class NoClientError(DispatchError):
+    """No worker of the requested type is registered"""
+    pass
+
+
+class QueueFullError(DispatchError):
+    """Every worker is busy and the pending queue is full"""
+    pass
+
+
+class QueueTimeoutError(DispatchError):
+    """No worker slot became free before the deadline"""
+    pass
+
+
+class DeadlineExceededError(DispatchError):
+    """The request's deadline passed before its result came back"""
+    pass
+
+
+class RequestCancelledError(DispatchError):
+    """The caller gave up, e.g. the HTTP client disconnected"""
+    pass
+
+
+class CircuitOpenError(DispatchError):
+    """Calls to the type fail too often, it is given a rest"""
+    pass
+
+
+class DispatcherUnavailableError(DispatchError):
+    """The dispatcher process did not answer a front end in time"""
+    pass
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    health.py
+      ~~~~~
+
+    Keep failing or slow workers, and cracker types that fail as a
+    whole, from taking calls.
+
+    ``OutlierDetector`` ejects single workers for a while and lets them
+    back in with one probe call. ``CircuitBreaker`` fails calls to a
+    cracker type fast while most of them fail anyway, probing it again
+    after ``open_time``.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+
+class WorkerRecord(object):
+    """Call figures of one worker"""
+
+    def __init__(self):
+        self.calls = 0
+        self.consecutive_failures = 0
+        self.failure_rate = 0.0
+        self.latency = None
+        self.ejections = 0
+        self.ejected_until = None
+        # Let back in after an ejection, the next call decides
+        self.probing = False
+        self.probe_in_flight = False
+
+
+class OutlierDetector(object):
+    """
+    Track the failures and latency of each worker and eject outliers:
+
+    - ``consecutive_failures`` failed calls in a row, right away
+    - a moving average failure rate of ``failure_rate`` or more
+    - a moving average latency over ``latency_factor`` times the median
+      of its peers of the same type
+
+    The last two are judged by ``outliers``, periodically, once the
+    worker made ``min_calls`` calls. An ejection lasts ``base_ejection`` seconds
+    times the worker's ejections so far, up to ``max_ejection``, and
+    no more than ``max_ejected`` of the workers of a type are out at
+    once. When it ends, one probe call is let through: its success
+    brings the worker back, its failure ejects it again.
+    """
+
+    def __init__(
+        self,
+        enabled=True,
+        interval=1,
+        consecutive_failures=5,
+        min_calls=10,
+        failure_rate=0.5,
+        latency_factor=10,
+        base_ejection=30,
+        max_ejection=300,
+        max_ejected=0.5,
+        decay=0.1,
+    ):
+        self.enabled = enabled
+        self.interval = interval
+        self.consecutive_failures = consecutive_failures
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.latency_factor = latency_factor
+        self.base_ejection = base_ejection
+        self.max_ejection = max_ejection
+        self.max_ejected = max_ejected
+        self.decay = decay
+
+        self._records = {}
+        self.ejections = 0
+
+    def record(self, client):
+        record = self._records.get(client)
+        if record is None:
+            record = self._records[client] = WorkerRecord()
+        return record
+
+    def remove(self, client):
+        self._records.pop(client, None)
+
+    def is_out(self, client):
+        """Ejected, or probing with the probe call in flight"""
+        record = self._records.get(client)
+        return record is not None and \
+            (record.ejected_until is not None or record.probe_in_flight)
+
+    def start_call(self, client):
+        """A call starts on ``client``, True if it is the probe call"""
+        record = self._records.get(client)
+        if record is None or not record.probing:
+            return False
+        record.probe_in_flight = True
+        return True
+
+    def on_call(self, client, latency, ok):
+        """
+        Result of a call on ``client``, ``ok`` is None when the call got
+        nowhere for reasons of the caller, e.g. its deadline. True if the
+        worker has to be ejected.
+        """
+        if not self.enabled:
+            return False
+        record = self.record(client)
+        record.probe_in_flight = False
+        # Calls that were in flight when it got ejected do not count
+        if ok is None or record.ejected_until is not None:
+            return False
+        record.calls += 1
+        # A plain mean over the first calls, not biased to 0
+        decay = max(self.decay, 1.0 / record.calls)
+        if ok:
+            record.consecutive_failures = 0
+            record.failure_rate -= decay * record.failure_rate
+            if record.latency is None:
+                record.latency = latency
+            else:
+                record.latency += self.decay * (latency - record.latency)
+            record.probing = False
+            return False
+        record.consecutive_failures += 1
+        record.failure_rate += decay * (1 - record.failure_rate)
+        return record.probing or \
+            record.consecutive_failures >= self.consecutive_failures
+
+    def outliers(self, clients):
+        """Workers among ``clients``, all of one type, to eject"""
+        records = [
+            (client, self.record(client)) for client in clients
+            if not self.is_out(client)
+        ]
+        judged = [
+            (client, record) for client, record in records
+            if record.calls >= self.min_calls
+        ]
+        latencies = sorted(
+            record.latency for _, record in judged
+            if record.latency is not None
+        )
+        median = latencies[len(latencies) // 2] if latencies else None
+        outliers = []
+        for client, record in judged:
+            if record.failure_rate >= self.failure_rate:
+                outliers.append(client)
+            elif len(latencies) >= 3 and record.latency is not None and \
+                    record.latency > self.latency_factor * median:
+                outliers.append(client)
+        return outliers
+
+    def can_eject(self, clients):
+        """Whether one more of ``clients``, all of one type, may be out"""
+        out = sum(1 for client in clients if self.is_out(client))
+        return out + 1 <= self.max_ejected * len(clients)
+
+    def eject(self, client, now):
+        record = self.record(client)
+        record.ejections += 1
+        record.ejected_until = now + min(
+            self.base_ejection * record.ejections, self.max_ejection
+        )
+        record.probing = False
+        record.probe_in_flight = False
+        self.ejections += 1
+
+    def expired(self, now):
+        """Workers whose ejection is over, they go probing"""
+        clients = []
+        for client, record in self._records.items():
+            if record.ejected_until is not None and \
+                    record.ejected_until <= now:
+                record.ejected_until = None
+                record.probing = True
+                # Fresh figures, the old ones got it ejected
+                record.calls = 0
+                record.consecutive_failures = 0
+                record.failure_rate = 0.0
+                record.latency = None
+                clients.append(client)
+        return clients
+
+    def stats(self):
+        return {
+            'ejections': self.ejections,
+            'ejected': sum(
+                1 for record in self._records.values()
+                if record.ejected_until is not None
+            ),
+        }
+
+
+class CircuitBreaker(object):
+    """
+    Closed, calls go through. ``failure_threshold`` failures in a row
+    open it: calls fail fast for ``open_time`` seconds, then it is half
+    open and lets one call through at a time until one succeeds, which
+    closes it, or fails, which opens it again. Only that probe call,
+    which ``allow`` marks, moves it out of half open: calls started
+    before it opened do not.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    # What allow returns for the probe call of half open
+    PROBE = 'probe'
+
+    def __init__(self, enabled=True, failure_threshold=20, open_time=10):
+        self.enabled = enabled
+        self.failure_threshold = failure_threshold
+        self.open_time = open_time
+
+        self.state = CircuitBreaker.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self, now):
+        """False if the call fails fast, else True or PROBE"""
+        if not self.enabled or self.state == CircuitBreaker.CLOSED:
+            return True
+        if self.state == CircuitBreaker.OPEN and \
+                now >= self.opened_at + self.open_time:
+            self.state = CircuitBreaker.HALF_OPEN
+        if self.state == CircuitBreaker.HALF_OPEN and \
+                not self.probe_in_flight:
+            self.probe_in_flight = True
+            return CircuitBreaker.PROBE
+        self.rejected += 1
+        return False
+
+    def on_call(self, ok, now, probe=False):
+        """
+        Result of a call, ``ok`` is None when it does not count. ``probe``
+        tells the probe call, allow returned PROBE for it.
+        """
+        if not self.enabled:
+            return
+        if probe:
+            self.probe_in_flight = False
+        # Calls that were in flight when it opened do not count
+        if ok is None or self.state == CircuitBreaker.OPEN:
+            return
+        if self.state == CircuitBreaker.HALF_OPEN and not probe:
+            return
+        if ok:
+            self.consecutive_failures = 0
+            self.state = CircuitBreaker.CLOSED
+            return
+        self.consecutive_failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN or \
+                self.consecutive_failures >= self.failure_threshold:
+            self.state = CircuitBreaker.OPEN
+            self.opened_at = now
+            self.opened += 1
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'opened': self.opened,
+            'rejected': self.rejected,
+        }
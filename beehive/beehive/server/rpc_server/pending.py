@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    pending.py
+      ~~~~~
+
+    Calls waiting for a free worker slot
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+from collections import deque
+
+from tornado.concurrent import Future
+
+
+class PendingQueue(object):
+    """
+    Bounded FIFO of waiters for one ``client_type``. A waiter that gives
+    up is only marked done and skipped when it reaches the head, so
+    leaving the queue costs O(1). Done waiters at the head are dropped
+    right away, those behind a live one once they outnumber the live
+    ones, so that a type without workers does not keep them all.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._waiters = deque()
+        self._size = 0
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.served = 0
+
+    def __len__(self):
+        return self._size
+
+    def full(self):
+        return self._size >= self.max_size
+
+    def put(self, time_start):
+        waiter = Future()
+        self._waiters.append((waiter, time_start))
+        self._size += 1
+        self.enqueued += 1
+        return waiter
+
+    def discard(self, waiter):
+        """Give up waiting, the slot will go to the next waiter"""
+        if waiter.done():
+            return False
+        waiter.set_result(None)
+        self._size -= 1
+        self.timeouts += 1
+        self._trim()
+        return True
+
+    def _trim(self):
+        waiters = self._waiters
+        while waiters and waiters[0][0].done():
+            waiters.popleft()
+        if len(waiters) > 2 * self._size + 16:
+            self._waiters = deque(
+                item for item in waiters if not item[0].done()
+            )
+
+    def pop(self):
+        """Return the oldest waiter still waiting and its enqueue time"""
+        while self._waiters:
+            waiter, time_start = self._waiters.popleft()
+            if not waiter.done():
+                self._size -= 1
+                return waiter, time_start
+        return None, None
+
+    def record_wait(self, wait_time):
+        self.served += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def stats(self):
+        return {
+            'depth': self._size,
+            'max_size': self.max_size,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'wait_time_avg': self.wait_time_total / self.served
+            if self.served else 0.0,
+            'wait_time_max': self.wait_time_max,
+        }
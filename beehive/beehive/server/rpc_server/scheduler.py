@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    scheduler.py
+      ~~~~~
+
+    Pick the worker a call is sent to.
+
+    Schedulers keep one index per ``client_type`` that is updated in
+    ``BeetleRPCServer.register`` / ``deregister``, and are told when a
+    call starts and finishes so they can track load and latency. Only
+    workers with a free slot are indexed, picking never scans the whole
+    fleet and returns ``None`` when every worker of the type is busy.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:51
+    @python version: 3.8
+"""
+
+import random
+from collections import OrderedDict
+
+SCHEDULERS = {}
+
+
+def register_scheduler(cls):
+    SCHEDULERS[cls.name] = cls
+    return cls
+
+
+def create_scheduler(name, **kwargs):
+    try:
+        cls = SCHEDULERS[name]
+    except KeyError:
+        raise ValueError('Unknown scheduler: %s' % name)
+    return cls(**kwargs)
+
+
+class ClientIndex(object):
+    """Clients of one type, O(1) add, remove and random sample"""
+
+    def __init__(self):
+        self.clients = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __iter__(self):
+        return iter(self.clients)
+
+    def __contains__(self, client):
+        return client in self._positions
+
+    def add(self, client):
+        if client in self._positions:
+            return
+        self._positions[client] = len(self.clients)
+        self.clients.append(client)
+
+    def remove(self, client):
+        pos = self._positions.pop(client, None)
+        if pos is None:
+            return
+        last = self.clients.pop()
+        if last is not client:
+            self.clients[pos] = last
+            self._positions[last] = pos
+
+    def choice(self):
+        return random.choice(self.clients)
+
+    def sample(self, k):
+        return random.sample(self.clients, min(k, len(self.clients)))
+
+
+class Scheduler(object):
+    """Random choice, the behavior before load-aware scheduling"""
+
+    name = 'random'
+
+    def __init__(self):
+        # client_type -> set of registered clients
+        self.members = {}
+        # client_type -> ClientIndex of the clients with a free slot
+        self.indexes = {}
+
+    def clients(self, client_type):
+        return self.members.get(client_type) or ()
+
+    def _index_add(self, client):
+        index = self.indexes.get(client.client_type)
+        if index is None:
+            index = self.indexes[client.client_type] = ClientIndex()
+        index.add(client)
+
+    def _index_remove(self, client):
+        index = self.indexes.get(client.client_type)
+        if index is None or client not in index:
+            return
+        index.remove(client)
+        if not index:
+            del self.indexes[client.client_type]
+
+    def add(self, client):
+        members = self.members.setdefault(client.client_type, set())
+        if client in members:
+            return
+        members.add(client)
+        if client.outstanding < client.slots:
+            self._index_add(client)
+
+    def remove(self, client):
+        members = self.members.get(client.client_type)
+        if not members or client not in members:
+            return
+        members.remove(client)
+        if not members:
+            del self.members[client.client_type]
+        self._index_remove(client)
+
+    def pick(self, client_type):
+        index = self.indexes.get(client_type)
+        if not index:
+            return None
+        return index.choice()
+
+    def _update(self, client, delta):
+        registered = client in self.clients(client.client_type)
+        if registered:
+            self._index_remove(client)
+        client.outstanding += delta
+        if registered and client.outstanding < client.slots:
+            self._index_add(client)
+
+    def on_start(self, client):
+        self._update(client, 1)
+
+    def on_finish(self, client, latency):
+        self._update(client, -1)
+
+    def on_heartbeat(self, client, rtt):
+        """A heartbeat answered in ``rtt`` seconds"""
+        pass
+
+
+register_scheduler(Scheduler)
+
+
+@register_scheduler
+class LeastOutstandingScheduler(Scheduler):
+    """
+    Pick the worker with the fewest calls in flight. Workers are kept in
+    buckets by their outstanding count, so the least loaded one is found
+    without comparing all of them.
+    """
+
+    name = 'least_outstanding'
+
+    def __init__(self):
+        super(LeastOutstandingScheduler, self).__init__()
+        # client_type -> {outstanding: OrderedDict(client -> None)}
+        self.buckets = {}
+        self.min_load = {}
+
+    def _index_add(self, client):
+        super(LeastOutstandingScheduler, self)._index_add(client)
+        buckets = self.buckets.setdefault(client.client_type, {})
+        buckets.setdefault(client.outstanding, OrderedDict())[client] = None
+        min_load = self.min_load.get(client.client_type)
+        if min_load is None or client.outstanding < min_load:
+            self.min_load[client.client_type] = client.outstanding
+
+    def _index_remove(self, client):
+        buckets = self.buckets.get(client.client_type)
+        bucket = buckets and buckets.get(client.outstanding)
+        if not bucket or client not in bucket:
+            return
+        super(LeastOutstandingScheduler, self)._index_remove(client)
+        del bucket[client]
+        if bucket:
+            return
+        del buckets[client.outstanding]
+        if not buckets:
+            del self.buckets[client.client_type]
+            del self.min_load[client.client_type]
+            return
+        min_load = self.min_load[client.client_type]
+        while min_load not in buckets:
+            min_load += 1
+        self.min_load[client.client_type] = min_load
+
+    def pick(self, client_type):
+        buckets = self.buckets.get(client_type)
+        if not buckets:
+            return None
+        return next(iter(buckets[self.min_load[client_type]]))
+
+
+@register_scheduler
+class PowerOfTwoScheduler(Scheduler):
+    """Sample two workers at random and take the less utilized one"""
+
+    name = 'power_of_two'
+
+    def cost(self, client):
+        return float(client.outstanding) / client.slots
+
+    def pick(self, client_type):
+        index = self.indexes.get(client_type)
+        if not index:
+            return None
+        return min(index.sample(2), key=self.cost)
+
+
+@register_scheduler
+class EwmaLatencyScheduler(PowerOfTwoScheduler):
+    """
+    Power of two choices weighted by latency: the cost of a worker is
+    its moving average latency times the calls it would have in flight
+    per slot. Workers without a call sample yet cost their heartbeat round
+    trip, or nothing before their first beat, and get tried first.
+    Heartbeats pull the latency of idle workers towards their round trip,
+    so a worker that had a slow spell gets calls again.
+    """
+
+    name = 'ewma'
+
+    def __init__(self, decay=0.3):
+        super(EwmaLatencyScheduler, self).__init__()
+        self.decay = decay
+
+    def cost(self, client):
+        latency = client.latency if client.latency is not None else \
+            (client.rtt or 0)
+        return latency * (client.outstanding + 1) / client.slots
+
+    def on_finish(self, client, latency):
+        super(EwmaLatencyScheduler, self).on_finish(client, latency)
+        if client.latency is None:
+            client.latency = latency
+        else:
+            client.latency += self.decay * (latency - client.latency)
+
+    def on_heartbeat(self, client, rtt):
+        if client.latency is not None and client.outstanding == 0:
+            client.latency += self.decay * (rtt - client.latency)
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    __init__.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Micro benchmarks, run from the project root, e.g.
+
+        python -m benchmarks.bench_codec
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    bench_codec.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Encode / decode throughput of the wire codecs on crack payloads
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import time
+
+import click
+from tornado.httputil import HTTPFile
+
+from beehive.message import RPCRequest
+from beehive.message.codec import CODECS
+
+lib_path = os.path.dirname(__file__)
+
+
+def crack_payload(image):
+    params = {
+        'param1': [b'1'],
+        'param2': [b'str'],
+        'file1': [
+            HTTPFile(filename='test.png', body=image, content_type='image/png')
+        ],
+    }
+    return dict(RPCRequest('crack', (params, ), {}, 1))
+
+
+def bench(codec, payload, seconds):
+    size = 0
+    count = 0
+    encode_time = 0
+    decode_time = 0
+    while encode_time + decode_time < seconds:
+        start = time.time()
+        buffers = codec.encode(payload)
+        encode_time += time.time() - start
+        # The stream hands the reader one contiguous payload
+        data = b''.join(buffers)
+        start = time.time()
+        codec.decode(data)
+        decode_time += time.time() - start
+        size = len(data)
+        count += 1
+    return size, count / encode_time, count / decode_time
+
+
+@click.command()
+@click.option('--seconds', default=1.0, help='Time spent per codec and size')
+def main(seconds):
+    with open(os.path.join(lib_path, '../tests/test.png'), 'rb') as fin:
+        sample = fin.read()
+    images = [
+        ('test.png', sample),
+        ('64KB', os.urandom(64 * 1024)),
+        ('512KB', os.urandom(512 * 1024)),
+    ]
+    print(
+        '%-10s %-8s %10s %12s %12s' %
+        ('payload', 'codec', 'bytes', 'encode/s', 'decode/s')
+    )
+    for image_name, image in images:
+        payload = crack_payload(image)
+        for name in sorted(CODECS):
+            size, encode_rate, decode_rate = bench(
+                CODECS[name], payload, seconds
+            )
+            print(
+                '%-10s %-8s %10d %12.0f %12.0f' %
+                (image_name, name, size, encode_rate, decode_rate)
+            )
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=E1120
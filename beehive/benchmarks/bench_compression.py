@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    bench_compression.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Bytes saved against CPU time of the frame compressions on encoded
+    crack payloads
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import time
+
+import click
+from tornado.httputil import HTTPFile
+
+from beehive.message import RPCRequest
+from beehive.message.codec import get_codec
+from beehive.message.compression import COMPRESSORS
+
+lib_path = os.path.dirname(__file__)
+
+
+def crack_buffers(codec, image):
+    params = {
+        'param1': [b'1'],
+        'param2': [b'str'],
+        'file1': [
+            HTTPFile(filename='test.png', body=image, content_type='image/png')
+        ],
+    }
+    return codec.encode(dict(RPCRequest('crack', (params, ), {}, 1)))
+
+
+def bench(compressor, buffers, seconds):
+    raw = sum(memoryview(buf).nbytes for buf in buffers)
+    size = 0
+    count = 0
+    compress_time = 0
+    decompress_time = 0
+    while compress_time + decompress_time < seconds:
+        start = time.thread_time()
+        data = compressor.compress(buffers)
+        compress_time += time.thread_time() - start
+        start = time.thread_time()
+        compressor.decompress(data, raw)
+        decompress_time += time.thread_time() - start
+        size = len(data)
+        count += 1
+    return (
+        raw, size, compress_time * 1e6 / count, decompress_time * 1e6 / count
+    )
+
+
+@click.command()
+@click.option('--seconds', default=1.0, help='Time spent per compressor')
+@click.option('--codec', default='pickle5', help='Codec of the payloads')
+def main(seconds, codec):
+    codec = get_codec(codec)
+    with open(os.path.join(lib_path, '../tests/test.png'), 'rb') as fin:
+        sample = fin.read()
+    # Captchas are small and barely compress, the form text around
+    # them does
+    images = [
+        ('test.png', sample),
+        ('64KB-text', (b'captcha text ' * 6000)[:64 * 1024]),
+        ('64KB-rand', os.urandom(64 * 1024)),
+    ]
+    print(
+        '%-10s %-6s %9s %9s %7s %12s %12s' % (
+            'payload', 'algo', 'raw', 'sent', 'ratio', 'comp us',
+            'decomp us'
+        )
+    )
+    for image_name, image in images:
+        buffers = crack_buffers(codec, image)
+        for name in sorted(COMPRESSORS):
+            raw, size, compress_us, decompress_us = bench(
+                COMPRESSORS[name], buffers, seconds
+            )
+            print(
+                '%-10s %-6s %9d %9d %7.2f %12.1f %12.1f' % (
+                    image_name, name, raw, size, raw / float(size),
+                    compress_us, decompress_us
+                )
+            )
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=E1120
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    bench_processes.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Crack requests per second against the server with 1, 2, 4...
+    HTTP front end processes. Server, sample worker and the load
+    generators each run in processes of their own, the load is spread
+    over ``--clients`` processes so that it is not the bottleneck. The
+    result cache is off.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import json
+import multiprocessing
+import os
+import time
+
+import click
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient, HTTPError, HTTPRequest
+from tornado.ioloop import IOLoop
+from tornado.process import cpu_count
+
+from beehive.client.sample_cracker import SampleCrackerClient
+from beehive.server import BeetleServer
+
+lib_path = os.path.dirname(__file__)
+
+RPC_PORT = 17111
+API_PORT = 17112
+
+
+def run_server(processes):
+    server = BeetleServer(
+        '127.0.0.1',
+        RPC_PORT,
+        '127.0.0.1',
+        API_PORT,
+        result_cache={'enabled': False},
+        single_flight=False,
+        heartbeat_interval=0,
+        processes=processes,
+    )
+    server.run()
+
+
+def run_worker():
+    SampleCrackerClient('127.0.0.1', RPC_PORT, slots=256).run()
+
+
+def run_load(seconds, concurrency, results):
+    with open(os.path.join(lib_path, '../tests/test.png'), 'rb') as fin:
+        image = fin.read()
+    request = HTTPRequest(
+        url='http://127.0.0.1:%d/api/crack/sample/raw?param1=1' % API_PORT,
+        method='POST',
+        headers={
+            'Content-Type': 'image/png',
+            'X-Crack-Param2': 'str',
+            'X-Crack-Filename': 'test.png',
+        },
+        body=image,
+    )
+
+    @gen.coroutine
+    def load():
+        fetcher = AsyncHTTPClient(max_clients=concurrency)
+        deadline = time.time() + seconds
+        count = [0]
+
+        @gen.coroutine
+        def worker():
+            while time.time() < deadline:
+                res = yield fetcher.fetch(request)
+                assert res.code == 200, res.code
+                count[0] += 1
+
+        yield [worker() for _ in range(concurrency)]
+        raise gen.Return(count[0])
+
+    results.put(IOLoop.current().run_sync(load))
+
+
+@gen.coroutine
+def wait_ready():
+    fetcher = AsyncHTTPClient()
+    url = 'http://127.0.0.1:%d/api/stats' % API_PORT
+    while True:
+        try:
+            res = yield fetcher.fetch(url)
+            if json.loads(res.body)['workers'].get('sample'):
+                return
+        except (HTTPError, IOError):
+            pass
+        yield gen.sleep(0.1)
+
+
+def bench(processes, seconds, clients, concurrency):
+    server = multiprocessing.Process(target=run_server, args=(processes, ))
+    worker = multiprocessing.Process(target=run_worker)
+    server.start()
+    worker.start()
+    try:
+        IOLoop(make_current=False).run_sync(wait_ready, timeout=30)
+        results = multiprocessing.Queue()
+        loads = [
+            multiprocessing.Process(
+                target=run_load, args=(seconds, concurrency, results)
+            ) for _ in range(clients)
+        ]
+        start = time.time()
+        for load in loads:
+            load.start()
+        total = sum(results.get() for _ in loads)
+        elapsed = time.time() - start
+        for load in loads:
+            load.join()
+    finally:
+        worker.terminate()
+        server.terminate()
+        worker.join()
+        server.join()
+    return total / elapsed
+
+
+@click.command()
+@click.option('--processes', default='1,2,4', help='Front end counts')
+@click.option('--seconds', default=5.0, help='Load time per count')
+@click.option('--clients', default=cpu_count(), help='Load processes')
+@click.option('--concurrency', default=16, help='Requests in flight each')
+def main(processes, seconds, clients, concurrency):
+    print('%-10s %12s' % ('processes', 'requests/s'))
+    for count in [int(c) for c in processes.split(',')]:
+        rate = bench(count, seconds, clients, concurrency)
+        print('%-10d %12.1f' % (count, rate))
+        # Let the sockets of the last run go
+        time.sleep(1)
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=E1120
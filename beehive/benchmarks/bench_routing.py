@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    bench_routing.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Requests per second through RestService routing and the handler,
+    without sockets: requests are fed to the application directly and the
+    response is dropped.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import time
+
+import click
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.httputil import HTTPHeaders, HTTPServerRequest
+
+from beehive.libs.pyrestful import mediatypes
+from beehive.libs.pyrestful.rest import RestHandler, RestService, get, post
+
+
+class NullConnection(object):
+    """Enough of HTTP1Connection for a handler to write a response"""
+
+    def __init__(self):
+        self.status = None
+
+    def _done(self):
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def set_close_callback(self, callback):
+        pass
+
+    def write_headers(self, start_line, headers, chunk=None, callback=None):
+        self.status = start_line.code
+        return self._done()
+
+    def write(self, chunk, callback=None):
+        return self._done()
+
+    def finish(self):
+        pass
+
+
+class EchoHandler(RestHandler):
+
+    @post(path='/api/crack/{cracker_type}')
+    @gen.coroutine
+    def crack(self, cracker_type):
+        raise gen.Return({'ret': cracker_type})
+
+    @get(path='/api/stats', produces=mediatypes.APPLICATION_JSON)
+    def stats(self):
+        return {}
+
+    @get(path='/api/jobs/{job_id}', produces=mediatypes.APPLICATION_JSON)
+    def job(self, job_id):
+        return {'job_id': job_id}
+
+
+def bench(app, method, uri, seconds):
+    count = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        for _ in range(100):
+            connection = NullConnection()
+            request = HTTPServerRequest(
+                method=method,
+                uri=uri,
+                headers=HTTPHeaders(),
+                connection=connection,
+            )
+            app(request)
+            assert connection.status == 200, connection.status
+        count += 100
+    return count / (time.time() - start)
+
+
+@click.command()
+@click.option('--seconds', default=2.0, help='Time spent per request kind')
+def main(seconds):
+    app = RestService([EchoHandler], log_function=lambda handler: None)
+    requests = [
+        ('POST', '/api/crack/test'),
+        ('GET', '/api/stats'),
+        ('GET', '/api/jobs/42'),
+    ]
+    print('%-6s %-20s %12s' % ('method', 'uri', 'requests/s'))
+    for method, uri in requests:
+        rate = bench(app, method, uri, seconds)
+        print('%-6s %-20s %12.0f' % (method, uri, rate))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=E1120
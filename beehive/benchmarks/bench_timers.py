@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    bench_timers.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Cost of tracking call timeouts that almost never fire: each of
+    ``pending`` calls in flight schedules a timeout and cancels it when
+    it is answered, once with ``IOLoop.call_later`` per call and once on
+    the shared ``TimerWheel``.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import random
+import time
+
+import click
+from tornado.ioloop import IOLoop
+
+from beehive.libs.time_helper import TimerWheel
+
+
+def noop():
+    pass
+
+
+def ioloop_timers(ioloop):
+    return ioloop.call_later, ioloop.remove_timeout
+
+
+def wheel_timers(ioloop):
+    wheel = TimerWheel(ioloop=ioloop)
+    return wheel.call_later, wheel.remove
+
+
+def bench(timers, pending, calls, timeout):
+    """Add and cancel ``calls`` timeouts with ``pending`` of them live"""
+    ioloop = IOLoop()
+    add, cancel = timers(ioloop)
+    live = [add(timeout, noop) for _ in range(pending)]
+    start = time.time()
+    for _ in range(calls):
+        # Answers come back in any order
+        i = random.randrange(pending)
+        cancel(live[i])
+        live[i] = add(timeout, noop)
+    elapsed = time.time() - start
+    for timer in live:
+        cancel(timer)
+    ioloop.close(all_fds=True)
+    return calls / elapsed
+
+
+@click.command()
+@click.option('--calls', default=500000, help='Timeouts added per run')
+@click.option('--timeout', default=30.0, help='Seconds per timeout')
+def main(calls, timeout):
+    print('%-10s %-10s %14s' % ('pending', 'timers', 'add+cancel/s'))
+    for pending in (100, 10000, 100000):
+        for name, timers in (('ioloop', ioloop_timers),
+                             ('wheel', wheel_timers)):
+            rate = bench(timers, pending, calls, timeout)
+            print('%-10d %-10s %14.0f' % (pending, name, rate))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=E1120
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    bench_transport.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Round trip latency of crack calls to a worker on the same host, over
+    loopback TCP, over the Unix socket of the RPC server, over the Unix
+    socket with the image in shared memory and over TCP to a worker with
+    a blob cache, which gets the image, the same on every call, by its
+    content hash. One worker connects each way from a process of its
+    own and answers with the image size, calls are made one at a time
+    from the server.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+import click
+from tornado import gen
+from tornado.httputil import HTTPFile
+from tornado.ioloop import IOLoop
+
+from beehive.client import BeetleRPCClient
+from beehive.server.rpc_server import BeetleRPCServer
+
+RPC_HOST = '127.0.0.1'
+RPC_PORT = 17121
+
+
+class SizeCrackerClient(BeetleRPCClient):
+
+    _type_name = 'size'
+
+    def crack(self, params):
+        return len(params['file1'][0]['body'])
+
+
+def run_worker(host, port, shared_memory=False, blob_cache=0):
+    SizeCrackerClient(
+        host, port, shared_memory=shared_memory, blob_cache=blob_cache
+    ).run()
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+@gen.coroutine
+def bench(remote_client, params, calls):
+    # Warm up the connection and both ends
+    for _ in range(100):
+        yield remote_client.crack(params)
+    samples = []
+    for _ in range(calls):
+        start = time.time()
+        yield remote_client.crack(params)
+        samples.append(time.time() - start)
+    samples.sort()
+    raise gen.Return(samples)
+
+
+@click.command()
+@click.option('--calls', default=5000, help='Calls per transport and size')
+@click.option('--sizes', default='100,65536,1048576', help='Payload bytes')
+def main(calls, sizes):
+    path = os.path.join(tempfile.mkdtemp(), 'rpc.sock')
+    # Forked before the IOLoop of the server exists, workers retry until
+    # the server listens
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(RPC_HOST, RPC_PORT)),
+        multiprocessing.Process(
+            target=run_worker, args=('unix://' + path, None)
+        ),
+        multiprocessing.Process(
+            target=run_worker, args=('unix://' + path, None, True)
+        ),
+        multiprocessing.Process(
+            target=run_worker,
+            args=(RPC_HOST, RPC_PORT, False, 64 * 1024 * 1024),
+        ),
+    ]
+    for worker in workers:
+        worker.start()
+    server = BeetleRPCServer(
+        RPC_HOST,
+        RPC_PORT,
+        heartbeat_interval=0,
+        unix_socket=path,
+        shared_memory=64 * 1024 * 1024,
+    )
+    server.run()
+
+    @gen.coroutine
+    def run():
+        while len(server.registered_clients) < len(workers):
+            yield gen.sleep(0.1)
+        transports = {}
+        for remote_client in server.registered_clients:
+            if remote_client.shm is not None:
+                transports['shm'] = remote_client
+            elif remote_client.blobs is not None:
+                transports['blobs'] = remote_client
+            elif remote_client.address[0] == path:
+                transports['unix'] = remote_client
+            else:
+                transports['tcp'] = remote_client
+
+        print('%-6s %10s %10s %10s %10s' % (
+            'via', 'bytes', 'p50 (us)', 'p99 (us)', 'calls/s'
+        ))
+        for size in [int(s) for s in sizes.split(',')]:
+            params = {'file1': [HTTPFile(body=os.urandom(size))]}
+            for name in ('tcp', 'unix', 'shm', 'blobs'):
+                samples = yield bench(transports[name], params, calls)
+                print('%-6s %10d %10.1f %10.1f %10.1f' % (
+                    name,
+                    size,
+                    percentile(samples, 0.5) * 1e6,
+                    percentile(samples, 0.99) * 1e6,
+                    len(samples) / sum(samples),
+                ))
+
+    try:
+        IOLoop.current().run_sync(run)
+    finally:
+        for remote_client in server.registered_clients:
+            remote_client.close_shm()
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=E1120
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    bench_upload.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Crack requests per second through the multipart, streamed multipart
+    and raw body endpoints. Server, sample worker and HTTP client share
+    one process and IOLoop, the result cache is off.
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import time
+
+import click
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.ioloop import IOLoop
+
+from beehive.client.sample_cracker import SampleCrackerClient
+from beehive.server import BeetleServer
+
+lib_path = os.path.dirname(__file__)
+
+RPC_PORT = 17101
+API_PORT = 17102
+
+
+def multipart_request(path, image):
+    boundary = b'----------ThIs_Is_tHe_bouNdaRY_$'
+    parts = [
+        b'--' + boundary,
+        b'Content-Disposition: form-data; name="param1"',
+        b'',
+        b'1',
+        b'--' + boundary,
+        b'Content-Disposition: form-data; name="param2"',
+        b'',
+        b'str',
+        b'--' + boundary,
+        b'Content-Disposition: form-data; name="file"; filename="test.png"',
+        b'Content-Type: image/png',
+        b'',
+        image,
+        b'--' + boundary + b'--',
+        b'',
+    ]
+    return HTTPRequest(
+        url='http://127.0.0.1:%d/api/crack/sample%s' % (API_PORT, path),
+        method='POST',
+        headers={
+            'Content-Type': 'multipart/form-data; boundary=%s' %
+            boundary.decode()
+        },
+        body=b'\r\n'.join(parts),
+    )
+
+
+def raw_request(image):
+    return HTTPRequest(
+        url='http://127.0.0.1:%d/api/crack/sample/raw?param1=1' % API_PORT,
+        method='POST',
+        headers={
+            'Content-Type': 'image/png',
+            'X-Crack-Param2': 'str',
+            'X-Crack-Filename': 'test.png',
+        },
+        body=image,
+    )
+
+
+@gen.coroutine
+def bench(request, seconds, concurrency):
+    fetcher = AsyncHTTPClient(max_clients=concurrency)
+    deadline = time.time() + seconds
+    count = [0]
+
+    @gen.coroutine
+    def worker():
+        while time.time() < deadline:
+            res = yield fetcher.fetch(request)
+            assert res.code == 200, res.code
+            count[0] += 1
+
+    start = time.time()
+    yield [worker() for _ in range(concurrency)]
+    raise gen.Return(count[0] / (time.time() - start))
+
+
+@gen.coroutine
+def run(seconds, concurrency):
+    server = BeetleServer(
+        '127.0.0.1',
+        RPC_PORT,
+        '127.0.0.1',
+        API_PORT,
+        result_cache={'enabled': False},
+        single_flight=False,
+    )
+    server.rpc_server.run()
+    server.rest_app.listen(API_PORT, address='127.0.0.1')
+    client = SampleCrackerClient('127.0.0.1', RPC_PORT)
+    client.main_loop()
+    while not server.rpc_server.registered_clients:
+        yield gen.sleep(0.01)
+
+    with open(os.path.join(lib_path, '../tests/test.png'), 'rb') as fin:
+        sample = fin.read()
+    images = [
+        ('test.png', sample),
+        ('512KB', os.urandom(512 * 1024)),
+        ('4MB', os.urandom(4 * 1024 * 1024)),
+    ]
+    print('%-10s %-10s %12s' % ('payload', 'endpoint', 'requests/s'))
+    for image_name, image in images:
+        requests = [
+            ('multipart', multipart_request('', image)),
+            ('stream', multipart_request('/stream', image)),
+            ('raw', raw_request(image)),
+        ]
+        for name, request in requests:
+            rate = yield bench(request, seconds, concurrency)
+            print('%-10s %-10s %12.1f' % (image_name, name, rate))
+
+
+@click.command()
+@click.option('--seconds', default=2.0, help='Time spent per endpoint')
+@click.option('--concurrency', default=8, help='Requests in flight')
+def main(seconds, concurrency):
+    IOLoop.current().run_sync(lambda: run(seconds, concurrency))
+
+
+if __name__ == '__main__':
+    main()  # pylint: disable=E1120
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_backends.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    RPC methods run on the thread and process backends of the worker
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import threading
+import time
+
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.client import BeetleRPCClient, run_on
+from beehive.server.rpc_server import BeetleRPCServer
+
+
+def spin(seconds):
+    """Hold the CPU, and the GIL most of the time"""
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class BackendClient(BeetleRPCClient):
+
+    _type_name = 'backend'
+
+    @run_on('thread')
+    def sleep(self, seconds):
+        time.sleep(seconds)
+        return threading.get_ident()
+
+    @run_on('thread')
+    def spin_thread(self, seconds):
+        spin(seconds)
+        return True
+
+    @run_on('process')
+    def spin_process(self, seconds):
+        spin(seconds)
+        return os.getpid()
+
+    @run_on('process')
+    def fail(self):
+        raise ValueError('failed in process')
+
+
+class TestBackends(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10898
+
+    def tearDown(self):
+        for executor in self.client._executors.values():
+            executor.shutdown()
+        self.server.stop()
+        super(TestBackends, self).tearDown()
+
+    @gen.coroutine
+    def connect(self):
+        self.server = BeetleRPCServer(
+            self.test_host, self.test_port, heartbeat_interval=0
+        )
+        self.server.run()
+        self.client = BackendClient(self.test_host, self.test_port, slots=2)
+        self.client.main_loop()
+        while not self.client._registered:
+            yield gen.sleep(0.01)
+        raise gen.Return(self.server.registered_clients[0])
+
+    @gen.coroutine
+    def beat_time(self, remote_client):
+        time_start = time.time()
+        ret = yield remote_client.heart_beat(timeout=5)
+        self.assertTrue(ret)
+        raise gen.Return(time.time() - time_start)
+
+    @gen_test
+    def test_thread(self):
+        remote_client = yield self.connect()
+        time_start = time.time()
+        threads = yield [
+            remote_client.call('sleep', (0.2, ), {}) for _ in range(2)
+        ]
+        # One pool thread each, at the same time
+        self.assertLess(time.time() - time_start, 0.35)
+        self.assertEqual(len(set(threads)), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+        call = remote_client.call('spin_thread', (0.5, ), {})
+        yield gen.sleep(0.05)
+        beat_time = yield self.beat_time(remote_client)
+        self.assertLess(beat_time, 0.25)
+        self.assertFalse(call.done())
+        yield call
+
+    @gen_test(timeout=20)
+    def test_process(self):
+        remote_client = yield self.connect()
+        pid = yield remote_client.call('spin_process', (0, ), {})
+        self.assertNotEqual(pid, os.getpid())
+        with self.assertRaises(Exception) as cm:
+            yield remote_client.call('fail', (), {})
+        self.assertIn('failed in process', str(cm.exception))
+
+        call = remote_client.call('spin_process', (0.5, ), {})
+        yield gen.sleep(0.05)
+        beat_time = yield self.beat_time(remote_client)
+        self.assertLess(beat_time, 0.25)
+        self.assertFalse(call.done())
+        yield call
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_batcher.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Micro-batching of crack calls, and workers' default crack_batch
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import threading
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.client import BeetleRPCClient, run_on
+from beehive.server.rpc_server import BeetleRPCServer
+from beehive.server.rpc_server.batcher import Batcher
+from beehive.server.rpc_server.context import RequestContext
+from beehive.server.rpc_server.errors import (
+    DeadlineExceededError, RequestCancelledError
+)
+
+
+class FakeServer(object):
+    """Answers every call right away, ten times each params"""
+
+    def __init__(self, ioloop):
+        self.ioloop = ioloop
+        self.calls = []
+
+    def call_worker(self, client_type, func_name, args, kwargs, context=None):
+        self.calls.append((func_name, args[0]))
+        future = Future()
+        if func_name == 'crack_batch':
+            future.set_result([params * 10 for params in args[0]])
+        else:
+            future.set_result(args[0] * 10)
+        return future
+
+
+class TestBatcher(AsyncTestCase):
+
+    def setUp(self):
+        super(TestBatcher, self).setUp()
+        self.server = FakeServer(self.io_loop)
+
+    @gen_test
+    def test_split_by_size(self):
+        batcher = Batcher(self.server, 'sample', 3, 10)
+        futures = [batcher.submit(n, RequestContext()) for n in range(7)]
+        yield gen.moment
+        self.assertEqual(
+            self.server.calls,
+            [('crack_batch', [0, 1, 2]), ('crack_batch', [3, 4, 5])]
+        )
+        # The last one lingers for the next items
+        self.assertEqual(batcher.stats()['pending'], 1)
+        batcher.flush()
+        results = yield futures
+        self.assertEqual(results, [n * 10 for n in range(7)])
+        self.assertEqual(self.server.calls[-1], ('crack_batch', [6]))
+        self.assertEqual(batcher.stats()['batches'], 3)
+
+    @gen_test
+    def test_linger(self):
+        batcher = Batcher(self.server, 'sample', 10, 0.02)
+        time_start = self.io_loop.time()
+        futures = [batcher.submit(n, RequestContext()) for n in range(2)]
+        yield gen.moment
+        self.assertEqual(self.server.calls, [])
+        results = yield futures
+        self.assertGreaterEqual(self.io_loop.time() - time_start, 0.02)
+        self.assertEqual(results, [0, 10])
+        self.assertEqual(self.server.calls, [('crack_batch', [0, 1])])
+
+    @gen_test
+    def test_close_sends_single_calls(self):
+        batcher = Batcher(self.server, 'sample', 10, 10)
+        futures = [batcher.submit(n, RequestContext()) for n in range(2)]
+        batcher.close()
+        results = yield futures
+        self.assertEqual(results, [0, 10])
+        self.assertEqual(self.server.calls, [('crack', 0), ('crack', 1)])
+
+    @gen_test
+    def test_drop_expired(self):
+        batcher = Batcher(self.server, 'sample', 10, 0.02)
+        cancelled = RequestContext()
+        expired = batcher.submit(0, RequestContext(0.01))
+        gone = batcher.submit(1, cancelled)
+        kept = batcher.submit(2, RequestContext())
+        cancelled.cancel()
+        with self.assertRaises(DeadlineExceededError):
+            yield expired
+        with self.assertRaises(RequestCancelledError):
+            yield gone
+        self.assertEqual((yield kept), 20)
+        self.assertEqual(self.server.calls, [('crack_batch', [2])])
+        self.assertEqual(batcher.stats()['items'], 1)
+
+
+class CoroutineCrackClient(BeetleRPCClient):
+
+    _type_name = 'coroutine'
+
+    @gen.coroutine
+    def crack(self, params):
+        yield gen.moment
+        raise gen.Return(params * 10)
+
+
+class ThreadCrackClient(BeetleRPCClient):
+
+    _type_name = 'thread'
+
+    @run_on('thread')
+    def crack(self, params):
+        return params * 10, threading.get_ident()
+
+
+class TestDefaultCrackBatch(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10901
+
+    def setUp(self):
+        super(TestDefaultCrackBatch, self).setUp()
+        self.server = BeetleRPCServer(
+            self.test_host,
+            self.test_port,
+            batch_max_delay=0.01,
+            heartbeat_interval=0,
+        )
+        self.server.run()
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            for executor in client._executors.values():
+                executor.shutdown()
+        self.server.stop()
+        super(TestDefaultCrackBatch, self).tearDown()
+
+    @gen.coroutine
+    def crack_all(self, client_class):
+        client = client_class(self.test_host, self.test_port, batch_size=4)
+        self.clients.append(client)
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+        client_type = client_class._type_name
+        rets = yield [
+            self.server.dispatch(client_type, 'crack', (n, ))
+            for n in range(4)
+        ]
+        batcher = self.server.batchers[client_type]
+        self.assertEqual(batcher.stats()['batches'], 1)
+        raise gen.Return(rets)
+
+    @gen_test
+    def test_coroutine(self):
+        rets = yield self.crack_all(CoroutineCrackClient)
+        self.assertEqual(rets, [0, 10, 20, 30])
+
+    @gen_test
+    def test_thread(self):
+        rets = yield self.crack_all(ThreadCrackClient)
+        self.assertEqual([ret[0] for ret in rets], [0, 10, 20, 30])
+        for ret in rets:
+            self.assertNotEqual(ret[1], threading.get_ident())
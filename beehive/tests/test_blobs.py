@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_blobs.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Repeated payloads sent by content hash to workers with a blob cache
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import unittest
+
+from tornado import gen
+from tornado.httputil import HTTPFile
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.client import BeetleRPCClient
+from beehive.message.blobs import (
+    Blob, BlobIndex, BlobMissing, BlobRef, BlobStore
+)
+from beehive.server.rpc_server import BeetleRPCServer
+
+
+class TestBlobs(unittest.TestCase):
+
+    def test_ref_after_first_send(self):
+        index = BlobIndex(1024 * 1024)
+        store = BlobStore(1024 * 1024)
+        body = os.urandom(64 * 1024)
+        params = {'file1': [HTTPFile(body=body)], 'param1': [b'1']}
+
+        first = index.export(params)
+        self.assertIsInstance(first['file1'][0]['body'], Blob)
+        self.assertEqual(first['param1'], [b'1'])
+        self.assertEqual(store.resolve(first), params)
+
+        second = index.export(params)
+        self.assertIsInstance(second['file1'][0]['body'], BlobRef)
+        self.assertEqual(store.resolve(second), params)
+        self.assertEqual(index.stats()['ref_bytes'], len(body))
+
+        inline = index.export(params, inline=True)
+        self.assertIsInstance(inline['file1'][0]['body'], Blob)
+
+    def test_missing(self):
+        index = BlobIndex(1024 * 1024)
+        body = os.urandom(64 * 1024)
+        index.export(body)
+        ref = index.export(body)
+        with self.assertRaises(BlobMissing) as cm:
+            BlobStore(1024 * 1024).resolve([ref])
+        self.assertEqual(cm.exception.digests, [ref.digest])
+        index.forget(cm.exception.digests)
+        self.assertIsInstance(index.export(body), Blob)
+
+
+class LengthClient(BeetleRPCClient):
+
+    _type_name = 'length'
+
+    def crack(self, params):
+        return len(params['file1'][0]['body'])
+
+
+class TestBlobCall(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10891
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestBlobCall, self).tearDown()
+
+    @gen_test
+    def test_resend_on_miss(self):
+        self.server = BeetleRPCServer(
+            self.test_host, self.test_port, heartbeat_interval=0
+        )
+        self.server.run()
+        client = LengthClient(
+            self.test_host, self.test_port, blob_cache=1024 * 1024
+        )
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+
+        remote_client = self.server.registered_clients[0]
+        params = {'file1': [HTTPFile(body=os.urandom(100 * 1024))]}
+        for _ in range(2):
+            ret = yield remote_client.crack(params)
+            self.assertEqual(ret, 100 * 1024)
+        self.assertEqual(remote_client.blobs.stats()['refs'], 1)
+
+        # Evicted on the worker, it asks for the bytes again
+        client.blobs = BlobStore(1024 * 1024)
+        ret = yield remote_client.crack(params)
+        self.assertEqual(ret, 100 * 1024)
+        self.assertEqual(remote_client.blobs.stats()['misses'], 1)
+        # Referred to again on the next call
+        yield remote_client.crack(params)
+        self.assertEqual(remote_client.blobs.stats()['refs'], 3)
+        self.assertEqual(remote_client.blobs.stats()['misses'], 1)
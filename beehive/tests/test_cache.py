@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_cache.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Result cache, its LRU and single flight of identical cracks
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import time
+import unittest
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.httputil import HTTPFile
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.libs.cache import LRUCache
+from beehive.server.crack_service import (
+    CrackService, ResultCache, params_digest
+)
+from beehive.server.rpc_server.context import RequestContext
+from beehive.server.rpc_server.errors import RequestCancelledError
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_bounds(self):
+        cache = LRUCache(max_entries=2, max_bytes=10)
+        cache.set('a', 1, 4)
+        cache.set('b', 2, 4)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3, 4)
+        # b was the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('d', 4, 8)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()['bytes'], 8)
+
+    def test_ttl(self):
+        cache = LRUCache()
+        cache.set('a', 1, 1, ttl=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def params(self, body, filename='a.png'):
+        return {
+            'param1': [b'1'],
+            'file1': [HTTPFile(filename=filename, body=body)],
+        }
+
+    def test_digest(self):
+        digest = params_digest('sample', self.params(b'img'))
+        self.assertEqual(digest, params_digest('sample', self.params(b'img')))
+        self.assertNotEqual(
+            digest, params_digest('sample', self.params(b'img', 'b.png'))
+        )
+        self.assertNotEqual(
+            digest, params_digest('sample', self.params(b'img2'))
+        )
+        self.assertNotEqual(digest, params_digest('other', self.params(b'img')))
+
+    def test_digest_structure(self):
+        # A field and a file of the same name and bytes
+        self.assertNotEqual(
+            params_digest('sample', {'file1': [b'img']}),
+            params_digest('sample', {'file1': [HTTPFile(body=b'img')]}),
+        )
+        self.assertNotEqual(
+            params_digest(
+                'sample', {'file1': [HTTPFile(body=b'img')]}
+            ),
+            params_digest(
+                'sample',
+                {'file1': [HTTPFile(body=b'img', content_type='image/png')]}
+            ),
+        )
+        # Values of one name are not taken for the next name
+        self.assertNotEqual(
+            params_digest('sample', {'a': [b'1'], 'b': []}),
+            params_digest('sample', {'a': [b'1', b'b']}),
+        )
+
+    def test_disabled_type(self):
+        cache = ResultCache(types={'random': {'enabled': False}})
+        self.assertFalse(cache.cached('random'))
+        self.assertTrue(cache.cached('sample'))
+        key = params_digest('sample', self.params(b'img'))
+        cache.set('sample', key, {'text': 'abcd'})
+        self.assertEqual(cache.get(key), {'text': 'abcd'})
+
+
+class FakeRPCServer(object):
+    """Calls are answered by the test through their futures"""
+
+    def __init__(self):
+        self.calls = []
+
+    def dispatch(
+        self, cracker_type, func_name, args=(), kwargs=None, context=None
+    ):
+        future = Future()
+        self.calls.append((future, context))
+        return future
+
+
+class TestSingleFlight(AsyncTestCase):
+
+    params = {'param1': [b'1'], 'file1': [HTTPFile(body=b'img')]}
+
+    def setUp(self):
+        super(TestSingleFlight, self).setUp()
+        self.rpc_server = FakeRPCServer()
+        self.service = CrackService(
+            self.rpc_server, result_cache={'enabled': False}
+        )
+
+    def crack(self, context=None):
+        return self.service.crack('sample', self.params, context)
+
+    @gen_test
+    def test_one_call(self):
+        cracks = [self.crack() for _ in range(3)]
+        yield gen.moment
+        self.assertEqual(len(self.rpc_server.calls), 1)
+        self.rpc_server.calls[0][0].set_result('abcd')
+        results = yield cracks
+        self.assertEqual(results, ['abcd'] * 3)
+        stats = self.service.flights.stats()
+        self.assertEqual((stats['calls'], stats['coalesced']), (1, 2))
+        self.assertEqual(stats['in_flight'], 0)
+
+    @gen_test
+    def test_leave(self):
+        contexts = [RequestContext(), RequestContext()]
+        cracks = [self.crack(context) for context in contexts]
+        yield gen.moment
+        future, flight_context = self.rpc_server.calls[0]
+
+        # The others still wait, the call goes on
+        contexts[0].cancel()
+        with self.assertRaises(RequestCancelledError):
+            yield cracks[0]
+        self.assertFalse(flight_context.cancelled)
+        future.set_result('abcd')
+        self.assertEqual((yield cracks[1]), 'abcd')
+
+        # Nobody waits anymore, the call is cancelled
+        contexts = [RequestContext(), RequestContext()]
+        cracks = [self.crack(context) for context in contexts]
+        yield gen.moment
+        flight_context = self.rpc_server.calls[1][1]
+        for context, crack in zip(contexts, cracks):
+            context.cancel()
+            with self.assertRaises(RequestCancelledError):
+                yield crack
+        self.assertTrue(flight_context.cancelled)
+
+    @gen_test
+    def test_error_not_cached(self):
+        self.service = CrackService(self.rpc_server)
+        cracks = [self.crack() for _ in range(2)]
+        yield gen.moment
+        self.rpc_server.calls[0][0].set_exception(ValueError('failed'))
+        for crack in cracks:
+            with self.assertRaises(ValueError):
+                yield crack
+
+        crack = self.crack()
+        yield gen.moment
+        self.assertEqual(len(self.rpc_server.calls), 2)
+        self.rpc_server.calls[1][0].set_result('abcd')
+        self.assertEqual((yield crack), 'abcd')
+        self.assertEqual((yield self.crack()), 'abcd')
+        self.assertEqual(len(self.rpc_server.calls), 2)
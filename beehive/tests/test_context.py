@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_context.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Request deadlines and cancellation
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.server.rpc_server.context import RequestContext
+from beehive.server.rpc_server.errors import (
+    DeadlineExceededError, RequestCancelledError
+)
+
+
+class TestRequestContext(AsyncTestCase):
+
+    @gen_test
+    def test_result(self):
+        context = RequestContext(1)
+        future = Future()
+        self.io_loop.call_later(0.01, lambda: future.set_result('ret'))
+        res = yield context.wait(future)
+        self.assertEqual(res, 'ret')
+        self.assertLessEqual(context.timeout(30), 1)
+        self.assertEqual(RequestContext().timeout(30), 30)
+
+    @gen_test
+    def test_deadline(self):
+        context = RequestContext(0.05)
+        with self.assertRaises(DeadlineExceededError):
+            yield context.wait(Future(), 10)
+        with self.assertRaises(DeadlineExceededError):
+            context.check()
+
+    @gen_test
+    def test_timeout_before_deadline(self):
+        context = RequestContext(10)
+        with self.assertRaises(gen.TimeoutError):
+            yield context.wait(Future(), 0.05)
+        context.check()
+
+    @gen_test
+    def test_cancel(self):
+        context = RequestContext()
+        cancelled = []
+        context.add_cancel_callback(lambda: cancelled.append(1))
+        self.io_loop.call_later(0.01, context.cancel)
+        with self.assertRaises(RequestCancelledError):
+            yield context.wait(Future())
+        context.cancel()
+        self.assertEqual(cancelled, [1])
+        with self.assertRaises(RequestCancelledError):
+            context.check()
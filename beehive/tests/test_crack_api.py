@@ -12,15 +12,22 @@
     @python version: 3.8
 """
 
+import base64
+import json
 import mimetypes
+import struct
 
 from tornado import gen
+from tornado.ioloop import IOLoop
 from tornado.testing import AsyncTestCase, gen_test
 from tornado.httpclient import HTTPRequest
 from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import websocket_connect
 
+from beehive.client import BeetleRPCClient
 from beehive.client.sample_cracker import SampleCrackerClient
 from beehive.server import BeetleServer
+from beehive.server.api.ws import build_frame
 from beehive.utils import run_in_thread, run_in_subprocess
 
 
@@ -61,20 +68,35 @@ def get_content_type(filename):
                                 )[0] or 'application/octet-stream'
 
 
+def unpack_bytes(value):
+    """Bytes the JSON encoder wrote as ``[BEETLE_BYTES]<base64>``"""
+    return base64.b64decode(value[len('[BEETLE_BYTES]'):])
+
+
+def received(res):
+    """Params the sample cracker got, it answers with them"""
+    return json.loads(res.body.decode())['ret'][0]
+
+
 class TestCrackerAPI(AsyncTestCase):
 
     test_host = '127.0.0.1'
-    test_port = 10888
+    test_port = 10893
     test_api_host = '127.0.0.1'
     test_api_port = 10999
 
     @classmethod
     def setUpClass(cls):
+        # A loop of its own, the one of the previous class may still be
+        # stopping in its thread
+        IOLoop().make_current()
         cls.server = BeetleServer(
             cls.test_host,
             cls.test_port,
             cls.test_api_host,
             cls.test_api_port,
+            # Every request reaches the worker, which echoes its params
+            result_cache={'enabled': False},
         )
         cls.server_thread = run_in_thread(cls.server.run)
         cls.client = SampleCrackerClient(
@@ -82,13 +104,18 @@ class TestCrackerAPI(AsyncTestCase):
             cls.test_port,
         )
         cls.client_thread = run_in_thread(cls.client.run)
-        cls.fetcher = AsyncHTTPClient()
+        IOLoop.clear_current()
 
     @classmethod
     def tearDownClass(cls):
         cls.client.ioloop.stop()
         cls.server.ioloop.stop()
 
+    @property
+    def fetcher(self):
+        # Of the test's IOLoop, the server's runs in another thread
+        return AsyncHTTPClient()
+
     @gen_test
     def test_api(self):
         while not self.client._registered:
@@ -122,4 +149,316 @@ class TestCrackerAPI(AsyncTestCase):
 
         print(res.body)
 
-        self.assertTrue(res.code == 200)
\ No newline at end of file
+        self.assertTrue(res.code == 200)
+
+    @gen_test
+    def test_stream(self):
+        while not self.client._registered:
+            yield gen.sleep(0.1)
+
+        with open('tests/test.png', 'rb') as fin:
+            img = fin.read()
+
+        content_type, body = encode_multipart_formdata(
+            fields=[
+                ('param1', '1'),
+                ('param2', 'str'),
+            ],
+            files=[
+                ('file1', 'test.png', img),
+            ]
+        )
+        url = 'http://{}:{}/api/crack/sample'.format(
+            self.test_api_host, self.test_api_port
+        )
+
+        responses = []
+        for path in ('', '/stream'):
+            res = yield self.fetcher.fetch(
+                HTTPRequest(
+                    url=url + path + '?param3=q',
+                    method='POST',
+                    headers={
+                        'Content-Type': content_type,
+                    },
+                    body=body,
+                )
+            )
+            responses.append(res.body)
+
+        self.assertEqual(responses[0], responses[1])
+        params = received(res)
+        self.assertEqual(
+            {name: [unpack_bytes(value) for value in params[name]]
+             for name in ('param1', 'param2', 'param3')},
+            {'param1': [b'1'], 'param2': [b'str'], 'param3': [b'q']},
+        )
+        image, = params['file1']
+        self.assertEqual(image['filename'], 'test.png')
+        self.assertEqual(image['content_type'], 'image/png')
+        self.assertEqual(unpack_bytes(image['body']), img)
+
+    @gen_test
+    def test_raw(self):
+        while not self.client._registered:
+            yield gen.sleep(0.1)
+
+        with open('tests/test.png', 'rb') as fin:
+            img = fin.read()
+
+        content_type, body = encode_multipart_formdata(
+            fields=[
+                ('param1', '1'),
+                ('param2', 'str'),
+            ],
+            files=[
+                ('file1', 'test.png', img),
+            ]
+        )
+        url = 'http://{}:{}/api/crack/sample'.format(
+            self.test_api_host, self.test_api_port
+        )
+        multipart = yield self.fetcher.fetch(
+            HTTPRequest(
+                url=url,
+                method='POST',
+                headers={
+                    'Content-Type': content_type,
+                },
+                body=body,
+            )
+        )
+        raw = yield self.fetcher.fetch(
+            HTTPRequest(
+                url=url + '/raw?param1=1',
+                method='POST',
+                headers={
+                    'Content-Type': 'image/png',
+                    'X-Crack-Param2': 'str',
+                    'X-Crack-Field': 'file1',
+                    'X-Crack-Filename': 'test.png',
+                },
+                body=img,
+            )
+        )
+
+        self.assertEqual(raw.code, 200)
+        self.assertEqual(raw.body, multipart.body)
+        params = received(raw)
+        self.assertEqual(sorted(params), ['file1', 'param1', 'param2'])
+        self.assertEqual(unpack_bytes(params['param2'][0]), b'str')
+        image, = params['file1']
+        self.assertEqual(image['filename'], 'test.png')
+        self.assertEqual(image['content_type'], 'image/png')
+        self.assertEqual(unpack_bytes(image['body']), img)
+
+    @gen_test
+    def test_batch(self):
+        while not self.client._registered:
+            yield gen.sleep(0.1)
+
+        images = [b'image%d' % i for i in range(5)]
+        content_type, body = encode_multipart_formdata(
+            fields=[
+                ('param1', '1'),
+            ],
+            files=[('file1', 'test.png', img) for img in images]
+        )
+        url = 'http://{}:{}/api/crack/sample/batch'.format(
+            self.test_api_host, self.test_api_port
+        )
+        res = yield self.fetcher.fetch(
+            HTTPRequest(
+                url=url,
+                method='POST',
+                headers={
+                    'Content-Type': content_type,
+                },
+                body=body,
+            )
+        )
+        results = json.loads(res.body.decode())['ret']
+        self.assertEqual(len(results), len(images))
+        for img, result in zip(images, results):
+            body = result['ret'][0]['file1'][0]['body']
+            self.assertEqual(
+                base64.b64decode(body[len('[BEETLE_BYTES]'):]), img
+            )
+
+        # Length prefixed body, results streamed as they finish
+        body = b''.join(struct.pack('!I', len(img)) + img for img in images)
+        res = yield self.fetcher.fetch(
+            HTTPRequest(
+                url=url + '?param1=1',
+                method='POST',
+                headers={
+                    'Accept': 'application/x-ndjson',
+                    'X-Crack-Field': 'file1',
+                },
+                body=body,
+            )
+        )
+        lines = [json.loads(line) for line in res.body.decode().splitlines()]
+        self.assertEqual(
+            sorted(line['index'] for line in lines), list(range(len(images)))
+        )
+
+    @gen_test
+    def test_jobs(self):
+        while not self.client._registered:
+            yield gen.sleep(0.1)
+
+        content_type, body = encode_multipart_formdata(
+            fields=[
+                ('param1', '1'),
+            ],
+            files=[]
+        )
+        url = 'http://{}:{}/api/jobs'.format(
+            self.test_api_host, self.test_api_port
+        )
+        res = yield self.fetcher.fetch(
+            HTTPRequest(
+                url=url + '/sample',
+                method='POST',
+                headers={
+                    'Content-Type': content_type,
+                },
+                body=body,
+            )
+        )
+        self.assertEqual(res.code, 202)
+        job_id = json.loads(res.body.decode())['job_id']
+
+        res = yield self.fetcher.fetch('%s/%s?wait=5' % (url, job_id))
+        job = json.loads(res.body.decode())
+        self.assertEqual(job['status'], 'done')
+        self.assertTrue(job['ret'])
+
+    @gen_test
+    def test_websocket(self):
+        while not self.client._registered:
+            yield gen.sleep(0.1)
+
+        conn = yield websocket_connect(
+            'ws://{}:{}/api/ws/crack'.format(
+                self.test_api_host, self.test_api_port
+            )
+        )
+        for i in range(3):
+            conn.write_message(
+                build_frame(i, 'sample', b'image%d' % i, b'param1=1'),
+                binary=True
+            )
+        conn.write_message(build_frame(3, 'none', b'image'), binary=True)
+
+        results = {}
+        for _ in range(4):
+            result = json.loads((yield conn.read_message()))
+            results[result['id']] = result
+        conn.close()
+
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertIn('ret', results[0])
+        self.assertEqual(results[3]['err'], 1001)
+
+
+class SlowCrackerClient(BeetleRPCClient):
+
+    _type_name = 'slow'
+
+    @gen.coroutine
+    def crack(self, params):
+        yield gen.sleep(float(params['delay'][0]))
+        raise gen.Return(params['n'][0])
+
+
+class TestQueueLimits(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10895
+    test_api_host = '127.0.0.1'
+    test_api_port = 10995
+
+    def tearDown(self):
+        self.http_server.stop()
+        self.server.rpc_server.stop()
+        super(TestQueueLimits, self).tearDown()
+
+    def fetch(self, delay, n):
+        return AsyncHTTPClient().fetch(
+            HTTPRequest(
+                url='http://{}:{}/api/crack/slow/raw?delay={}&n={}'.format(
+                    self.test_api_host, self.test_api_port, delay, n
+                ),
+                method='POST',
+                body=b'',
+            ),
+            raise_error=False,
+        )
+
+    @gen.coroutine
+    def start(self, **kwargs):
+        # One worker slot and one queued call at most
+        self.server = BeetleServer(
+            self.test_host,
+            self.test_port,
+            self.test_api_host,
+            self.test_api_port,
+            queue_size=1,
+            heartbeat_interval=0,
+            **kwargs
+        )
+        self.server.rpc_server.run()
+        self.http_server = self.server.rest_app.listen(
+            self.test_api_port, address=self.test_api_host
+        )
+        client = SlowCrackerClient(self.test_host, self.test_port)
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+
+    @gen_test
+    def test_full_and_timeout(self):
+        yield self.start(queue_timeout=0.2)
+
+        running = self.fetch(0.5, 1)
+        yield gen.sleep(0.05)
+        queued = self.fetch(0, 2)
+        yield gen.sleep(0.05)
+        rejected = yield self.fetch(0, 3)
+        self.assertEqual(rejected.code, 429)
+        self.assertEqual(json.loads(rejected.body)['err'], 1003)
+
+        queued = yield queued
+        self.assertEqual(queued.code, 503)
+        self.assertEqual(json.loads(queued.body)['err'], 1004)
+        running = yield running
+        self.assertEqual(running.code, 200)
+
+        stats = self.server.rpc_server.queues['slow'].stats()
+        self.assertEqual((stats['rejected'], stats['timeouts']), (1, 1))
+
+    @gen_test
+    def test_batch_larger_than_queue(self):
+        yield self.start(batch_max_in_flight=2)
+
+        images = [b'image%d' % i for i in range(6)]
+        res = yield AsyncHTTPClient().fetch(
+            HTTPRequest(
+                url='http://{}:{}/api/crack/slow/batch?delay=0.01&n=1'.format(
+                    self.test_api_host, self.test_api_port
+                ),
+                method='POST',
+                body=b''.join(
+                    struct.pack('!I', len(img)) + img for img in images
+                ),
+            )
+        )
+        # One running and one queued at a time, none turned away
+        results = json.loads(res.body.decode())['ret']
+        self.assertEqual(len(results), len(images))
+        for result in results:
+            self.assertIn('ret', result)
+        stats = self.server.rpc_server.queues['slow'].stats()
+        self.assertEqual(stats['rejected'], 0)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_dispatcher.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Front end calls to the dispatcher process over its Unix socket
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from urllib.request import urlopen
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.netutil import bind_unix_socket
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.message.stream import MessageStream
+from beehive.server.dispatcher import DispatcherClient, DispatcherServer
+from beehive.server.rpc_server.errors import DispatcherUnavailableError
+
+lib_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER = '''
+import sys
+sys.path.insert(0, %r)
+from beehive.server import BeetleServer
+BeetleServer(
+    '127.0.0.1', %d, '127.0.0.1', %d, processes=2, heartbeat_interval=0,
+    dispatcher_socket=%r,
+).run()
+'''
+
+
+def child_pids(pid):
+    with open('/proc/%d/task/%d/children' % (pid, pid)) as f:
+        return [int(child) for child in f.read().split()]
+
+
+class StuckCrackService(object):
+    """Cracks that never finish, their contexts are kept"""
+
+    def __init__(self):
+        self.contexts = []
+
+    def crack(self, cracker_type, params, context):
+        self.contexts.append(context)
+        return Future()
+
+    def stats(self):
+        return {'workers': {}}
+
+
+class TestDispatcherClient(AsyncTestCase):
+
+    def setUp(self):
+        super(TestDispatcherClient, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'dispatcher.sock')
+
+    def tearDown(self):
+        super(TestDispatcherClient, self).tearDown()
+        shutil.rmtree(self.tmp_dir)
+
+    @gen_test
+    def test_unreachable(self):
+        client = DispatcherClient(self.path, connect_timeout=0.05)
+        with self.assertRaises(DispatcherUnavailableError):
+            yield client.stats()
+
+    @gen_test
+    def test_call_timeout(self):
+        service = StuckCrackService()
+        server = DispatcherServer(service, None)
+        server.add_socket(bind_unix_socket(self.path))
+        try:
+            client = DispatcherClient(self.path, call_timeout=0.05)
+            ret = yield client.stats()
+            self.assertEqual(ret, {'workers': {}})
+            with self.assertRaises(DispatcherUnavailableError):
+                yield client.crack('sample', {})
+            yield gen.sleep(0.05)
+            # Given up on by the front end, the dispatcher drops it too
+            self.assertTrue(service.contexts[0].cancelled)
+            self.assertFalse(client._pending)
+        finally:
+            server.stop()
+
+
+@unittest.skipUnless(
+    os.path.exists('/proc/self/task'), 'Needs the children of /proc'
+)
+class TestFrontEnds(unittest.TestCase):
+
+    rpc_port = 10894
+    api_port = 10994
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        script = SERVER % (
+            lib_path, self.rpc_port, self.api_port,
+            os.path.join(self.tmp_dir, 'dispatcher.sock'),
+        )
+        self.server = subprocess.Popen(
+            [sys.executable, '-c', script],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def tearDown(self):
+        self.server.send_signal(signal.SIGTERM)
+        try:
+            self.server.wait(10)
+        except subprocess.TimeoutExpired:
+            self.server.kill()
+            self.server.wait()
+        shutil.rmtree(self.tmp_dir)
+
+    def wait_for(self, predicate, timeout=10):
+        deadline = time.time() + timeout
+        while not predicate():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.05)
+
+    def api_up(self):
+        try:
+            url = 'http://127.0.0.1:%d/api/stats' % self.api_port
+            return urlopen(url, timeout=1).status == 200
+        except OSError:
+            return False
+
+    def test_restarted_front_end_holds_no_worker(self):
+        self.wait_for(self.api_up)
+        supervisor, = child_pids(self.server.pid)
+        front_ends = child_pids(supervisor)
+        self.assertEqual(len(front_ends), 2)
+
+        worker = socket.create_connection(('127.0.0.1', self.rpc_port))
+        self.addCleanup(worker.close)
+        # Accepted by the dispatcher before the front end is forked again
+        time.sleep(0.5)
+        os.kill(front_ends[0], signal.SIGKILL)
+        self.wait_for(
+            lambda: len(child_pids(supervisor)) == 2 and
+            front_ends[0] not in child_pids(supervisor)
+        )
+
+        # Not a message, the dispatcher closes the connection and the
+        # worker sees it: no front end holds a copy
+        worker.sendall(b'garbage' + MessageStream.EOM)
+        worker.settimeout(5)
+        self.assertEqual(worker.recv(1), b'')
+        self.assertTrue(self.api_up())
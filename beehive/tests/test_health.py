@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_health.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Heartbeats, outlier ejection and circuit breaking
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import subprocess
+import sys
+import unittest
+
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.client import BeetleRPCClient
+from beehive.server.rpc_server import BeetleRPCServer
+from beehive.server.rpc_server.health import CircuitBreaker, OutlierDetector
+
+lib_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Solves inline, its IOLoop cannot answer beats meanwhile
+SPIN_WORKER = '''
+import sys
+import time
+sys.path.insert(0, %r)
+from beehive.client import BeetleRPCClient
+
+class SpinClient(BeetleRPCClient):
+
+    _type_name = 'spin'
+
+    def crack(self, seconds):
+        end = time.time() + seconds
+        while time.time() < end:
+            pass
+        return True
+
+SpinClient('127.0.0.1', %d).run()
+'''
+
+
+class TestOutlierDetector(unittest.TestCase):
+
+    def test_consecutive_failures(self):
+        detector = OutlierDetector(consecutive_failures=3, base_ejection=10)
+        client = object()
+        self.assertFalse(detector.on_call(client, 0.1, False))
+        self.assertFalse(detector.on_call(client, 0.1, None))
+        self.assertFalse(detector.on_call(client, 0.1, False))
+        self.assertTrue(detector.on_call(client, 0.1, False))
+
+        detector.eject(client, 0)
+        self.assertTrue(detector.is_out(client))
+        self.assertEqual(detector.expired(5), [])
+        self.assertEqual(detector.expired(10), [client])
+        self.assertFalse(detector.is_out(client))
+
+        # One probe call, its failure ejects the worker again for longer
+        self.assertTrue(detector.start_call(client))
+        self.assertTrue(detector.is_out(client))
+        self.assertTrue(detector.on_call(client, 0.1, False))
+        detector.eject(client, 10)
+        self.assertEqual(detector.expired(29), [])
+        self.assertEqual(detector.expired(30), [client])
+        detector.start_call(client)
+        self.assertFalse(detector.on_call(client, 0.1, True))
+        self.assertFalse(detector.is_out(client))
+        self.assertFalse(detector.start_call(client))
+
+    def test_outliers(self):
+        detector = OutlierDetector(min_calls=5, max_ejected=0.5)
+        fast = [object() for _ in range(3)]
+        slow, failing = object(), object()
+        for _ in range(10):
+            for client in fast:
+                detector.on_call(client, 0.01, True)
+            detector.on_call(slow, 1.0, True)
+            detector.on_call(failing, 0.01, _ % 4 == 0)
+        clients = fast + [slow, failing]
+        self.assertEqual(
+            set(detector.outliers(clients)), set([slow, failing])
+        )
+        detector.eject(slow, 0)
+        self.assertTrue(detector.can_eject(clients))
+        detector.eject(failing, 0)
+        self.assertFalse(detector.can_eject(clients))
+        self.assertEqual(detector.stats()['ejected'], 2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_and_probe(self):
+        breaker = CircuitBreaker(failure_threshold=3, open_time=10)
+        for _ in range(3):
+            self.assertTrue(breaker.allow(0))
+            breaker.on_call(False, 0)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow(5))
+
+        # Half open, one call at a time
+        self.assertEqual(breaker.allow(10), CircuitBreaker.PROBE)
+        self.assertFalse(breaker.allow(10))
+        breaker.on_call(False, 10, probe=True)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow(15))
+
+        self.assertEqual(breaker.allow(20), CircuitBreaker.PROBE)
+        breaker.on_call(None, 20, probe=True)
+        self.assertEqual(breaker.allow(20), CircuitBreaker.PROBE)
+        breaker.on_call(True, 20, probe=True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.stats()['opened'], 2)
+
+    def test_late_call_while_probing(self):
+        breaker = CircuitBreaker(failure_threshold=1, open_time=10)
+        # Started while closed, answered once half open
+        self.assertIs(breaker.allow(0), True)
+        self.assertIs(breaker.allow(0), True)
+        breaker.on_call(False, 0)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.allow(10), CircuitBreaker.PROBE)
+
+        breaker.on_call(True, 10)
+        breaker.on_call(False, 10)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(breaker.probe_in_flight)
+        self.assertFalse(breaker.allow(10))
+
+        breaker.on_call(True, 11, probe=True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class StallClient(BeetleRPCClient):
+
+    _type_name = 'stall'
+
+    # Beats wait for this future when set
+    stalled = None
+
+    @gen.coroutine
+    def heart_beat(self):
+        if self.stalled is not None:
+            yield self.stalled
+        raise gen.Return(True)
+
+    @gen.coroutine
+    def crack(self, delay):
+        yield gen.sleep(delay)
+        raise gen.Return(True)
+
+
+class TestHeartbeat(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10899
+
+    def setUp(self):
+        super(TestHeartbeat, self).setUp()
+        # Beaten by the tests
+        self.server = BeetleRPCServer(
+            self.test_host,
+            self.test_port,
+            heartbeat_interval=0,
+            heartbeat_timeout=0.05,
+            heartbeat_max_missed=2,
+        )
+        self.server.run()
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestHeartbeat, self).tearDown()
+
+    @gen.coroutine
+    def connect(self):
+        self.client = StallClient(self.test_host, self.test_port)
+        self.client.main_loop()
+        while not self.client._registered:
+            yield gen.sleep(0.01)
+        raise gen.Return(self.server.registered_clients[0])
+
+    @gen_test
+    def test_missed_and_back(self):
+        remote_client = yield self.connect()
+        self.client.stalled = Future()
+        yield self.server.beat(remote_client)
+        self.assertEqual(remote_client.missed_beats, 1)
+        self.assertFalse(remote_client.healthy)
+        self.assertNotIn(
+            remote_client, self.server.scheduler.clients('stall')
+        )
+
+        self.client.stalled.set_result(None)
+        self.client.stalled = None
+        yield self.server.beat(remote_client)
+        self.assertEqual(remote_client.missed_beats, 0)
+        self.assertTrue(remote_client.healthy)
+        self.assertIn(remote_client, self.server.scheduler.clients('stall'))
+        self.assertIsNotNone(remote_client.rtt)
+
+    @gen_test
+    def test_evicted(self):
+        remote_client = yield self.connect()
+        self.client.stalled = Future()
+        for _ in range(2):
+            yield self.server.beat(remote_client)
+        self.assertEqual(self.server.evicted, 1)
+        while remote_client in self.server.registered_clients:
+            yield gen.sleep(0.01)
+
+    @gen_test
+    def test_busy_not_evicted(self):
+        remote_client = yield self.connect()
+        call = self.server.dispatch('stall', 'crack', (0.3, ))
+        self.client.stalled = Future()
+        for _ in range(3):
+            yield self.server.beat(remote_client)
+        self.assertEqual(remote_client.missed_beats, 3)
+        self.assertEqual(self.server.evicted, 0)
+        self.assertIn(remote_client, self.server.registered_clients)
+
+        self.assertTrue((yield call))
+        # Idle and still silent
+        yield self.server.beat(remote_client)
+        self.assertEqual(self.server.evicted, 1)
+
+
+class TestInlineWorker(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10900
+
+    def tearDown(self):
+        self.worker.kill()
+        self.worker.wait()
+        self.server.stop()
+        super(TestInlineWorker, self).tearDown()
+
+    @gen_test(timeout=20)
+    def test_long_inline_solve(self):
+        self.server = BeetleRPCServer(
+            self.test_host,
+            self.test_port,
+            heartbeat_interval=0.1,
+            heartbeat_timeout=0.05,
+            heartbeat_max_missed=2,
+        )
+        self.server.run()
+        self.worker = subprocess.Popen(
+            [sys.executable, '-c', SPIN_WORKER % (lib_path, self.test_port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        while not self.server.registered_clients:
+            yield gen.sleep(0.05)
+        remote_client = self.server.registered_clients[0]
+
+        call = self.server.dispatch('spin', 'crack', (1.0, ))
+        yield gen.sleep(0.6)
+        # Silent while it solves, not called but kept
+        self.assertFalse(remote_client.healthy)
+        self.assertGreaterEqual(remote_client.missed_beats, 2)
+        self.assertTrue((yield call))
+        yield gen.sleep(0.3)
+        self.assertTrue(remote_client.healthy)
+        self.assertEqual(self.server.evicted, 0)
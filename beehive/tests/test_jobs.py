@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_jobs.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Job store bounds and expiry
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import time
+import unittest
+
+from tornado.concurrent import Future
+
+from beehive.server.jobs import Job, JobStore, JobStoreFullError
+
+
+class TestJobStore(unittest.TestCase):
+
+    def test_finish(self):
+        store = JobStore()
+        futures = [Future(), Future()]
+        jobs = [
+            store.submit('sample', None, lambda f=f: f) for f in futures
+        ]
+        self.assertEqual(jobs[0].status, Job.PENDING)
+        futures[0].set_result('ret')
+        futures[1].set_exception(ValueError())
+        self.assertEqual(store.get(jobs[0].job_id).result, 'ret')
+        self.assertEqual(jobs[1].status, Job.FAILED)
+        self.assertTrue(jobs[1].finished.done())
+        self.assertEqual(store.stats()['failed'], 1)
+
+    def test_bounds(self):
+        store = JobStore(max_jobs=2, ttl=0.05)
+        store.submit('sample', None, Future)
+        job = store.submit('sample', None, Future)
+        self.assertRaises(
+            JobStoreFullError, store.submit, 'sample', None, Future
+        )
+        time.sleep(0.1)
+        self.assertIsNone(store.get(job.job_id))
+        store.submit('sample', None, Future)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.stats()['expired'], 2)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_message.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Message framing over a local socket pair
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import socket
+
+from tornado.iostream import IOStream
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.message import RPCRequest, RPCResponse
+from beehive.message.codec import CODECS
+from beehive.message.compression import COMPRESSORS
+from beehive.message.stream import MessageStream
+
+
+class TestMessageStream(AsyncTestCase):
+
+    def setUp(self):
+        super(TestMessageStream, self).setUp()
+        left, right = socket.socketpair()
+        self.left = MessageStream(IOStream(left))
+        self.right = MessageStream(IOStream(right))
+
+    def tearDown(self):
+        self.left.stream.close()
+        self.right.stream.close()
+        super(TestMessageStream, self).tearDown()
+
+    @gen_test
+    def test_legacy(self):
+        self.left.write_message(RPCRequest('crack', ({'a': 1}, ), {}, 1))
+        req = yield self.right.read_message()
+        self.assertIsInstance(req, RPCRequest)
+        self.assertEqual(req['msg_id'], 1)
+        self.assertEqual(req['value']['func'], 'crack')
+
+    @gen_test
+    def test_framed_payload_with_eom(self):
+        self.left.upgrade(framed=True)
+        self.right.upgrade(framed=True)
+        blob = b'\x89PNG' + MessageStream.EOM + b'\x00' * 1024
+        self.left.write_message(RPCResponse(blob, 7))
+        self.left.write_message(RPCResponse(b'next', 8))
+        res = yield self.right.read_message()
+        self.assertEqual(res['value'], blob)
+        self.assertEqual(res['msg_id'], 7)
+        res = yield self.right.read_message()
+        self.assertEqual(res['value'], b'next')
+
+    @gen_test
+    def test_codecs(self):
+        blob = b'\xff' * 100000
+        for name in CODECS:
+            self.left.upgrade(framed=True, codec=name)
+            self.right.upgrade(framed=True, codec=name)
+            self.left.write_message(
+                RPCRequest('crack', ({'f': blob}, ), {}, 3)
+            )
+            req = yield self.right.read_message()
+            self.assertEqual(req['value']['args'][0]['f'], blob, name)
+
+    @gen_test
+    def test_compression(self):
+        text = b'{"param1": "1"}' * 1000
+        for name in COMPRESSORS:
+            for stream in (self.left, self.right):
+                stream.upgrade(
+                    framed=True,
+                    codec='pickle5',
+                    compression=name,
+                    compression_threshold=1024,
+                )
+            self.left.write_message(RPCResponse(text, 4))
+            self.left.write_message(RPCResponse(True, 5))
+            res = yield self.right.read_message()
+            self.assertEqual(res['value'], text, name)
+            res = yield self.right.read_message()
+            self.assertEqual(res['value'], True, name)
+            # The small one is not compressed
+            stats = self.left.compression_stats()
+            self.assertEqual(stats['frames'], 1, name)
+            self.assertLess(stats['compressed_bytes'], len(text) // 10)
+            self.assertEqual(self.right.decompressed_frames, 1)
+            self.left.compressed_frames = 0
+            self.right.decompressed_frames = 0
+
+    @gen_test
+    def test_incompressible(self):
+        for stream in (self.left, self.right):
+            stream.upgrade(framed=True, codec='pickle5', compression='zlib')
+        blob = os.urandom(64 * 1024)
+        self.left.write_message(RPCResponse(blob, 6))
+        res = yield self.right.read_message()
+        self.assertEqual(res['value'], blob)
+        self.assertEqual(self.left.compressed_frames, 0)
+        self.assertEqual(self.left.incompressible_frames, 1)
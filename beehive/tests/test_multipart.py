@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_multipart.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Incremental multipart parser against Tornado's buffered one
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import unittest
+
+from tornado.httputil import parse_body_arguments
+
+from beehive.libs.multipart import (
+    MultipartError, MultipartParser, parse_boundary
+)
+
+from .test_crack_api import encode_multipart_formdata
+
+
+class TestMultipartParser(unittest.TestCase):
+
+    def setUp(self):
+        self.content_type, self.body = encode_multipart_formdata(
+            fields=[('param1', '1'), ('param2', 'str'), ('param1', '')],
+            files=[
+                ('file1', 'a.png', os.urandom(10000)),
+                # A body holding most of the delimiter
+                ('file2', 'b.txt', b'\r\n------------ThIs_Is_tHe_bouNdaRY'),
+            ]
+        )
+        self.arguments = {}
+        self.files = {}
+        parse_body_arguments(
+            self.content_type.decode(), self.body, self.arguments, self.files
+        )
+
+    def parse(self, chunk_size):
+        parser = MultipartParser(parse_boundary(self.content_type.decode()))
+        for i in range(0, len(self.body), chunk_size):
+            parser.feed(self.body[i:i + chunk_size])
+        parser.close()
+        return parser
+
+    def test_chunks(self):
+        for chunk_size in (1, 7, 4096, len(self.body)):
+            parser = self.parse(chunk_size)
+            self.assertEqual(parser.arguments, self.arguments)
+            self.assertEqual(parser.files, self.files)
+
+    def test_incomplete(self):
+        parser = MultipartParser(parse_boundary(self.content_type.decode()))
+        parser.feed(self.body[:-20])
+        self.assertRaises(MultipartError, parser.close)
+
+    def test_boundary(self):
+        self.assertIsNone(parse_boundary('application/octet-stream'))
+        self.assertEqual(
+            parse_boundary('multipart/form-data; boundary="ab"'), b'"ab"'
+        )
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_pending.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Pending queue of the calls waiting for a worker slot
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import unittest
+
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.server.rpc_server import BeetleRPCServer
+from beehive.server.rpc_server.errors import (
+    QueueFullError, QueueTimeoutError
+)
+from beehive.server.rpc_server.pending import PendingQueue
+
+
+class TestPendingQueue(unittest.TestCase):
+
+    def test_fifo(self):
+        queue = PendingQueue(10)
+        waiters = [queue.put(time_start) for time_start in (1, 2, 3)]
+        self.assertEqual(len(queue), 3)
+        for waiter, time_start in zip(waiters, (1, 2, 3)):
+            self.assertEqual(queue.pop(), (waiter, time_start))
+        self.assertEqual(queue.pop(), (None, None))
+        self.assertEqual(len(queue), 0)
+
+    def test_discard(self):
+        queue = PendingQueue(2)
+        first, second = queue.put(1), queue.put(2)
+        self.assertTrue(queue.full())
+        self.assertTrue(queue.discard(first))
+        self.assertFalse(queue.discard(first))
+        self.assertFalse(queue.full())
+        self.assertEqual(queue.pop(), (second, 2))
+        self.assertEqual(queue.stats()['timeouts'], 1)
+        # Served already, the slot is the waiter's
+        served = queue.put(3)
+        queue.pop()[0].set_result('worker')
+        self.assertFalse(queue.discard(served))
+
+    def test_discarded_not_kept(self):
+        queue = PendingQueue(10000)
+        for _ in range(5000):
+            queue.discard(queue.put(0))
+        self.assertEqual(len(queue._waiters), 0)
+
+        # Behind a live waiter at the head
+        head = queue.put(0)
+        for _ in range(5000):
+            queue.discard(queue.put(0))
+        self.assertEqual(len(queue), 1)
+        self.assertLess(len(queue._waiters), 20)
+        self.assertEqual(queue.pop(), (head, 0))
+
+
+class TestAcquire(AsyncTestCase):
+
+    @gen_test
+    def test_full_and_timeout(self):
+        server = BeetleRPCServer('127.0.0.1', 0, queue_size=1)
+        # Known type without a worker, e.g. all of them restarting
+        server.queues['sample'] = PendingQueue(server.queue_size)
+        waiting = server.acquire('sample', timeout=0.05)
+        with self.assertRaises(QueueFullError):
+            yield server.acquire('sample')
+        with self.assertRaises(QueueTimeoutError):
+            yield waiting
+        queue = server.queues['sample']
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(len(queue._waiters), 0)
+        stats = queue.stats()
+        self.assertEqual((stats['rejected'], stats['timeouts']), (1, 1))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_rest.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Precompiled route table of pyrestful handlers
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import json
+import unittest
+
+from tornado.testing import AsyncHTTPTestCase
+
+from beehive.libs.pyrestful import mediatypes
+from beehive.libs.pyrestful.rest import (
+    RestHandler, RestService, Route, delete, get, post, route_pattern
+)
+
+
+class ItemHandler(RestHandler):
+
+    @get(path='/x/{a}/y/{b}', types=[int, str])
+    def both(self, a, b):
+        return {'a': a, 'b': b}
+
+    @get(path='/x/{a}', produces=mediatypes.APPLICATION_JSON)
+    def read(self, a):
+        return {'read': a}
+
+    @post(path='/x/{a}', types=[int])
+    def create(self, a):
+        return {'created': a}
+
+
+class OnlyDeleteHandler(RestHandler):
+
+    @delete(path='/d/{a}')
+    def remove(self, a):
+        return {'removed': a}
+
+
+class TestRoute(unittest.TestCase):
+
+    def test_pattern(self):
+        self.assertEqual(route_pattern('/x/{a}/y'), r'/x/[^/]+/y')
+        self.assertEqual(
+            route_pattern('/x/{a}/y/{b}', True), r'/x/([^/]+)/y/([^/]+)'
+        )
+
+    def test_segments(self):
+        route = Route('both', ItemHandler.both)
+        self.assertEqual(route.regex.match('/x/1/y/2').groups(), ('1', '2'))
+        # Every param takes exactly one segment
+        self.assertIsNone(route.regex.match('/x/1/y'))
+        self.assertIsNone(route.regex.match('/x/1/y/'))
+        self.assertIsNone(route.regex.match('/x/1/z/y/2'))
+        self.assertIsNone(route.regex.match('/x/1/y/2/3'))
+
+    def test_routes_by_method(self):
+        routes = ItemHandler.get_routes()
+        self.assertEqual(sorted(routes), ['GET', 'POST'])
+        self.assertEqual(
+            sorted(route.name for route in routes['GET']), ['both', 'read']
+        )
+        self.assertIs(ItemHandler.get_routes(), routes)
+        # Compiled per class, not inherited
+        self.assertEqual(sorted(OnlyDeleteHandler.get_routes()), ['DELETE'])
+
+
+class TestDispatch(AsyncHTTPTestCase):
+
+    def get_app(self):
+        return RestService([ItemHandler, OnlyDeleteHandler])
+
+    def fetch_json(self, path, **kwargs):
+        res = self.fetch(path, **kwargs)
+        self.assertEqual(res.code, 200)
+        return json.loads(res.body.decode())
+
+    def test_converters(self):
+        self.assertEqual(self.fetch_json('/x/1/y/2'), {'a': 1, 'b': '2'})
+        self.assertEqual(self.fetch_json('/x/1'), {'read': '1'})
+        self.assertEqual(
+            self.fetch_json('/x/1', method='POST', body=b''), {'created': 1}
+        )
+        res = self.fetch('/x/abc/y/2')
+        self.assertEqual(res.code, 400)
+
+    def test_not_found(self):
+        self.assertEqual(self.fetch('/x/1/y').code, 404)
+        self.assertEqual(self.fetch('/x/1/y/2/3').code, 404)
+        self.assertEqual(self.fetch('/z').code, 404)
+        # The handler has POST routes, none for this path
+        res = self.fetch('/x/1/y/2', method='POST', body=b'')
+        self.assertEqual(res.code, 404)
+
+    def test_method_not_allowed(self):
+        self.assertEqual(self.fetch('/x/1', method='DELETE').code, 405)
+        self.assertEqual(self.fetch('/d/1').code, 405)
+        self.assertEqual(
+            self.fetch_json('/d/1', method='DELETE'), {'removed': '1'}
+        )
@@ -12,11 +12,21 @@
     @python version: 3.8
 """
 
+import os
+import shutil
+import tempfile
+
 from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.tcpclient import TCPClient
 from tornado.testing import AsyncTestCase, gen_test
 
 from beehive.client import BeetleRPCClient
+from beehive.message import RPCRequest, RPCResponse
+from beehive.message.stream import MessageStream
 from beehive.server.rpc_server import BeetleRPCServer
+from beehive.server.rpc_server.context import RequestContext
+from beehive.server.rpc_server.errors import RequestCancelledError
 from beehive.utils import run_in_thread, run_in_subprocess
 
 
@@ -28,6 +38,9 @@ class TestRPC(AsyncTestCase):
 
     @classmethod
     def setUpClass(cls):
+        # A loop of its own, the one of the previous class may still be
+        # stopping in its thread
+        IOLoop().make_current()
         cls.server = BeetleRPCServer(
             cls.test_host,
             cls.test_port,
@@ -38,6 +51,7 @@ class TestRPC(AsyncTestCase):
             cls.test_port,
         )
         cls.client_thread = run_in_thread(cls.client.run)
+        IOLoop.clear_current()
 
     @classmethod
     def tearDownClass(cls):
@@ -58,4 +72,255 @@ class TestRPC(AsyncTestCase):
         remote_client = self.server.registered_clients[0]
 
         ret = yield remote_client.heart_beat()
-        self.assertTrue(ret)
\ No newline at end of file
+        self.assertTrue(ret)
+
+class TestUnixSocket(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10889
+
+    def setUp(self):
+        super(TestUnixSocket, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'rpc.sock')
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestUnixSocket, self).tearDown()
+        shutil.rmtree(self.tmp_dir)
+
+    @gen_test
+    def test_unix_socket(self):
+        self.server = BeetleRPCServer(
+            self.test_host,
+            self.test_port,
+            heartbeat_interval=0,
+            unix_socket=self.path,
+        )
+        self.server.run()
+        client = BeetleRPCClient('unix://' + self.path, None)
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+
+        remote_client = self.server.registered_clients[0]
+        self.assertEqual(remote_client.address, (self.path, 1))
+        ret = yield remote_client.heart_beat()
+        self.assertTrue(ret)
+
+
+class EchoClient(BeetleRPCClient):
+
+    _type_name = 'echo'
+
+    def crack(self, params):
+        return params
+
+
+class TestCompression(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10892
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestCompression, self).tearDown()
+
+    @gen_test
+    def test_negotiated(self):
+        self.server = BeetleRPCServer(
+            self.test_host, self.test_port, heartbeat_interval=0
+        )
+        self.server.run()
+        client = EchoClient(
+            self.test_host,
+            self.test_port,
+            compression=['unknown', 'zlib'],
+            compression_threshold=4096,
+        )
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+
+        remote_client = self.server.registered_clients[0]
+        self.assertEqual(remote_client.wire['compression'], 'zlib')
+        params = {'text': 'param ' * 10000}
+        ret = yield remote_client.crack(params)
+        self.assertEqual(ret, params)
+        ret = yield remote_client.heart_beat()
+        self.assertTrue(ret)
+
+        stats = self.server.stats()['compression'][0]
+        self.assertEqual(stats['frames'], 1)
+        self.assertGreater(stats['saved_bytes'], 50000)
+        self.assertEqual(stats['decompressed_frames'], 1)
+        self.assertEqual(client.messages.compressed_frames, 1)
+
+
+class DelayClient(BeetleRPCClient):
+
+    _type_name = 'delay'
+
+    @gen.coroutine
+    def crack(self, params):
+        yield gen.sleep(params['delay'])
+        raise gen.Return(params['n'])
+
+
+class TestMultiplexing(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10896
+
+    def setUp(self):
+        super(TestMultiplexing, self).setUp()
+        self.server = BeetleRPCServer(
+            self.test_host, self.test_port, heartbeat_interval=0
+        )
+        self.server.run()
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestMultiplexing, self).tearDown()
+
+    @gen_test
+    def test_out_of_order(self):
+        client = DelayClient(self.test_host, self.test_port, slots=3)
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+        remote_client = self.server.registered_clients[0]
+        self.assertTrue(remote_client.multiplexed)
+
+        done = []
+
+        @gen.coroutine
+        def call(n, delay):
+            ret = yield remote_client.crack({'n': n, 'delay': delay})
+            done.append(ret)
+
+        yield [call(1, 0.3), call(2, 0.1), call(3, 0.2)]
+        # Each caller got its own result, as the worker finished them
+        self.assertEqual(done, [2, 3, 1])
+        self.assertFalse(remote_client._pending)
+
+    @gen_test
+    def test_legacy_in_order(self):
+        # A worker that predates msg_id: it registers and answers
+        # without one, strictly in order
+        stream = yield TCPClient().connect(self.test_host, self.test_port)
+        messages = MessageStream(stream)
+        messages.write_message(RPCRequest('register', ('legacy', ), {}))
+        res = yield messages.read_message()
+        self.assertIs(res['value'], True)
+        remote_client = self.server.registered_clients[0]
+        self.assertFalse(remote_client.multiplexed)
+
+        calls = [remote_client.crack({'n': n}) for n in (1, 2, 3)]
+        for _ in calls:
+            req = yield messages.read_message()
+            messages.write_message(
+                RPCResponse(req['value']['args'][0]['n'] * 10)
+            )
+        rets = yield calls
+        self.assertEqual(rets, [10, 20, 30])
+        stream.close()
+
+
+class SlotClient(BeetleRPCClient):
+
+    _type_name = 'slot'
+
+    running = 0
+    peak = 0
+
+    @gen.coroutine
+    def crack(self, params):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            yield gen.sleep(params['delay'])
+            if params.get('error'):
+                raise ValueError('crack failed')
+        finally:
+            self.running -= 1
+        raise gen.Return(params['n'])
+
+
+class TestSlots(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10897
+
+    def tearDown(self):
+        self.server.stop()
+        super(TestSlots, self).tearDown()
+
+    @gen.coroutine
+    def connect(self, slots):
+        self.server = BeetleRPCServer(
+            self.test_host, self.test_port, heartbeat_interval=0
+        )
+        self.server.run()
+        client = SlotClient(self.test_host, self.test_port, slots=slots)
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+        raise gen.Return(client)
+
+    @gen_test
+    def test_worker_slots(self):
+        client = yield self.connect(2)
+        remote_client = self.server.registered_clients[0]
+        self.assertEqual(remote_client.slots, 2)
+
+        # Sent at once, the third one waits for a slot on the worker
+        calls = [
+            remote_client.crack({'n': n, 'delay': 0.1}) for n in range(3)
+        ]
+        yield gen.sleep(0.05)
+        self.assertEqual(client.running, 2)
+        rets = yield calls
+        self.assertEqual(rets, [0, 1, 2])
+        self.assertEqual(client.peak, 2)
+
+        with self.assertRaises(Exception):
+            yield remote_client.crack({'n': 0, 'delay': 0, 'error': 1})
+        self.assertEqual(client._slots._value, 2)
+
+    @gen_test
+    def test_server_slots(self):
+        client = yield self.connect(2)
+        remote_client = self.server.registered_clients[0]
+
+        calls = [
+            self.server.dispatch('slot', 'crack', ({'n': n, 'delay': 0.1}, ))
+            for n in range(3)
+        ]
+        yield gen.sleep(0.05)
+        # Not sent to the busy worker, queued on the server
+        self.assertEqual(remote_client.outstanding, 2)
+        self.assertEqual(len(self.server.queues['slot']), 1)
+        rets = yield calls
+        self.assertEqual(rets, [0, 1, 2])
+        self.assertEqual(client.peak, 2)
+        self.assertEqual(remote_client.outstanding, 0)
+
+        # Released on error and on cancel, on both sides
+        with self.assertRaises(Exception):
+            yield self.server.dispatch(
+                'slot', 'crack', ({'n': 0, 'delay': 0, 'error': 1}, )
+            )
+        self.assertEqual(remote_client.outstanding, 0)
+        context = RequestContext()
+        call = self.server.dispatch(
+            'slot', 'crack', ({'n': 0, 'delay': 0.1}, ), context=context
+        )
+        yield gen.sleep(0.02)
+        context.cancel()
+        with self.assertRaises(RequestCancelledError):
+            yield call
+        self.assertEqual(remote_client.outstanding, 0)
+        yield gen.sleep(0.15)
+        self.assertEqual(client._slots._value, 2)
+        self.assertEqual(client.dropped, 1)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_scheduler.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Worker scheduling policies
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import unittest
+
+from beehive.server.rpc_server.scheduler import SCHEDULERS, create_scheduler
+
+
+class FakeClient(object):
+
+    def __init__(self, client_type, latency=None):
+        self.client_type = client_type
+        self.slots = 10
+        self.outstanding = 0
+        self.latency = latency
+        self.rtt = None
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_index_by_type(self):
+        for name in SCHEDULERS:
+            scheduler = create_scheduler(name)
+            a, b = FakeClient('a'), FakeClient('b')
+            scheduler.add(a)
+            scheduler.add(b)
+            self.assertIs(scheduler.pick('a'), a, name)
+            scheduler.remove(a)
+            self.assertIsNone(scheduler.pick('a'), name)
+            self.assertIs(scheduler.pick('b'), b, name)
+
+    def test_least_outstanding(self):
+        scheduler = create_scheduler('least_outstanding')
+        clients = [FakeClient('a') for _ in range(3)]
+        for client in clients:
+            scheduler.add(client)
+        picked = []
+        for _ in range(3):
+            client = scheduler.pick('a')
+            scheduler.on_start(client)
+            picked.append(client)
+        self.assertEqual(set(picked), set(clients))
+
+        scheduler.on_finish(clients[1], 0.1)
+        self.assertIs(scheduler.pick('a'), clients[1])
+        scheduler.remove(clients[1])
+        self.assertIn(scheduler.pick('a'), (clients[0], clients[2]))
+
+    def test_ewma_prefers_fast_worker(self):
+        scheduler = create_scheduler('ewma')
+        fast, slow = FakeClient('a', 0.01), FakeClient('a', 1.0)
+        scheduler.add(fast)
+        scheduler.add(slow)
+        for _ in range(10):
+            self.assertIs(scheduler.pick('a'), fast)
+        scheduler.on_start(fast)
+        scheduler.on_finish(fast, 5.0)
+        self.assertGreater(fast.latency, 1.0)
+
+    def test_ewma_heartbeat_recovers_idle_worker(self):
+        scheduler = create_scheduler('ewma')
+        client = FakeClient('a', 1.0)
+        scheduler.add(client)
+        for _ in range(20):
+            scheduler.on_heartbeat(client, 0.001)
+        self.assertLess(client.latency, 0.01)
+        scheduler.on_start(client)
+        scheduler.on_heartbeat(client, 0.001)
+        latency = client.latency
+        scheduler.on_heartbeat(client, 0.001)
+        self.assertEqual(client.latency, latency)
+
+    def test_busy_worker_not_picked(self):
+        for name in SCHEDULERS:
+            scheduler = create_scheduler(name)
+            client = FakeClient('a')
+            client.slots = 1
+            scheduler.add(client)
+            scheduler.on_start(client)
+            self.assertIsNone(scheduler.pick('a'), name)
+            scheduler.on_finish(client, 0.1)
+            self.assertIs(scheduler.pick('a'), client, name)
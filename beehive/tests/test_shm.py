@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_shm.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Shared memory ring and payload handoff over the Unix socket
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tornado import gen
+from tornado.httputil import HTTPFile
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.client import BeetleRPCClient
+from beehive.message.shm import SharedRing, SharedSegment, ShmRef
+from beehive.server.rpc_server import BeetleRPCServer
+
+
+class TestSharedRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = SharedRing(1024)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_wrap_and_free_out_of_order(self):
+        offsets = [self.ring.alloc(256) for _ in range(4)]
+        self.assertEqual(offsets, [0, 256, 512, 768])
+        self.assertIsNone(self.ring.alloc(1))
+        # Freed behind the head, nothing is reclaimed yet
+        self.ring.free(256)
+        self.assertIsNone(self.ring.alloc(256))
+        self.ring.free(0)
+        self.assertEqual(self.ring.alloc(300), 0)
+        self.assertIsNone(self.ring.alloc(300))
+        self.assertEqual(self.ring.alloc(100), 320)
+        for offset in (512, 768, 0, 320):
+            self.ring.free(offset)
+        self.assertEqual(len(self.ring), 0)
+        self.assertEqual(self.ring.alloc(1024), 0)
+
+    def test_export_resolve(self):
+        self.ring.min_size = 16
+        body = os.urandom(100)
+        params = {
+            'param1': [b'1'],
+            'file1': [HTTPFile(filename='a.png', body=body)],
+        }
+        refs = []
+        exported = self.ring.export(((params, ), {}), refs)
+        ref = exported[0][0]['file1'][0]['body']
+        self.assertIsInstance(ref, ShmRef)
+        self.assertIsInstance(exported[0][0]['file1'][0], HTTPFile)
+        self.assertEqual(exported[0][0]['param1'], [b'1'])
+        self.assertEqual(refs, [ref.offset])
+
+        segment = SharedSegment(self.ring.path, self.ring.size)
+        resolved = segment.resolve(exported)
+        view = resolved[0][0]['file1'][0]['body']
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(view, body)
+        copied = segment.resolve(exported, copy=True)
+        self.assertEqual(copied[0][0]['file1'][0]['body'], body)
+        del view, resolved
+        segment.close()
+
+    def test_full_falls_back_inline(self):
+        self.ring.min_size = 16
+        body = b'x' * 2048
+        self.assertIs(self.ring.export(body, []), body)
+        self.assertEqual(self.ring.stats()['full'], 1)
+
+
+class LengthClient(BeetleRPCClient):
+
+    _type_name = 'length'
+
+    def crack(self, params):
+        body = params['file1'][0]['body']
+        return [type(body).__name__, len(body)]
+
+
+class TestHandoff(AsyncTestCase):
+
+    test_host = '127.0.0.1'
+    test_port = 10890
+
+    def setUp(self):
+        super(TestHandoff, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'rpc.sock')
+
+    def tearDown(self):
+        super(TestHandoff, self).tearDown()
+        shutil.rmtree(self.tmp_dir)
+
+    @gen_test
+    def test_handoff(self):
+        self.server = BeetleRPCServer(
+            self.test_host,
+            self.test_port,
+            heartbeat_interval=0,
+            unix_socket=self.path,
+            shared_memory=1024 * 1024,
+        )
+        self.server.run()
+        client = LengthClient(
+            'unix://' + self.path, None, shared_memory=True
+        )
+        client.main_loop()
+        while not client._registered:
+            yield gen.sleep(0.01)
+
+        remote_client = self.server.registered_clients[0]
+        ring = remote_client.shm
+        self.assertIsNotNone(ring)
+        params = {'file1': [HTTPFile(body=os.urandom(100 * 1024))]}
+        ret = yield remote_client.crack(params)
+        self.assertEqual(ret, ['memoryview', 100 * 1024])
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.stats()['handoffs'], 1)
+        # Untouched for the next worker the params may go to
+        self.assertIsInstance(params['file1'][0]['body'], bytes)
+
+        # Not listening anymore, the worker cannot register again
+        self.server.stop()
+        remote_client.stream.close()
+        yield gen.sleep(0.01)
+        self.assertFalse(os.path.exists(ring.path))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+    test_timer_wheel.py
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Timers on the hashed timing wheel
+
+    @Author  : lijinhao
+    @copyright: (c) 2021 Baikal
+    @date created: 2022/1/25 18:49
+    @python version: 3.8
+"""
+
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+
+from beehive.libs.time_helper import TimerWheel
+
+
+class TestTimerWheel(AsyncTestCase):
+
+    @gen_test
+    def test_order(self):
+        wheel = TimerWheel(tick=0.005, slots=8)
+        fired = []
+        for delay in (0.06, 0.01, 0.03):
+            wheel.call_later(delay, lambda d=delay: fired.append(d))
+        start = self.io_loop.time()
+        yield gen.sleep(0.1)
+        self.assertEqual(fired, [0.01, 0.03, 0.06])
+        self.assertEqual(len(wheel), 0)
+        self.assertLess(self.io_loop.time() - start, 0.2)
+
+    @gen_test
+    def test_cancel(self):
+        wheel = TimerWheel(tick=0.005)
+        fired = []
+        timers = [
+            wheel.call_later(0.01, lambda i=i: fired.append(i))
+            for i in range(100)
+        ]
+        for timer in timers[1:]:
+            timer.cancel()
+        timers[0].cancel()
+        timers[0].cancel()
+        self.assertEqual(len(wheel), 0)
+        yield gen.sleep(0.03)
+        self.assertEqual(fired, [])
+
+    @gen_test
+    def test_rearm_from_callback(self):
+        wheel = TimerWheel(tick=0.005)
+        fired = []
+
+        def callback():
+            fired.append(1)
+            if len(fired) < 3:
+                wheel.call_later(0, callback)
+
+        wheel.call_later(0, callback)
+        yield gen.sleep(0.05)
+        self.assertEqual(fired, [1, 1, 1])